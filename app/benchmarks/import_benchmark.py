@@ -0,0 +1,115 @@
+"""
+Measures the startup cost of the API: the time and memory it takes a fresh interpreter to import app.main.
+
+Each run imports the module in a new process with `python -X importtime`, so nothing is cached between
+runs. The report gives the median import time, the peak resident memory, the packages that take the
+most import time, and whether any of the libraries that must only load on first use (matplotlib and
+pandas, used by the charts) was imported. It exits with status 1 when one was, or when the median
+import time exceeds --max-ms, so it can guard against startup regressions.
+
+Usage:
+    python -m app.benchmarks.import_benchmark --repeat 5
+    python -m app.benchmarks.import_benchmark --max-ms 800 --output startup.json
+"""
+import argparse
+import json
+import os
+import re
+import statistics
+import subprocess
+import sys
+from collections import defaultdict
+
+# Libraries that the API process must not import at startup.
+LAZY_MODULES = ('matplotlib', 'pandas', 'numpy')
+
+# One line of -X importtime output: "import time:  self [us] | cumulative | imported package".
+IMPORTTIME_LINE = re.compile(r'^import time:\s+(\d+) \|\s+(\d+) \| (\s*)(\S+)$')
+
+ROOT = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+CHILD_CODE = """
+import json, resource, sys
+import {module}
+print(json.dumps({{
+    'max_rss_kb': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+    'loaded': [name for name in {lazy_modules!r} if name in sys.modules],
+}}))
+"""
+
+
+def import_once(module: str):
+    """
+    Import a module in a fresh interpreter with -X importtime.
+    Args:
+        module (str): The module to import, e.g. 'app.main'.
+    Returns:
+        dict: The cumulative import time of the module in milliseconds, the self time of every
+            imported module in microseconds, the peak resident memory in KB and the lazy
+            modules that were loaded.
+    """
+    process = subprocess.run([sys.executable, '-X', 'importtime', '-c',
+                              CHILD_CODE.format(module=module, lazy_modules=LAZY_MODULES)],
+                             cwd=ROOT, capture_output=True, text=True, check=True)
+    self_times, total_us = {}, None
+    for line in process.stderr.splitlines():
+        match = IMPORTTIME_LINE.match(line)
+        if match:
+            self_us, cumulative_us, _, name = match.groups()
+            self_times[name] = int(self_us)
+            if name == module:
+                total_us = int(cumulative_us)
+    report = json.loads(process.stdout.strip().splitlines()[-1])
+    return {'import_ms': total_us / 1000, 'self_times': self_times, **report}
+
+
+def top_packages(self_times: dict, count: int):
+    """
+    Sum the import time of the modules of every top-level package, e.g. 'fastapi'.
+    Returns:
+        list: The (package, milliseconds) pairs of the `count` slowest packages.
+    """
+    totals = defaultdict(int)
+    for name, self_us in self_times.items():
+        totals[name.split('.')[0]] += self_us
+    return [(package, us / 1000) for package, us in sorted(totals.items(), key=lambda item: -item[1])[:count]]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--module', default='app.main', help='module to import')
+    parser.add_argument('--repeat', type=int, default=5, help='number of fresh interpreters, the median is reported')
+    parser.add_argument('--top', type=int, default=10, help='number of slowest packages to list')
+    parser.add_argument('--max-ms', type=float, help='exit with status 1 if the median import time exceeds this')
+    parser.add_argument('--output', help='file to save the results to, as JSON')
+    args = parser.parse_args()
+
+    runs = [import_once(args.module) for _ in range(args.repeat)]
+    median_ms = statistics.median(run['import_ms'] for run in runs)
+    max_rss_mb = max(run['max_rss_kb'] for run in runs) / 1024
+    loaded = sorted({name for run in runs for name in run['loaded']})
+    packages = top_packages(runs[-1]['self_times'], args.top)
+
+    print(f"import {args.module}: median {median_ms:.1f} ms over {args.repeat} runs, peak RSS {max_rss_mb:.1f} MB")
+    print(f"{'package':<30} {'ms':>8}")
+    for package, ms in packages:
+        print(f"{package:<30} {ms:>8.1f}")
+    print(f"lazy modules loaded at import: {', '.join(loaded) or 'none'}")
+
+    if args.output:
+        with open(args.output, 'w') as file:
+            json.dump({'module': args.module, 'repeat': args.repeat, 'median_import_ms': median_ms,
+                       'max_rss_mb': round(max_rss_mb, 1), 'lazy_modules_loaded': loaded,
+                       'top_packages': dict(packages)}, file, indent=2)
+
+    failures = []
+    if loaded:
+        failures.append(f"{', '.join(loaded)} imported at startup")
+    if args.max_ms is not None and median_ms > args.max_ms:
+        failures.append(f"median import time {median_ms:.1f} ms exceeds {args.max_ms} ms")
+    if failures:
+        sys.exit('; '.join(failures))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,89 @@
+"""
+Compares the cost of serializing MongoDB documents into a response body.
+
+The "json_util round trip" path is what the controllers used to do: json.loads(json_util.dumps(...))
+followed by FastAPI's own jsonable_encoder and JSONResponse rendering. The other paths render a
+MongoJSONResponse directly, with orjson and with the standard library fallback.
+
+Usage:
+    python -m app.benchmarks.json_encoder_benchmark --documents 10000 --repeat 5
+"""
+import argparse
+import json
+import timeit
+from datetime import datetime, timedelta
+from unittest.mock import patch
+
+from bson import ObjectId, json_util
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+
+from app.serialization import json_encoder
+from app.serialization.json_encoder import MongoJSONResponse
+
+
+def make_documents(count: int):
+    """
+    Build expense documents shaped like the ones stored in the expenses collection.
+    Args:
+        count (int): The number of documents to build.
+    Returns:
+        list: The documents.
+    """
+    start = datetime(2020, 1, 1)
+    return [{
+        "_id": ObjectId(),
+        "id": i,
+        "userId": "325962801",
+        "amount": round(i * 1.37, 2),
+        "date": start + timedelta(hours=i),
+        "beneficiary": f"beneficiary {i % 50}",
+        "documentation": "payment on the work"
+    } for i in range(count)]
+
+
+def json_util_round_trip(documents):
+    """
+    Render a response the way the controllers did before MongoJSONResponse.
+    """
+    content = json.loads(json_util.dumps(documents))
+    return JSONResponse(jsonable_encoder(content)).body
+
+
+def mongo_json_response(documents):
+    """
+    Render a MongoJSONResponse with the encoder that is installed.
+    """
+    return MongoJSONResponse(documents).body
+
+
+def mongo_json_response_stdlib(documents):
+    """
+    Render a MongoJSONResponse with the standard library fallback encoder.
+    """
+    with patch.object(json_encoder, 'orjson', None):
+        return MongoJSONResponse(documents).body
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--documents', type=int, default=10000, help='number of documents per response')
+    parser.add_argument('--repeat', type=int, default=5, help='number of timed runs, the best one is reported')
+    args = parser.parse_args()
+
+    documents = make_documents(args.documents)
+    paths = [('json_util round trip', json_util_round_trip)]
+    if json_encoder.orjson is not None:
+        paths.append(('MongoJSONResponse (orjson)', mongo_json_response))
+    paths.append(('MongoJSONResponse (json)', mongo_json_response_stdlib))
+
+    baseline = None
+    print(f"{args.documents} documents, best of {args.repeat} runs")
+    for name, render in paths:
+        best = min(timeit.repeat(lambda: render(documents), number=1, repeat=args.repeat))
+        baseline = baseline or best
+        print(f"{name:<30} {best * 1000:10.2f} ms {baseline / best:8.1f}x")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,400 @@
+"""
+Load benchmark of the API routes.
+
+Seeds a database with N users holding M transactions each (half expenses, half revenues), then
+drives the FastAPI application in-process through httpx's ASGI transport, sending the requests of
+each route with a bounded number in flight. For every route it reports the p50/p95/p99 latency and
+the throughput, and it can save the results as JSON and compare them with a previous run.
+
+The database is an in-memory mongomock database unless --mongo-uri points to a MongoDB server, in
+which case the --database database is dropped and seeded. The routes run in order: the reads first,
+then the writes, so the reads see the seeded data only. The charts of a user are rendered once and
+then served from the chart cache until a write to the user invalidates them. The run fails when
+every request of a route fails.
+
+Usage:
+    python -m app.benchmarks.load_benchmark --users 20 --transactions 200 --requests 200 --output baseline.json
+    python -m app.benchmarks.load_benchmark --compare baseline.json --fail-above 20
+    python -m app.benchmarks.load_benchmark --mongo-uri mongodb://localhost:27017 --concurrency 32
+"""
+import argparse
+import asyncio
+import json
+import platform
+import random
+import sys
+import time
+from datetime import datetime, timedelta
+
+import httpx
+
+from app.config import settings
+from app.database import database_connection
+
+# First ID of the seeded users; the users created by the benchmark follow them.
+FIRST_USER_ID = 100000000
+PASSWORD = 'Benchmark1!'
+BENEFICIARIES = ['supermarket', 'rent', 'electricity', 'restaurant', 'fuel', 'pharmacy', 'clothing', 'gym']
+BENEFACTORS = ['salary', 'freelance', 'dividends', 'refund']
+# When the seeded accounts are opened; the seeded transactions are dated from 2023.
+OPENED_AT = datetime(2022, 12, 31)
+
+
+class Dataset:
+    """
+    The shape of the seeded data, used to build requests for documents that exist.
+    """
+
+    def __init__(self, users: int, transactions: int):
+        self.users = users
+        self.expenses_per_user = transactions // 2
+        self.revenues_per_user = transactions - self.expenses_per_user
+
+    @staticmethod
+    def user_id(index: int):
+        return str(FIRST_USER_ID + index)
+
+    @staticmethod
+    def email(index: int):
+        return f'user{index}@benchmark.com'
+
+    def expense(self, number: int):
+        """
+        Returns the (expense id, owner id) of the number-th seeded expense.
+        """
+        expense_id = number % (self.users * self.expenses_per_user) + 1
+        return expense_id, self.user_id((expense_id - 1) // self.expenses_per_user)
+
+    def revenue(self, number: int):
+        """
+        Returns the (revenue id, owner id) of the number-th seeded revenue.
+        """
+        revenue_id = number % (self.users * self.revenues_per_user) + 1
+        return revenue_id, self.user_id((revenue_id - 1) // self.revenues_per_user)
+
+
+def make_user(index: int, balance: float = 0):
+    """
+    Build a user document that passes the User model validation.
+    """
+    return {
+        'id': Dataset.user_id(index),
+        'user_name': f'user {index}',
+        'password': PASSWORD,
+        'email': Dataset.email(index),
+        'phone': '050-1234567',
+        'birth_date': datetime(1990, 1, 1),
+        'balance': balance
+    }
+
+
+def make_transaction(kind: str, transaction_id: int, user_id: str, rng: random.Random):
+    """
+    Build an expense or revenue document, dated within the two years before 2025.
+    """
+    counterparty = ('beneficiary', BENEFICIARIES) if kind == 'expense' else ('benefactor', BENEFACTORS)
+    return {
+        'id': transaction_id,
+        'userId': user_id,
+        'amount': round(rng.uniform(1, 500), 2),
+        'date': datetime(2023, 1, 1) + timedelta(hours=rng.randrange(2 * 365 * 24)),
+        counterparty[0]: rng.choice(counterparty[1]),
+        'documentation': 'benchmark'
+    }
+
+
+def connect(mongo_uri: str, database: str):
+    """
+    Returns an empty database to run the benchmark on.
+    Args:
+        mongo_uri (str): The connection string of a MongoDB server, or None for mongomock.
+        database (str): The name of the database, dropped before the run.
+    Returns:
+        Database: A pymongo or mongomock database.
+    """
+    if mongo_uri:
+        from pymongo import MongoClient
+        client = MongoClient(mongo_uri)
+    else:
+        try:
+            import mongomock
+        except ImportError:
+            sys.exit("mongomock is not installed; install it or pass --mongo-uri")
+        client = mongomock.MongoClient()
+    client.drop_database(database)
+    return client[database]
+
+
+def seed(db, dataset: Dataset, rng: random.Random):
+    """
+    Insert the users and their expenses and revenues, each user's balance matching their transactions,
+    and a ledger opening every user's account before the data, with an entry of every transaction at its date.
+    """
+    users, expenses, revenues = [], [], []
+    for index in range(dataset.users):
+        user_id = dataset.user_id(index)
+        user_expenses = [make_transaction('expense', index * dataset.expenses_per_user + i + 1, user_id, rng)
+                         for i in range(dataset.expenses_per_user)]
+        user_revenues = [make_transaction('revenue', index * dataset.revenues_per_user + i + 1, user_id, rng)
+                         for i in range(dataset.revenues_per_user)]
+        balance = sum(r['amount'] for r in user_revenues) - sum(e['amount'] for e in user_expenses)
+        users.append(make_user(index, round(balance, 2)))
+        expenses += user_expenses
+        revenues += user_revenues
+    db['users'].insert_many(users)
+    if expenses:
+        db['expenses'].insert_many(expenses)
+    if revenues:
+        db['revenues'].insert_many(revenues)
+    # The accounts are opened with a zero balance before the first transaction, so a balance exists at any moment
+    ledger = [{'userId': user['id'], 'at': OPENED_AT, 'amount': 0.0, 'kind': 'opening', 'reference': None}
+              for user in users]
+    ledger += [{'userId': transaction['userId'], 'at': transaction['date'], 'amount': sign * transaction['amount'],
+                'kind': kind, 'reference': transaction['id']}
+               for kind, sign, transactions in (('expense', -1, expenses), ('revenue', 1, revenues))
+               for transaction in transactions]
+    db['ledger'].insert_many(ledger)
+
+
+def scenarios(dataset: Dataset):
+    """
+    The requests of every route, in the order they run.
+    Each scenario is (name, method, build), build(i) returning the (url, params, json body)
+    of the i-th request. The write scenarios come last, and each deletes documents that
+    no earlier request needed.
+    Returns:
+        list: The scenarios.
+    """
+    def user(i):
+        return dataset.user_id(i % dataset.users)
+
+    def new_user(i):
+        return dataset.users + i
+
+    def transaction_body(kind, i, owner, transaction_id=0):
+        body = {'id': transaction_id, 'userId': owner, 'amount': 10 + i % 90,
+                'date': (datetime(2024, 6, 1) + timedelta(hours=i)).isoformat(), 'documentation': 'benchmark'}
+        if kind == 'expense':
+            body['beneficiary'] = BENEFICIARIES[i % len(BENEFICIARIES)]
+        else:
+            body['benefactor'] = BENEFACTORS[i % len(BENEFACTORS)]
+        return body
+
+    def user_body(i):
+        body = make_user(new_user(i))
+        body['birth_date'] = body['birth_date'].isoformat()
+        return body
+
+    return [
+        ('GET /user', 'GET', lambda i: ('/user', {'limit': 50}, None)),
+        ('GET /user/{user_id}', 'GET', lambda i: (f'/user/{user(i)}', None, None)),
+        ('GET /user/{user_id}/balance', 'GET',
+         lambda i: (f'/user/{user(i)}/balance', {'at': (datetime(2023, 1, 2) + timedelta(days=i % 730)).isoformat()},
+                    None)),
+        ('POST /user/login', 'POST', lambda i: ('/user/login', {'email': dataset.email(i % dataset.users),
+                                                               'password': PASSWORD}, None)),
+        ('GET /expense', 'GET', lambda i: ('/expense', {'user_id': user(i)}, None)),
+        ('GET /expense/{expense_id}', 'GET',
+         lambda i: (f'/expense/{dataset.expense(i)[0]}', {'user_id': dataset.expense(i)[1]}, None)),
+        ('GET /revenue', 'GET', lambda i: ('/revenue', {'user_id': user(i)}, None)),
+        ('GET /revenue/{revenue_id}', 'GET',
+         lambda i: (f'/revenue/{dataset.revenue(i)[0]}', {'user_id': dataset.revenue(i)[1]}, None)),
+        ('GET /vis/expense_and_revenue_by_date', 'GET',
+         lambda i: ('/vis/expense_and_revenue_by_date', {'user_id': user(i)}, None)),
+        ('GET /vis/balance-over-time', 'GET', lambda i: ('/vis/balance-over-time', {'user_id': user(i)}, None)),
+        ('GET /vis/balance-series', 'GET', lambda i: ('/vis/balance-series', {'user_id': user(i)}, None)),
+        ('GET /vis/expense-distribution-by-category', 'GET',
+         lambda i: ('/vis/expense-distribution-by-category', {'user_id': user(i)}, None)),
+        ('GET /vis/monthly_summary', 'GET', lambda i: ('/vis/monthly_summary', {'user_id': user(i)}, None)),
+        ('GET /vis/render-stats', 'GET', lambda i: ('/vis/render-stats', None, None)),
+        ('GET /vis/cache-stats', 'GET', lambda i: ('/vis/cache-stats', None, None)),
+        ('POST /expense', 'POST', lambda i: ('/expense', None, transaction_body('expense', i, user(i)))),
+        ('POST /revenue', 'POST', lambda i: ('/revenue', None, transaction_body('revenue', i, user(i)))),
+        ('PUT /expense/{expense_id}', 'PUT',
+         lambda i: (f'/expense/{dataset.expense(i)[0]}', None,
+                    transaction_body('expense', i, dataset.expense(i)[1], dataset.expense(i)[0]))),
+        ('PUT /revenue/{revenue_id}', 'PUT',
+         lambda i: (f'/revenue/{dataset.revenue(i)[0]}', None,
+                    transaction_body('revenue', i, dataset.revenue(i)[1], dataset.revenue(i)[0]))),
+        ('POST /user/', 'POST', lambda i: ('/user/', None, user_body(i))),
+        ('PUT /user/{user_id}', 'PUT', lambda i: (f'/user/{dataset.user_id(new_user(i))}', None, user_body(i))),
+        ('DELETE /expense/{expense_id}', 'DELETE',
+         lambda i: (f'/expense/{dataset.expense(i)[0]}', {'user_id': dataset.expense(i)[1]}, None)),
+        ('DELETE /revenue/{revenue_id}', 'DELETE',
+         lambda i: (f'/revenue/{dataset.revenue(i)[0]}', {'user_id': dataset.revenue(i)[1]}, None)),
+        ('DELETE /user/{user_id}', 'DELETE', lambda i: (f'/user/{dataset.user_id(new_user(i))}', None, None)),
+    ]
+
+
+def percentile(sorted_values, fraction: float):
+    """
+    Returns the nearest-rank percentile of sorted values, e.g. fraction=0.95 for p95.
+    """
+    if not sorted_values:
+        return 0.0
+    rank = max(1, round(fraction * len(sorted_values)))
+    return sorted_values[min(rank, len(sorted_values)) - 1]
+
+
+async def run_route(client: httpx.AsyncClient, method: str, build, requests: int, concurrency: int):
+    """
+    Send the requests of one route with at most `concurrency` of them in flight.
+    Returns:
+        dict: The number of requests and errors, the latency percentiles and mean in
+            milliseconds and the throughput in requests per second.
+    """
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies, errors = [], []
+
+    async def send(i):
+        url, params, body = build(i)
+        async with semaphore:
+            started = time.perf_counter()
+            response = await client.request(method, url, params=params, json=body)
+            latencies.append(time.perf_counter() - started)
+        # Several controllers return their HTTPException as the body of a 200 response
+        if response.status_code >= 400 or '"status_code":' in response.text[:40]:
+            errors.append(f'{response.status_code} {response.text[:200]}')
+
+    started = time.perf_counter()
+    await asyncio.gather(*(send(i) for i in range(requests)))
+    elapsed = time.perf_counter() - started
+    latencies.sort()
+    return {
+        'requests': requests,
+        'errors': len(errors),
+        'first_error': errors[0] if errors else None,
+        'p50_ms': round(percentile(latencies, 0.50) * 1000, 3),
+        'p95_ms': round(percentile(latencies, 0.95) * 1000, 3),
+        'p99_ms': round(percentile(latencies, 0.99) * 1000, 3),
+        'mean_ms': round(sum(latencies) / len(latencies) * 1000, 3) if latencies else 0.0,
+        'throughput_rps': round(requests / elapsed, 1) if elapsed else 0.0,
+    }
+
+
+async def run(args):
+    """
+    Seed the database, start the application and benchmark every route.
+    Returns:
+        dict: The configuration of the run and the results of every route.
+    """
+    dataset = Dataset(args.users, args.transactions)
+    db = connect(args.mongo_uri, args.database)
+    seed(db, dataset, random.Random(args.seed))
+    database_connection.use_database(db)
+
+    # Imported after the database is replaced, like the application would be started
+    from app.main import app
+    from app.services import ledger_service, rollup_service
+
+    await rollup_service.rebuild()
+    # Yearly snapshots, so a balance reads one snapshot and at most a year of ledger entries
+    for cutoff in (datetime(2024, 1, 1), datetime(2025, 1, 1)):
+        await ledger_service.compact(cutoff)
+    routes = {}
+    transport = httpx.ASGITransport(app=app)
+    async with app.router.lifespan_context(app):
+        async with httpx.AsyncClient(transport=transport, base_url='http://benchmark') as client:
+            for name, method, build in scenarios(dataset):
+                if args.routes and not any(pattern in name for pattern in args.routes):
+                    continue
+                requests = args.requests
+                if name.startswith('DELETE /expense'):
+                    requests = min(requests, dataset.users * dataset.expenses_per_user)
+                elif name.startswith('DELETE /revenue'):
+                    requests = min(requests, dataset.users * dataset.revenues_per_user)
+                if method == 'GET' and args.warmup:
+                    await run_route(client, method, build, args.warmup, args.concurrency)
+                routes[name] = await run_route(client, method, build, requests, args.concurrency)
+                print_result(name, routes[name])
+
+    return {
+        'config': {
+            'users': args.users,
+            'transactions': args.transactions,
+            'requests': args.requests,
+            'concurrency': args.concurrency,
+            'seed': args.seed,
+            'database': 'mongodb' if args.mongo_uri else 'mongomock',
+            'db_backend': settings.DB_BACKEND,
+            'db_executor_workers': settings.DB_EXECUTOR_WORKERS,
+            'python': platform.python_version(),
+            'started_at': datetime.now().isoformat(timespec='seconds'),
+        },
+        'routes': routes,
+    }
+
+
+def print_result(name: str, result: dict):
+    print(f"{name:<45} {result['requests']:>6} {result['errors']:>6} {result['p50_ms']:>9.2f} "
+          f"{result['p95_ms']:>9.2f} {result['p99_ms']:>9.2f} {result['throughput_rps']:>9.1f}")
+    if result['first_error']:
+        print(f"    first error: {result['first_error']}")
+
+
+def compare(results: dict, baseline: dict, fail_above: float = None):
+    """
+    Print the change of every route's p50, p95 and throughput against a baseline run.
+    Args:
+        results (dict): The results of this run.
+        baseline (dict): The results of the baseline run, as saved with --output.
+        fail_above (float, optional): The p95 increase, in percent, counted as a regression.
+    Returns:
+        list: The names of the routes whose p95 regressed by more than fail_above.
+    """
+    def change(current, previous):
+        return (current - previous) / previous * 100 if previous else 0.0
+
+    regressions = []
+    print(f"\n{'route':<45} {'p50 %':>9} {'p95 %':>9} {'req/s %':>9}")
+    for name, result in results['routes'].items():
+        previous = baseline['routes'].get(name)
+        if previous is None:
+            print(f"{name:<45} {'(new)':>9}")
+            continue
+        p95_change = change(result['p95_ms'], previous['p95_ms'])
+        print(f"{name:<45} {change(result['p50_ms'], previous['p50_ms']):>+9.1f} {p95_change:>+9.1f} "
+              f"{change(result['throughput_rps'], previous['throughput_rps']):>+9.1f}")
+        if fail_above is not None and p95_change > fail_above:
+            regressions.append(name)
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--users', type=int, default=20, help='number of seeded users')
+    parser.add_argument('--transactions', type=int, default=200, help='number of transactions per seeded user')
+    parser.add_argument('--requests', type=int, default=100, help='number of requests per route')
+    parser.add_argument('--concurrency', type=int, default=16, help='maximum number of requests in flight')
+    parser.add_argument('--warmup', type=int, default=5, help='untimed requests sent first to each GET route')
+    parser.add_argument('--routes', nargs='*', help='only run the routes whose name contains one of these')
+    parser.add_argument('--seed', type=int, default=42, help='seed of the generated data')
+    parser.add_argument('--mongo-uri', help='MongoDB connection string; mongomock is used when omitted')
+    parser.add_argument('--database', default='finance_master_benchmark',
+                        help='database to drop and seed on the MongoDB server')
+    parser.add_argument('--output', help='file to save the results to, as JSON')
+    parser.add_argument('--compare', help='results file of a previous run to compare with')
+    parser.add_argument('--fail-above', type=float,
+                        help='with --compare, exit with status 1 if a p95 increased by more than this percentage')
+    args = parser.parse_args()
+    if args.users < 1 or args.transactions < 2:
+        parser.error('--users must be at least 1 and --transactions at least 2')
+
+    print(f"{'route':<45} {'n':>6} {'errors':>6} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'req/s':>9}")
+    results = asyncio.run(run(args))
+    if args.output:
+        with open(args.output, 'w') as file:
+            json.dump(results, file, indent=2)
+    if args.compare:
+        with open(args.compare) as file:
+            regressions = compare(results, json.load(file), args.fail_above)
+        if regressions:
+            sys.exit(f"p95 regressed by more than {args.fail_above}% on: {', '.join(regressions)}")
+    failing = [name for name, result in results['routes'].items()
+               if result['requests'] and result['errors'] == result['requests']]
+    if failing:
+        sys.exit(f"Every request failed on: {', '.join(failing)}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,81 @@
+from app.cache.lru_cache import LRUCache
+from app.cache.versions import Versions
+from app.config import settings
+from app.metrics import metrics
+
+# Rendered charts and chart aggregates, keyed by (user_id, data version, kind, parameters).
+_cache = LRUCache(settings.CHART_CACHE_MAX_ENTRIES, settings.CHART_CACHE_MAX_BYTES, settings.CHART_CACHE_TTL)
+
+# Version of the data of each user. Bumping it makes all the user's cached entries unreachable.
+_versions = Versions(_cache)
+
+_MISSING = object()
+
+
+def data_version(user_id: str):
+    """
+    Return the current version of a user's data.
+    Args:
+        user_id (str): The ID of the user.
+    Returns:
+        int: The version, bumped by every write to the user's data.
+    """
+    return _versions.get(user_id)
+
+
+def invalidate_user(user_id: str):
+    """
+    Mark a user's data as changed, so their cached charts and aggregates are never served again.
+    Called by the services after every write to a user, their expenses or their revenues.
+    Args:
+        user_id (str): The ID of the user whose data changed.
+    """
+    _versions.bump(user_id)
+
+
+async def get_or_compute(user_id: str, kind: str, params: tuple, compute):
+    """
+    Return a cached chart or aggregate, computing and caching it on a miss.
+    The data version is read before computing, so a value computed while a write is
+    in progress is cached under the old version and is not served after the write.
+    Cached values are shared between requests and must not be mutated.
+    Args:
+        user_id (str): The ID of the user the value belongs to.
+        kind (str): The kind of value, e.g. 'monthly_summary' or 'balance_series'.
+        params (tuple): The parameters the value depends on, e.g. the image format.
+        compute (callable): An async function computing the value.
+    Returns:
+        The cached or computed value.
+    """
+    with _versions.loading(user_id) as version:
+        key = (user_id, version, kind, params)
+        value = _cache.get(key, _MISSING)
+        if value is _MISSING:
+            value = await compute()
+            _cache.set(key, value)
+    return value
+
+
+def stats():
+    """
+    Returns the cache metrics.
+    Returns:
+        dict: The hit, miss, eviction and expiration counters, the hit ratio, the cache size
+            and the number of users with a data version under 'versions'.
+    """
+    result = _cache.stats()
+    result['versions'] = len(_versions)
+    return result
+
+
+chart_cache_stats = metrics.gauge('chart_cache', 'The chart cache metrics returned by chart_cache.stats().', ('stat',))
+
+
+@metrics.on_collect
+def _collect_metrics():
+    """
+    Copies the cache metrics into the chart_cache gauge before the metrics are exposed.
+    """
+    for stat, value in stats().items():
+        if value is not None:
+            chart_cache_stats.set(value, stat=stat)
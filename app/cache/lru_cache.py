@@ -0,0 +1,137 @@
+import pickle
+import threading
+import time
+from collections import OrderedDict
+
+
+def default_size_of(value):
+    """
+    Estimate the memory size of a cached value in bytes.
+    Args:
+        value: The cached value.
+    Returns:
+        int: The length of bytes values, and the pickled length of any other value.
+    """
+    if isinstance(value, (bytes, bytearray)):
+        return len(value)
+    return len(pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL))
+
+
+class LRUCache:
+    """
+    An in-process least-recently-used cache bounded by entry count and total size,
+    with an optional time to live. It is safe to use from several threads.
+    """
+
+    def __init__(self, max_entries: int, max_bytes: int = None, ttl: float = None, size_of=default_size_of):
+        """
+        Args:
+            max_entries (int): The maximum number of entries.
+            max_bytes (int, optional): The maximum total size of the entries, as measured by size_of.
+            ttl (float, optional): The seconds after which an entry expires.
+            size_of (callable): Returns the size of a value in bytes; only used with max_bytes.
+        """
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.size_of = size_of
+        self._entries = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self._stats = {'hits': 0, 'misses': 0, 'evictions': 0, 'expirations': 0}
+
+    def get(self, key, default=None):
+        """
+        Return the value cached for a key and mark it as recently used.
+        Args:
+            key: The key of the entry.
+            default: The value returned when the key is not cached or has expired.
+        Returns:
+            The cached value, or default.
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and self.ttl is not None and entry[2] <= time.monotonic():
+                self._remove(key)
+                self._stats['expirations'] += 1
+                entry = None
+            if entry is None:
+                self._stats['misses'] += 1
+                return default
+            self._entries.move_to_end(key)
+            self._stats['hits'] += 1
+            return entry[0]
+
+    def set(self, key, value):
+        """
+        Cache a value, evicting the least recently used entries to stay within the bounds.
+        A value larger than max_bytes is not cached.
+        Args:
+            key: The key of the entry.
+            value: The value to cache.
+        """
+        size = self.size_of(value) if self.max_bytes is not None else 0
+        if self.max_bytes is not None and size > self.max_bytes:
+            return
+        expires = time.monotonic() + self.ttl if self.ttl is not None else None
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = (value, size, expires)
+            self._bytes += size
+            while len(self._entries) > self.max_entries or \
+                    (self.max_bytes is not None and self._bytes > self.max_bytes):
+                self._remove(next(iter(self._entries)))
+                self._stats['evictions'] += 1
+
+    def delete(self, key):
+        """
+        Remove the entry of a key, if it is cached.
+        Args:
+            key: The key of the entry.
+        """
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+
+    def keys(self):
+        """
+        Return the keys of the entries, including the expired entries not removed yet.
+        Returns:
+            list: A snapshot of the keys, from the least to the most recently used.
+        """
+        with self._lock:
+            return list(self._entries)
+
+    def clear(self):
+        """
+        Remove all the entries.
+        """
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def stats(self):
+        """
+        Returns the cache metrics.
+        Returns:
+            dict: The hit, miss, eviction and expiration counters, the hit ratio,
+                the current number and size of the entries, and the bounds.
+        """
+        with self._lock:
+            result = dict(self._stats)
+            result['entries'] = len(self._entries)
+            result['bytes'] = self._bytes
+        lookups = result['hits'] + result['misses']
+        result['hit_ratio'] = result['hits'] / lookups if lookups else 0.0
+        result['max_entries'] = self.max_entries
+        result['max_bytes'] = self.max_bytes
+        result['ttl'] = self.ttl
+        return result
+
+    def _remove(self, key):
+        """
+        Remove an entry; the caller holds the lock.
+        """
+        _, size, _ = self._entries.pop(key)
+        self._bytes -= size
@@ -0,0 +1,70 @@
+from app.cache.lru_cache import LRUCache
+from app.cache.versions import Versions
+from app.config import settings
+from app.metrics import metrics
+
+# User documents, keyed by (user_id, version).
+_cache = LRUCache(settings.USER_CACHE_MAX_ENTRIES, ttl=settings.USER_CACHE_TTL)
+
+# Version of each user's document. Bumping it makes the cached document unreachable.
+_versions = Versions(_cache)
+
+
+def invalidate(user_id: str):
+    """
+    Mark a user's document as changed, so the cached copy is never served again.
+    Called after every change of the user or their balance, once the change is committed.
+    Args:
+        user_id (str): The ID of the user whose document changed.
+    """
+    _versions.bump(user_id)
+
+
+async def get_or_load(user_id: str, load):
+    """
+    Return a user's document from the cache, loading and caching it on a miss.
+    The version is read before loading, so a document loaded while a change is being
+    written is cached under the old version and is not served after the change.
+    Missing users are not cached. With USER_CACHE_ENABLED off, the document is always loaded.
+    Args:
+        user_id (str): The ID of the user.
+        load (callable): An async function loading the document, or returning None if the user does not exist.
+    Returns:
+        dict: A copy of the document, or None if the user does not exist.
+    """
+    if not settings.USER_CACHE_ENABLED:
+        return await load()
+    with _versions.loading(user_id) as version:
+        key = (user_id, version)
+        user = _cache.get(key)
+        if user is None:
+            user = await load()
+            if user is None:
+                return None
+            _cache.set(key, user)
+    return dict(user)
+
+
+def stats():
+    """
+    Returns the cache metrics.
+    Returns:
+        dict: The hit, miss, eviction and expiration counters, the hit ratio, the cache size
+            and the number of users with a version under 'versions'.
+    """
+    result = _cache.stats()
+    result['versions'] = len(_versions)
+    return result
+
+
+user_cache_stats = metrics.gauge('user_cache', 'The user cache metrics returned by user_cache.stats().', ('stat',))
+
+
+@metrics.on_collect
+def _collect_metrics():
+    """
+    Copies the cache metrics into the user_cache gauge before the metrics are exposed.
+    """
+    for stat, value in stats().items():
+        if value is not None:
+            user_cache_stats.set(value, stat=stat)
@@ -0,0 +1,81 @@
+import threading
+from contextlib import contextmanager
+
+
+class Versions:
+    """
+    The data version of each owner of the entries of a cache, e.g. of each user.
+    The cache keys include the version of their owner, so bumping it makes all the owner's
+    entries unreachable. The versions of owners that no cached entry and no load in flight
+    refer to are pruned, so the versions stay bounded by the size of the cache.
+    It is safe to use from several threads.
+    """
+
+    def __init__(self, cache, owner_of=lambda key: key[0]):
+        """
+        Args:
+            cache (LRUCache): The cache whose keys include the versions.
+            owner_of (callable): Returns the owner of a cache key; the first item of the key by default.
+        """
+        self.cache = cache
+        self.owner_of = owner_of
+        self._versions = {}
+        self._loading = {}
+        self._pruned_size = 0
+        self._lock = threading.Lock()
+
+    def get(self, owner):
+        """
+        Return the current version of an owner's data.
+        Args:
+            owner: The owner, e.g. a user ID.
+        Returns:
+            int: The version, bumped by every change of the owner's data.
+        """
+        return self._versions.get(owner, 0)
+
+    def bump(self, owner):
+        """
+        Mark an owner's data as changed, so their cached entries are never served again.
+        Args:
+            owner: The owner whose data changed.
+        """
+        with self._lock:
+            self._versions[owner] = self._versions.get(owner, 0) + 1
+            if len(self._versions) > max(2 * self._pruned_size, self.cache.max_entries):
+                self._prune()
+
+    @contextmanager
+    def loading(self, owner):
+        """
+        Read an owner's version for a cache lookup, and keep it while a missing value is loaded.
+        The version is read before loading, so a value loaded while a change is being written is
+        cached under the old version and is not served after the change. The version is not
+        pruned while the load is in flight.
+        Args:
+            owner: The owner of the looked-up entry.
+        Yields:
+            int: The version to include in the cache key.
+        """
+        with self._lock:
+            self._loading[owner] = self._loading.get(owner, 0) + 1
+            version = self._versions.get(owner, 0)
+        try:
+            yield version
+        finally:
+            with self._lock:
+                self._loading[owner] -= 1
+                if not self._loading[owner]:
+                    del self._loading[owner]
+
+    def __len__(self):
+        return len(self._versions)
+
+    def _prune(self):
+        """
+        Drop the versions of the owners without cached entries or loads in flight; the caller holds the lock.
+        Such an owner starts again from version 0, as no entry of an older version can be served.
+        """
+        referenced = {self.owner_of(key) for key in self.cache.keys()} | set(self._loading)
+        self._versions = {owner: version for owner, version in self._versions.items() if owner in referenced}
+        self._pruned_size = len(self._versions)
@@ -0,0 +1,111 @@
+import os
+
+# Repository backend used to run the blocking pymongo calls:
+#   "executor" - run them on a bounded thread pool so the event loop is never blocked.
+#   "inline"   - call pymongo directly on the event loop (the original behaviour).
+DB_BACKEND = os.getenv('DB_BACKEND', 'executor')
+
+# Number of threads of the "executor" backend, i.e. the maximum number of concurrent database calls.
+DB_EXECUTOR_WORKERS = int(os.getenv('DB_EXECUTOR_WORKERS', '16'))
+
+# MongoDB connection string and database name. The client is created on first use.
+DB_CONNECTION_STRING = os.getenv('DB_CONNECTION_STRING')
+DB_NAME = os.getenv('DB_NAME', 'finance_master')
+
+# Connection pool of the MongoDB client. DB_MAX_POOL_SIZE should be at least DB_EXECUTOR_WORKERS,
+# so that every repository thread can hold a connection without waiting for another one.
+DB_MAX_POOL_SIZE = int(os.getenv('DB_MAX_POOL_SIZE', '100'))
+DB_MIN_POOL_SIZE = int(os.getenv('DB_MIN_POOL_SIZE', '0'))
+DB_MAX_IDLE_TIME_MS = int(os.getenv('DB_MAX_IDLE_TIME_MS', '0')) or None
+
+# Timeouts of the MongoDB client, in milliseconds; 0 leaves the socket and wait-queue timeouts unset.
+DB_CONNECT_TIMEOUT_MS = int(os.getenv('DB_CONNECT_TIMEOUT_MS', '5000'))
+DB_SERVER_SELECTION_TIMEOUT_MS = int(os.getenv('DB_SERVER_SELECTION_TIMEOUT_MS', '5000'))
+DB_SOCKET_TIMEOUT_MS = int(os.getenv('DB_SOCKET_TIMEOUT_MS', '0')) or None
+DB_WAIT_QUEUE_TIMEOUT_MS = int(os.getenv('DB_WAIT_QUEUE_TIMEOUT_MS', '0')) or None
+
+# Read preference of the MongoDB client, e.g. primary, primaryPreferred or secondaryPreferred.
+DB_READ_PREFERENCE = os.getenv('DB_READ_PREFERENCE', 'primary')
+
+# Comma-separated wire compressors to negotiate with the server, e.g. "zstd,snappy,zlib"; none when empty.
+DB_COMPRESSORS = os.getenv('DB_COMPRESSORS', '')
+
+# Whether writes that change several documents (a transaction and the user's balance) run in a
+# MongoDB transaction:
+#   "auto" - when the server supports them, i.e. it is a replica set or a sharded cluster.
+#   "off"  - never; a failed step is compensated instead.
+DB_TRANSACTIONS = os.getenv('DB_TRANSACTIONS', 'auto')
+
+# Largest page size the list endpoints accept in their "limit" parameter.
+PAGE_SIZE_MAX = int(os.getenv('PAGE_SIZE_MAX', '1000'))
+
+# Number of documents the streaming export reads from the database per round trip.
+EXPORT_BATCH_SIZE = int(os.getenv('EXPORT_BATCH_SIZE', '1000'))
+
+# Number of worker processes rendering the /vis charts.
+RENDER_POOL_SIZE = int(os.getenv('RENDER_POOL_SIZE', '2'))
+
+# Maximum number of charts queued or being rendered at once; further requests are rejected.
+RENDER_QUEUE_SIZE = int(os.getenv('RENDER_QUEUE_SIZE', '32'))
+
+# Seconds a chart request waits for its image before it fails.
+RENDER_TIMEOUT = float(os.getenv('RENDER_TIMEOUT', '30'))
+
+# How the monthly summary and the category distribution are computed:
+#   "rollup" - by reading the precomputed monthly_rollups collection (the monthly summary only;
+#              the category distribution then uses "mongo").
+#   "mongo"  - with aggregation pipelines, so only the grouped rows leave the database.
+#   "pandas" - by loading the transactions and grouping them in the application.
+# With "rollup", empty rollups are backfilled from the transactions at startup.
+ANALYTICS_BACKEND = os.getenv('ANALYTICS_BACKEND', 'rollup')
+
+# Bounds of the cache of rendered charts and chart aggregates. Each process has its own cache,
+# so with several workers an entry may be served up to CHART_CACHE_TTL seconds after a write
+# handled by another worker.
+CHART_CACHE_MAX_ENTRIES = int(os.getenv('CHART_CACHE_MAX_ENTRIES', '1024'))
+CHART_CACHE_MAX_BYTES = int(os.getenv('CHART_CACHE_MAX_BYTES', str(64 * 1024 * 1024)))
+CHART_CACHE_TTL = float(os.getenv('CHART_CACHE_TTL', '300'))
+
+# Cache of the user documents read by ID. Each process has its own cache, so with several workers
+# a user may be served up to USER_CACHE_TTL seconds after a change handled by another worker.
+USER_CACHE_ENABLED = os.getenv('USER_CACHE_ENABLED', 'true').lower() in ('1', 'true', 'yes')
+USER_CACHE_MAX_ENTRIES = int(os.getenv('USER_CACHE_MAX_ENTRIES', '10000'))
+USER_CACHE_TTL = float(os.getenv('USER_CACHE_TTL', '30'))
+
+# Level of the application log, e.g. DEBUG, INFO or WARNING. Calls logged by log_decorator are at INFO.
+LOG_LEVEL = os.getenv('LOG_LEVEL', 'INFO').upper()
+
+# Maximum number of characters of the arguments or the result of a call written to the log.
+LOG_MAX_PAYLOAD_CHARS = int(os.getenv('LOG_MAX_PAYLOAD_CHARS', '1000'))
+
+# Maximum number of log records waiting to be written; records are dropped while the queue is full.
+LOG_QUEUE_SIZE = int(os.getenv('LOG_QUEUE_SIZE', '10000'))
+
+# Whether the repository metrics measure the BSON size of the returned documents,
+# which costs one encoding of every document on the request path.
+METRICS_DOCUMENT_BYTES = os.getenv('METRICS_DOCUMENT_BYTES', 'true').lower() in ('1', 'true', 'yes')
+
+# Maximum number of rows accepted by one bulk import request.
+IMPORT_MAX_ROWS = int(os.getenv('IMPORT_MAX_ROWS', '10000'))
+
+# Seconds an Idempotency-Key is remembered. The keys are removed by a TTL index, so changing this
+# only affects the index once it is dropped and created again.
+IDEMPOTENCY_TTL = int(os.getenv('IDEMPOTENCY_TTL', '86400'))
+
+# Seconds a request holds its Idempotency-Key while it runs. A retry takes over a key still pending
+# after this lease, e.g. when the process handling the first request died; it should be a few
+# request timeouts long, so the first request is finished by then.
+IDEMPOTENCY_LEASE = float(os.getenv('IDEMPOTENCY_LEASE', '120'))
+
+# Seconds between two runs of the compactor writing the balance snapshots of the users' ledgers;
+# 0 disables it. The balance at a moment is read from the last snapshot before it, plus the ledger
+# entries since, so at most the entries of one interval are scanned.
+LEDGER_SNAPSHOT_INTERVAL = float(os.getenv('LEDGER_SNAPSHOT_INTERVAL', '3600'))
+
+# Age in seconds of the newest ledger entries a snapshot covers. An entry's time is taken before it
+# is committed, so a snapshot only covers entries that are old enough to have been committed.
+LEDGER_SNAPSHOT_DELAY = float(os.getenv('LEDGER_SNAPSHOT_DELAY', '60'))
+
+# Number of users whose snapshots the compactor computes concurrently. Each takes two database calls,
+# so keeping this well under DB_EXECUTOR_WORKERS leaves the repository threads to the requests.
+LEDGER_SNAPSHOT_BATCH_SIZE = int(os.getenv('LEDGER_SNAPSHOT_BATCH_SIZE', '4'))
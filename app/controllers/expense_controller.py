@@ -1,27 +1,40 @@
-import json
-from bson import json_util
-from fastapi import APIRouter, HTTPException
+from typing import Annotated, Optional
 
+from fastapi import APIRouter, Header, HTTPException, Query
+
+from app.config import settings
 from app.models.expense import Expense
-from app.services import expense_service
+from app.serialization.json_encoder import MongoJSONResponse
+from app.services import expense_service, idempotency_service
 
 expense_router = APIRouter()
 
 
 @expense_router.get('')
-async def get_expenses(user_id: str):
+async def get_expenses(user_id: str,
+                       limit: Annotated[Optional[int], Query(ge=1, le=settings.PAGE_SIZE_MAX)] = None,
+                       after: Optional[str] = None, fields: Optional[str] = None):
+    """
+    Retrieves details about the expenses of a specific user from the database, ordered by date.
+    Args:
+        user_id (str): The ID of the user whose expenses are to be retrieved.
+        limit (int, optional): The maximum number of expenses to return; all of them when omitted.
+        after (str, optional): The cursor of the page to return, taken from the X-Next-Cursor
+            header of the previous page.
+        fields (str, optional): A comma-separated list of the fields to return.
+    Returns:
+        list: A list of dictionaries, each representing an expense entry. When more expenses remain,
+            the X-Next-Cursor response header holds the cursor of the next page.
+    Raises:
+        HTTPException: If the cursor is invalid or an error occurs while fetching expenses from the database.
     """
-        Retrieves details about all expenses for a specific user from the database.
-        Args:
-            user_id (str): The ID of the user whose expenses are to be retrieved.
-        Returns:
-            list: A list of dictionaries, each representing an expense entry.
-        Raises:
-            HTTPException: If an error occurs while fetching expenses from the database.
-        """
     try:
-        expenses = await expense_service.get_expenses(user_id)
-        return json.loads(json_util.dumps(expenses))
+        page = await expense_service.get_expenses_page(user_id, limit, after,
+                                                       fields.split(',') if fields else None)
+        headers = {'X-Next-Cursor': page['next_cursor']} if page['next_cursor'] is not None else None
+        return MongoJSONResponse(page['items'], headers=headers)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=404, detail=str(e))
 
@@ -40,25 +53,32 @@ async def get_expense_by_id(expense_id: int, user_id: str):
       """
     try:
         expense = await expense_service.get_expense_by_id(expense_id, user_id)
-        return json.loads(json_util.dumps(expense))
+        return MongoJSONResponse(expense)
     except Exception as e:
         raise HTTPException(status_code=404, detail=str(e))
 
 
 @expense_router.post('')
-async def add_expense(new_expense: Expense):
+async def add_expense(new_expense: Expense, idempotency_key: Annotated[Optional[str], Header()] = None):
     """
     Adds a new expense entry to the database.
     Args:
         new_expense (Expense): An instance of the Expense class representing the expense entry to be added.
+        idempotency_key (str, optional): The Idempotency-Key header. A client retrying the request
+            sends the same key, and the expense is added only once.
     Returns:
         str: A confirmation message indicating the expense has been successfully added.
     Raises:
-        HTTPException: If an error occurs while adding the expense entry.
+        HTTPException: If an error occurs while adding the expense entry, the idempotency key was used
+            with a different request (422) or that request is still being processed (409).
     """
     try:
-        expense = await expense_service.add_expense(new_expense)
+        expense = await expense_service.add_expense(new_expense, idempotency_key)
         return "The expense has been successfully added👼👻"
+    except idempotency_service.IdempotencyKeyReusedError as e:
+        raise HTTPException(status_code=422, detail=str(e))
+    except idempotency_service.IdempotencyKeyInUseError as e:
+        raise HTTPException(status_code=409, detail=str(e))
     except ValueError as e:
         return HTTPException(status_code=400, detail=str(e))
     except Exception as e:
@@ -99,7 +119,7 @@ async def delete_expense(expense_id: int, user_id: str):
        """
     try:
         deleted_expense = await expense_service.delete_expense(expense_id, user_id)
-        return json.loads(json_util.dumps(deleted_expense))
+        return MongoJSONResponse(deleted_expense)
     except ValueError as e:
         return HTTPException(status_code=400, detail=str(e))
     except Exception as e:
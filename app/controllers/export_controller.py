@@ -0,0 +1,29 @@
+from fastapi import APIRouter, HTTPException
+from fastapi.responses import StreamingResponse
+
+from app.services import export_service, user_service
+
+export_router = APIRouter()
+
+
+@export_router.get('')
+async def export_transactions(user_id: str, format: str = 'ndjson'):
+    """
+    Streams the full transaction history of a user, expenses and revenues merged in date order.
+    The history is read and sent in batches, so memory use does not depend on its size.
+    Args:
+        user_id (str): The ID of the user whose history is exported.
+        format (str): 'ndjson' for one JSON document per line (default), or 'csv'.
+    Returns:
+        StreamingResponse: The exported history, as an attachment.
+    Raises:
+        HTTPException: If the format is not supported or the user is not found.
+    """
+    try:
+        chunks = export_service.export_transactions(user_id, format)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    if await user_service.get_user_by_id(user_id) is None:
+        raise HTTPException(status_code=404, detail="User not found")
+    return StreamingResponse(chunks, media_type=export_service.MEDIA_TYPES[format],
+                             headers={'Content-Disposition': f'attachment; filename="{user_id}.{format}"'})
@@ -0,0 +1,18 @@
+from fastapi import APIRouter
+from fastapi.responses import JSONResponse
+
+from app.database import database_connection
+
+health_router = APIRouter()
+
+
+@health_router.get('')
+def get_health():
+    """
+    Endpoint reporting whether the database answers and the state of its connection pool.
+    It is a plain function, so FastAPI runs the blocking ping on its thread pool.
+    Returns:
+        JSONResponse: The health report, with status 200 when the database answers and 503 otherwise.
+    """
+    report = database_connection.health()
+    return JSONResponse(report, status_code=200 if report['status'] == 'ok' else 503)
@@ -0,0 +1,44 @@
+from typing import Annotated, Optional
+
+from fastapi import APIRouter, Header, HTTPException, Request
+
+from app.serialization.json_encoder import MongoJSONResponse
+from app.services import idempotency_service, import_service
+
+import_router = APIRouter()
+
+
+@import_router.post('')
+async def import_transactions(request: Request, format: str = 'json',
+                              idempotency_key: Annotated[Optional[str], Header()] = None):
+    """
+    Imports a batch of expenses and revenues, e.g. a replayed bank statement or an export.
+    Each row has a 'kind' of 'expense' or 'revenue' and the fields of the transaction; the
+    beneficiary or benefactor may be given as 'counterparty', like in the CSV export, and
+    the ids are allocated by the import. Invalid rows are reported and the others are imported.
+    A client retrying an import sends the same Idempotency-Key header, and gets the result of the
+    first import instead of importing the rows twice.
+    Args:
+        request (Request): The request, whose body holds the transactions.
+        format (str): 'json' for a JSON array (default), 'ndjson' for one JSON object per line, or 'csv'.
+        idempotency_key (str, optional): The Idempotency-Key header.
+    Returns:
+        dict: The number of rows, imported transactions per kind and failed rows, the error of
+            every failed row, and the new balances of the affected users.
+    Raises:
+        HTTPException: If the format is not supported, the body cannot be parsed or has too many
+            rows (400), the idempotency key was used with a different import (422) or that import is
+            still being processed (409), or an error occurs while writing the transactions.
+    """
+    body = await request.body()
+    try:
+        result = await import_service.import_transactions(body, format, idempotency_key)
+        return MongoJSONResponse(result)
+    except idempotency_service.IdempotencyKeyReusedError as e:
+        raise HTTPException(status_code=422, detail=str(e))
+    except idempotency_service.IdempotencyKeyInUseError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
@@ -0,0 +1,15 @@
+from fastapi import APIRouter, Response
+
+from app.metrics import metrics
+
+metrics_router = APIRouter()
+
+
+@metrics_router.get('')
+async def get_metrics():
+    """
+    Endpoint exposing the application metrics for scraping by Prometheus.
+    Returns:
+        Response: The registered metrics in the Prometheus text format.
+    """
+    return Response(content=metrics.expose(), media_type=metrics.CONTENT_TYPE)
@@ -1,28 +1,41 @@
-import json
-from bson import json_util
-from fastapi import APIRouter, HTTPException
+from typing import Annotated, Optional
 
+from fastapi import APIRouter, Header, HTTPException, Query
+
+from app.config import settings
 from app.models.expense import Expense
 from app.models.revenue import Revenue
-from app.services import expense_service, revenue_service
+from app.serialization.json_encoder import MongoJSONResponse
+from app.services import expense_service, idempotency_service, revenue_service
 
 revenue_router = APIRouter()
 
 
 @revenue_router.get('')
-async def get_revenues(user_id: str):
+async def get_revenues(user_id: str,
+                       limit: Annotated[Optional[int], Query(ge=1, le=settings.PAGE_SIZE_MAX)] = None,
+                       after: Optional[str] = None, fields: Optional[str] = None):
     """
-    Retrieves details about all revenues from the database.
+    Retrieves details about the revenues of a specific user from the database, ordered by date.
     Args:
-        user_id (int): The ID of the user.
+        user_id (str): The ID of the user whose revenues are to be retrieved.
+        limit (int, optional): The maximum number of revenues to return; all of them when omitted.
+        after (str, optional): The cursor of the page to return, taken from the X-Next-Cursor
+            header of the previous page.
+        fields (str, optional): A comma-separated list of the fields to return.
     Returns:
-        list: A list of dictionaries, each representing a revenue entry.
+        list: A list of dictionaries, each representing a revenue entry. When more revenues remain,
+            the X-Next-Cursor response header holds the cursor of the next page.
     Raises:
-        HTTPException: If an error occurs while fetching revenues from the database.
+        HTTPException: If the cursor is invalid or an error occurs while fetching revenues from the database.
     """
     try:
-        revenues = await revenue_service.get_revenues(user_id)
-        return json.loads(json_util.dumps(revenues))
+        page = await revenue_service.get_revenues_page(user_id, limit, after,
+                                                       fields.split(',') if fields else None)
+        headers = {'X-Next-Cursor': page['next_cursor']} if page['next_cursor'] is not None else None
+        return MongoJSONResponse(page['items'], headers=headers)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=404, detail=str(e))
 
@@ -41,25 +54,32 @@ async def get_revenue_by_id(revenue_id: int, user_id: str):
     """
     try:
         revenue = await revenue_service.get_revenue_by_id(revenue_id, user_id)
-        return json.loads(json_util.dumps(revenue))
+        return MongoJSONResponse(revenue)
     except Exception as e:
         raise HTTPException(status_code=404, detail=str(e))
 
 
 @revenue_router.post('')
-async def add_revenue(new_revenue: Revenue):
+async def add_revenue(new_revenue: Revenue, idempotency_key: Annotated[Optional[str], Header()] = None):
     """
     Adds a new revenue entry to the database.
     Args:
         new_revenue (Revenue): An instance of the Revenue class representing the revenue entry to be added.
+        idempotency_key (str, optional): The Idempotency-Key header. A client retrying the request
+            sends the same key, and the revenue is added only once.
     Returns:
         dict: A dictionary representing the newly added revenue entry.
     Raises:
-        HTTPException: If an error occurs while adding the revenue entry.
+        HTTPException: If an error occurs while adding the revenue entry, the idempotency key was used
+            with a different request (422) or that request is still being processed (409).
     """
     try:
-        revenue = await revenue_service.add_revenue(new_revenue)
+        revenue = await revenue_service.add_revenue(new_revenue, idempotency_key)
         return "The income has been added successfully😘😘"
+    except idempotency_service.IdempotencyKeyReusedError as e:
+        raise HTTPException(status_code=422, detail=str(e))
+    except idempotency_service.IdempotencyKeyInUseError as e:
+        raise HTTPException(status_code=409, detail=str(e))
     except ValueError as e:
         return HTTPException(status_code=400, detail=str(e))
     except Exception as e:
@@ -99,7 +119,7 @@ async def delete_revenue(revenue_id: int, user_id: str):
     """
     try:
         deleted_revenue = await revenue_service.delete_revenue(revenue_id, user_id)
-        return json.loads(json_util.dumps(deleted_revenue))
+        return MongoJSONResponse(deleted_revenue)
     except ValueError as e:
         return HTTPException(status_code=400, detail=str(e))
     except Exception as e:
@@ -1,24 +1,38 @@
-import json
-from bson import json_util
-from fastapi import APIRouter, HTTPException
+from datetime import datetime
+from typing import Annotated, Optional
+
+from fastapi import APIRouter, HTTPException, Query
+
+from app.config import settings
 from app.models.user import User
-from app.services import user_service
+from app.serialization.json_encoder import MongoJSONResponse
+from app.services import ledger_service, user_service
 
 user_router = APIRouter()
 
 
 @user_router.get('')
-async def get_users():
+async def get_users(limit: Annotated[Optional[int], Query(ge=1, le=settings.PAGE_SIZE_MAX)] = None,
+                    after: Optional[str] = None, fields: Optional[str] = None):
     """
-    Retrieves details about all users from the database.
+    Retrieves details about the users from the database, ordered by ID.
+    Args:
+        limit (int, optional): The maximum number of users to return; all of them when omitted.
+        after (str, optional): The cursor of the page to return, taken from the X-Next-Cursor
+            header of the previous page.
+        fields (str, optional): A comma-separated list of the fields to return.
     Returns:
-        list: A list of dictionaries, each representing a user.
+        list: A list of dictionaries, each representing a user. When more users remain,
+            the X-Next-Cursor response header holds the cursor of the next page.
     Raises:
-        HTTPException: If an error occurs while fetching users from the database.
+        HTTPException: If the cursor is invalid or an error occurs while fetching users from the database.
     """
     try:
-        users = await user_service.get_users()
-        return json.loads(json_util.dumps(users))
+        page = await user_service.get_users_page(limit, after, fields.split(',') if fields else None)
+        headers = {'X-Next-Cursor': page['next_cursor']} if page['next_cursor'] is not None else None
+        return MongoJSONResponse(page['items'], headers=headers)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=404, detail=str(e))
 
@@ -36,11 +50,34 @@ async def get_user_by_id(user_id: str):
     """
     try:
         user = await user_service.get_user_by_id(user_id)
-        return json.loads(json_util.dumps(user))
+        return MongoJSONResponse(user)
     except Exception as e:
         raise HTTPException(status_code=400, detail=f"An error occurred while fetching user: {e}")
 
 
+@user_router.get('/{user_id}/balance')
+async def get_balance(user_id: str, at: Optional[datetime] = None):
+    """
+    Retrieves the balance of a user at a moment, computed from the last balance snapshot before it
+    and the ledger entries recorded since.
+    Args:
+        user_id (str): The ID of the user.
+        at (datetime, optional): The moment, in ISO 8601; now when omitted. Times without an offset are UTC.
+    Returns:
+        dict: The user ID, the moment, the balance, and the time of the snapshot and the number of
+            ledger entries it was computed from.
+    Raises:
+        HTTPException: If no balance is recorded for the user at that moment (404), or if an error occurs.
+    """
+    try:
+        balance = await ledger_service.get_balance_at(user_id, at)
+        return MongoJSONResponse(balance)
+    except ValueError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+
 @user_router.post('/')
 async def add_user(new_user: User):
     """
@@ -75,7 +112,7 @@ async def login(email: str, password: str):
     """
     try:
         user = await user_service.login(email, password)
-        return json.loads(json_util.dumps(user))
+        return MongoJSONResponse(user)
     except ValueError as e:
         raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
@@ -105,16 +142,17 @@ async def update_user(user_id: str, updated_data: User):
 @user_router.delete('/{user_id}')
 async def delete_user(user_id: str):
     """
-    Deletes an existing user from the database.
+    Deletes an existing user and all of their expenses and revenues from the database.
     Args:
         user_id (str): The ID of the user to delete.
     Returns:
-        dict: A dictionary representing the deleted user.
+        dict: A dictionary representing the deleted user, including the number of
+            deleted expenses and revenues.
     Raises:
         HTTPException: If the specified user ID is not found or if an error occurs.
     """
     try:
         deleted_user = await user_service.delete_user(user_id)
-        return json.loads(json_util.dumps(deleted_user))
+        return MongoJSONResponse(deleted_user)
     except Exception as e:
         raise HTTPException(status_code=400, detail=f"An error occurred while deleting user: {e}")
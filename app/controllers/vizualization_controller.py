@@ -1,71 +1,162 @@
-from fastapi import APIRouter, HTTPException
-from app.services import visualization_service
+from typing import Optional
+
+from fastapi import APIRouter, HTTPException, Response
+from app.cache import chart_cache
+from app.services import chart_renderer, render_pool, visualization_service
 
 visualization_router = APIRouter()
 
 
 @visualization_router.get("/expense_and_revenue_by_date")
-async def get_expense_and_revenue_by_date(user_id: str):
+async def get_expense_and_revenue_by_date(user_id: str, format: str = 'png'):
     """
     Endpoint to generate a graph showing expenses and revenues over time for a specific user.
     Args:
-        user_id (int): The ID of the user.
+        user_id (str): The ID of the user.
+        format (str): The image format, 'png' (default) or 'svg'.
     Raises:
-        HTTPException: If there is an error during the process.
+        HTTPException: If the format is not supported, the renderer is busy or too slow,
+            or there is an error during the process.
 
     Returns:
-        None
+        Response: The rendered image.
     """
     try:
-        await visualization_service.expense_and_revenue_by_date(user_id)
+        image = await visualization_service.expense_and_revenue_by_date(user_id, format)
+        return Response(content=image, media_type=chart_renderer.MEDIA_TYPES[format])
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except render_pool.RenderPoolBusyError as e:
+        raise HTTPException(status_code=503, detail=str(e))
+    except TimeoutError as e:
+        raise HTTPException(status_code=504, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 
 @visualization_router.get("/balance-over-time")
-async def get_balance_over_time(user_id: str):
+async def get_balance_over_time(user_id: str, format: str = 'png', frequency: Optional[str] = None):
     """
     Endpoint to generate a graph showing the balance over time for a specific user.
     Args:
-        user_id (int): The ID of the user.
+        user_id (str): The ID of the user.
+        format (str): The image format, 'png' (default) or 'svg'.
+        frequency (str, optional): 'daily', 'weekly' or 'monthly' to plot the balance at the end of
+            each period instead of after each transaction date.
+    Raises:
+        HTTPException: If the format is not supported, the renderer is busy or too slow,
+            or there is an error during the process.
+    Returns:
+        Response: The rendered image.
+    """
+    try:
+        image = await visualization_service.balance_over_time(user_id, format, frequency)
+        return Response(content=image, media_type=chart_renderer.MEDIA_TYPES[format])
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except render_pool.RenderPoolBusyError as e:
+        raise HTTPException(status_code=503, detail=str(e))
+    except TimeoutError as e:
+        raise HTTPException(status_code=504, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@visualization_router.get("/balance-series")
+async def get_balance_series(user_id: str, frequency: Optional[str] = None):
+    """
+    Endpoint to get the balance of a specific user after each of their transactions.
+    Args:
+        user_id (str): The ID of the user.
+        frequency (str, optional): 'daily', 'weekly' or 'monthly' to get the balance at the end of
+            each period instead of after each transaction date.
     Raises:
-        HTTPException: If there is an error during the process.
+        HTTPException: If the user is not found, the frequency is not supported,
+            or there is an error during the process.
     Returns:
-        None
+        dict: The opening balance and the list of points of the series, each with a date and a balance.
     """
     try:
-        await visualization_service.balance_over_time(user_id)
+        series = await visualization_service.balance_series(user_id, frequency)
+        return {
+            'user_id': user_id,
+            'opening_balance': series['opening_balance'],
+            'points': [{'date': date, 'balance': balance}
+                       for date, balance in zip(series['dates'], series['balances'])]
+        }
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 
 @visualization_router.get("/expense-distribution-by-category")
-async def get_expense_distribution_by_category(user_id: str):
+async def get_expense_distribution_by_category(user_id: str, format: str = 'png'):
     """
     Endpoint to generate a pie chart showing the distribution of expenses by category for a specific user.
     Args:
-        user_id (int): The ID of the user.
+        user_id (str): The ID of the user.
+        format (str): The image format, 'png' (default) or 'svg'.
     Raises:
-        HTTPException: If there is an error during the process.
+        HTTPException: If the format is not supported, the renderer is busy or too slow,
+            or there is an error during the process.
     Returns:
-        None
+        Response: The rendered image.
     """
     try:
-        await visualization_service.expense_distribution_by_category(user_id)
+        image = await visualization_service.expense_distribution_by_category(user_id, format)
+        return Response(content=image, media_type=chart_renderer.MEDIA_TYPES[format])
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except render_pool.RenderPoolBusyError as e:
+        raise HTTPException(status_code=503, detail=str(e))
+    except TimeoutError as e:
+        raise HTTPException(status_code=504, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 
 @visualization_router.get("/monthly_summary")
-async def monthly_summary(user_id: str):
+async def monthly_summary(user_id: str, format: str = 'png'):
     """
     Endpoint to generate a bar chart showing the monthly summary of revenues and expenses for a specific user.
     Args:
-        user_id (int): The ID of the user.
+        user_id (str): The ID of the user.
+        format (str): The image format, 'png' (default) or 'svg'.
+    Raises:
+        HTTPException: If the format is not supported, the renderer is busy or too slow,
+            or there is an error during the process.
     Returns:
-        None
+        Response: The rendered image.
     """
     try:
-        await visualization_service.monthly_summary(user_id)
+        image = await visualization_service.monthly_summary(user_id, format)
+        return Response(content=image, media_type=chart_renderer.MEDIA_TYPES[format])
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except render_pool.RenderPoolBusyError as e:
+        raise HTTPException(status_code=503, detail=str(e))
+    except TimeoutError as e:
+        raise HTTPException(status_code=504, detail=str(e))
     except Exception as e:
-        raise e
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@visualization_router.get("/render-stats")
+async def get_render_stats():
+    """
+    Endpoint to report the metrics of the chart render pool.
+    Returns:
+        dict: The pool configuration, queue depth, job counters and render times in seconds.
+    """
+    return render_pool.stats()
+
+
+@visualization_router.get("/cache-stats")
+async def get_cache_stats():
+    """
+    Endpoint to report the metrics of the chart and aggregate cache.
+    Returns:
+        dict: The hit, miss, eviction and expiration counters, the hit ratio and the cache size.
+    """
+    return chart_cache.stats()
@@ -1,19 +1,220 @@
+import threading
+import time
 from enum import Enum
-from pymongo import MongoClient
-import os
 
-# Establishing a connection to the MongoDB database using the connection string from the environment variables.
-client = MongoClient(os.getenv('DB_CONNECTION_STRING'))
+from pymongo import MongoClient, monitoring
 
-# Creating or accessing the "finance_master" database in the MongoDB instance.
-my_db = client['finance_master']
+from app.config import settings
+from app.metrics import metrics
 
 
 # Defining an enumeration for collections in the database.
 class Collections(Enum):
     """
-    Enumerates the collections in the database.
+    Enumerates the collections in the database. The values are the collection names;
+    the collections themselves are taken from get_database(), so importing this module
+    never connects to the database.
     """
-    users = my_db['users']
-    expenses = my_db['expenses']
-    revenues = my_db['revenues']
+    users = 'users'
+    expenses = 'expenses'
+    revenues = 'revenues'
+    counters = 'counters'
+    monthly_rollups = 'monthly_rollups'
+    idempotency_keys = 'idempotency_keys'
+    ledger = 'ledger'
+    balance_snapshots = 'balance_snapshots'
+
+
+class PoolListener(monitoring.ConnectionPoolListener):
+    """
+    Keeps the state of the client's connection pools from the pool events pymongo publishes.
+    Its methods are called from the threads using the client, so the counters are guarded by a lock.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._stats = {
+            'open_connections': 0,
+            'checked_out': 0,
+            'check_out_failures': 0,
+            'connections_created': 0,
+            'connections_closed': 0,
+            'pools_cleared': 0,
+        }
+
+    def _add(self, **changes):
+        with self._lock:
+            for stat, change in changes.items():
+                self._stats[stat] += change
+
+    def stats(self):
+        """
+        Returns the pool counters.
+        Returns:
+            dict: The open and checked-out connections, and the counts of created and closed
+                connections, failed check-outs and cleared pools.
+        """
+        with self._lock:
+            return dict(self._stats)
+
+    def pool_created(self, event):
+        pass
+
+    def pool_ready(self, event):
+        pass
+
+    def pool_cleared(self, event):
+        self._add(pools_cleared=1)
+
+    def pool_closed(self, event):
+        pass
+
+    def connection_created(self, event):
+        self._add(open_connections=1, connections_created=1)
+
+    def connection_ready(self, event):
+        pass
+
+    def connection_closed(self, event):
+        self._add(open_connections=-1, connections_closed=1)
+
+    def connection_check_out_started(self, event):
+        pass
+
+    def connection_check_out_failed(self, event):
+        self._add(check_out_failures=1)
+
+    def connection_checked_out(self, event):
+        self._add(checked_out=1)
+
+    def connection_checked_in(self, event):
+        self._add(checked_out=-1)
+
+
+pool_listener = PoolListener()
+
+# The client and database, created on first use by get_client() and get_database().
+_client = None
+_database = None
+_lock = threading.Lock()
+
+
+def client_options():
+    """
+    Returns the MongoClient options built from the DB_* settings.
+    Returns:
+        dict: The keyword arguments of the MongoClient.
+    """
+    options = {
+        'maxPoolSize': settings.DB_MAX_POOL_SIZE,
+        'minPoolSize': settings.DB_MIN_POOL_SIZE,
+        'maxIdleTimeMS': settings.DB_MAX_IDLE_TIME_MS,
+        'connectTimeoutMS': settings.DB_CONNECT_TIMEOUT_MS,
+        'serverSelectionTimeoutMS': settings.DB_SERVER_SELECTION_TIMEOUT_MS,
+        'socketTimeoutMS': settings.DB_SOCKET_TIMEOUT_MS,
+        'waitQueueTimeoutMS': settings.DB_WAIT_QUEUE_TIMEOUT_MS,
+        'readPreference': settings.DB_READ_PREFERENCE,
+        'appname': 'finance_master',
+    }
+    if settings.DB_COMPRESSORS:
+        options['compressors'] = settings.DB_COMPRESSORS
+    return options
+
+
+def get_client():
+    """
+    Returns the MongoDB client, creating it on first use.
+    pymongo connects in the background, so creating the client does not wait for the server.
+    Returns:
+        MongoClient: The client, configured from the DB_* settings.
+    """
+    global _client
+    if _client is None:
+        with _lock:
+            if _client is None:
+                _client = MongoClient(settings.DB_CONNECTION_STRING, event_listeners=[pool_listener],
+                                      **client_options())
+    return _client
+
+
+def get_database():
+    """
+    Returns the "finance_master" database (DB_NAME), creating the client on first use.
+    Returns:
+        Database: The database, or the one set with use_database().
+    """
+    global _database
+    if _database is None:
+        database = get_client()[settings.DB_NAME]
+        with _lock:
+            if _database is None:
+                _database = database
+    return _database
+
+
+def use_database(database):
+    """
+    Replaces the database used by the repository, e.g. with a mongomock database in tests
+    and benchmarks. Passing None goes back to the configured database.
+    Args:
+        database (Database): The database to use, or None.
+    """
+    global _database
+    with _lock:
+        _database = database
+
+
+def connect():
+    """
+    Startup hook: creates the client, so that its connection pool starts filling
+    (up to DB_MIN_POOL_SIZE connections) before the first request.
+    """
+    get_database()
+
+
+def close():
+    """
+    Shutdown hook: closes the client and its connection pool.
+    The next get_database() call creates a new client.
+    """
+    global _client, _database
+    with _lock:
+        client, _client = _client, None
+        if client is not None:
+            _database = None
+    if client is not None:
+        client.close()
+
+
+def health():
+    """
+    Checks that the database answers and reports the state of the connection pool.
+    Returns:
+        dict: 'status' ('ok' or 'unavailable'), the ping round trip in milliseconds or the
+            error, the pool counters and the configured pool size.
+    """
+    result = {'database': settings.DB_NAME}
+    started = time.perf_counter()
+    try:
+        get_database().command('ping')
+        result['status'] = 'ok'
+        result['ping_ms'] = round((time.perf_counter() - started) * 1000, 3)
+    except Exception as e:
+        result['status'] = 'unavailable'
+        result['error'] = str(e)
+    result['pool'] = {**pool_listener.stats(), 'max_pool_size': settings.DB_MAX_POOL_SIZE,
+                      'min_pool_size': settings.DB_MIN_POOL_SIZE}
+    return result
+
+
+db_pool_stats = metrics.gauge('db_pool', 'The MongoDB connection pool counters returned by PoolListener.stats().',
+                              ('stat',))
+
+
+@metrics.on_collect
+def _collect_metrics():
+    """
+    Copies the pool counters into the db_pool gauge before the metrics are exposed.
+    """
+    for stat, value in pool_listener.stats().items():
+        db_pool_stats.set(value, stat=stat)
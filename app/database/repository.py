@@ -1,10 +1,226 @@
-from fastapi import Path
+import asyncio
+import base64
+import functools
+import inspect
+import itertools
+import logging
+import time
+from concurrent.futures import ThreadPoolExecutor
 
-from app.database.database_connection import my_db
-import json
+import bson
 from bson import json_util
+from pymongo import ReturnDocument
+from pymongo.database import Database
+from pymongo.errors import BulkWriteError, DuplicateKeyError, OperationFailure, PyMongoError
 
+from app.config import settings
+from app.database.database_connection import Collections, get_database
+from app.metrics import metrics
 
+BACKENDS = ('executor', 'inline')
+if settings.DB_BACKEND not in BACKENDS:
+    raise ValueError(f"DB_BACKEND must be one of {BACKENDS}, got {settings.DB_BACKEND!r}")
+
+TRANSACTION_MODES = ('auto', 'off')
+if settings.DB_TRANSACTIONS not in TRANSACTION_MODES:
+    raise ValueError(f"DB_TRANSACTIONS must be one of {TRANSACTION_MODES}, got {settings.DB_TRANSACTIONS!r}")
+
+# Indexes the service queries rely on, as (collection, keys, options) entries.
+INDEXES = [
+    (Collections.expenses, [('userId', 1), ('date', 1), ('id', 1)], {}),
+    (Collections.revenues, [('userId', 1), ('date', 1), ('id', 1)], {}),
+    (Collections.expenses, [('id', 1)], {}),
+    (Collections.revenues, [('id', 1)], {}),
+    (Collections.users, [('id', 1)], {}),
+    (Collections.users, [('email', 1)], {'unique': True}),
+    (Collections.monthly_rollups, [('userId', 1), ('month', 1), ('kind', 1)], {'unique': True}),
+    (Collections.idempotency_keys, [('id', 1)], {'unique': True}),
+    (Collections.idempotency_keys, [('createdAt', 1)], {'expireAfterSeconds': settings.IDEMPOTENCY_TTL}),
+    (Collections.ledger, [('userId', 1), ('at', 1)], {}),
+    (Collections.ledger, [('at', 1)], {}),
+    (Collections.balance_snapshots, [('userId', 1), ('at', 1)], {'unique': True}),
+    (Collections.balance_snapshots, [('at', 1)], {}),
+]
+
+# Error code MongoDB reports when a unique index cannot be built over duplicate values.
+DUPLICATE_KEY_ERROR = 11000
+
+# Collections whose integer ids are allocated from a sequence in the counters collection.
+SEQUENCES = (Collections.expenses, Collections.revenues)
+
+# Thread pool of the "executor" backend, created on first use.
+_executor = None
+
+# The database whose transaction support was last checked, and the result.
+_transactions_checked = (None, False)
+
+# The repository functions reading documents; only their results are counted in db_documents and db_document_bytes.
+READ_OPERATIONS = ('get_all', 'find', 'aggregate', 'iter_find', 'find_page', 'find_one', 'get_by_id')
+
+DB_LABELS = ('operation', 'collection')
+db_calls = metrics.counter('db_calls', 'Calls of the repository functions.', DB_LABELS + ('status',))
+db_duration = metrics.histogram('db_call_duration_seconds',
+                                'Duration of the repository calls, including the wait for a pool thread.', DB_LABELS)
+db_documents = metrics.counter('db_documents', 'Documents read by the repository calls.', DB_LABELS)
+db_bytes = metrics.counter('db_document_bytes', 'BSON size of the documents read by the repository calls.',
+                           DB_LABELS)
+db_transactions = metrics.counter('db_transactions', 'Units of work run in a transaction, by outcome.', ('outcome',))
+
+
+def _get_executor():
+    """
+    Returns the thread pool that runs the database calls, creating it on first use.
+    Returns:
+        ThreadPoolExecutor: A pool of DB_EXECUTOR_WORKERS threads.
+    """
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(max_workers=settings.DB_EXECUTOR_WORKERS, thread_name_prefix='repository')
+    return _executor
+
+
+async def _run(func, *args, **kwargs):
+    """
+    Runs a blocking pymongo call according to the configured DB_BACKEND.
+    With the "executor" backend the call runs on the repository thread pool and the event loop
+    keeps serving other requests while it waits; with the "inline" backend it runs directly.
+    Args:
+        func (callable): The blocking function to call.
+        *args: Positional arguments passed to the function.
+        **kwargs: Keyword arguments passed to the function.
+    Returns:
+        The result of the function call.
+    """
+    if settings.DB_BACKEND == 'inline':
+        return func(*args, **kwargs)
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_get_executor(), functools.partial(func, *args, **kwargs))
+
+
+def _session_options(session):
+    """
+    Returns the keyword arguments passing a session to a pymongo call.
+    Args:
+        session (ClientSession): The session of a unit of work, or None.
+    Returns:
+        dict: {'session': session}, or no arguments without a session.
+    """
+    return {'session': session} if session is not None else {}
+
+
+def _has_error_label(error, label):
+    """
+    Checks whether an error, or an error it was raised from, is a pymongo error with an error label.
+    The repository functions raise RuntimeError from the pymongo errors, so the chain is followed.
+    Args:
+        error (BaseException): The error raised by a unit of work.
+        label (str): The label, e.g. 'TransientTransactionError'.
+    Returns:
+        bool: Whether the label is set.
+    """
+    while error is not None:
+        if isinstance(error, PyMongoError) and error.has_error_label(label):
+            return True
+        error = error.__cause__ or error.__context__
+    return False
+
+
+def _documents_of(result):
+    """
+    Returns the documents in the result of a repository call.
+    Args:
+        result: The result of the call: a list of documents, a find_page page, a single
+            document, or a count or id.
+    Returns:
+        list: The documents of the result.
+    """
+    if isinstance(result, list):
+        return result
+    if isinstance(result, dict):
+        return result['items'] if set(result) == {'items', 'next_cursor'} else [result]
+    return []
+
+
+def _record(operation, collection, started, status, documents=()):
+    """
+    Updates the repository metrics for a finished call.
+    Args:
+        operation (str): The name of the repository function.
+        collection (Collections): The collection the call used.
+        started (float): The time.perf_counter() value at the start of the call.
+        status (str): 'ok' if the call returned and 'error' if it raised.
+        documents (list): The documents the call read, empty for the writes.
+    """
+    labels = {'operation': operation, 'collection': collection.name}
+    db_calls.inc(status=status, **labels)
+    db_duration.observe(time.perf_counter() - started, **labels)
+    if documents:
+        db_documents.inc(len(documents), **labels)
+        if settings.METRICS_DOCUMENT_BYTES:
+            db_bytes.inc(sum(len(bson.encode(document)) for document in documents), **labels)
+
+
+def _instrumented(func):
+    """
+    Decorator recording the calls, duration, returned documents and returned bytes of a
+    repository function, labelled by the function name and the collection (its first argument).
+    Documents are only counted for the functions in READ_OPERATIONS, not for what the writes return.
+    Async generator functions are recorded once they are exhausted or closed, with all the
+    documents of their batches.
+    Args:
+        func (callable): The repository coroutine or async generator function.
+    Returns:
+        callable: The instrumented function.
+    """
+    operation = func.__name__
+
+    if inspect.isasyncgenfunction(func):
+        @functools.wraps(func)
+        async def generator_wrapper(collection, *args, **kwargs):
+            started = time.perf_counter()
+            labels = {'operation': operation, 'collection': collection.name}
+            status = 'ok'
+            batches = func(collection, *args, **kwargs)
+            try:
+                async for batch in batches:
+                    db_documents.inc(len(batch), **labels)
+                    if settings.METRICS_DOCUMENT_BYTES:
+                        db_bytes.inc(sum(len(bson.encode(document)) for document in batch), **labels)
+                    yield batch
+            except Exception:
+                status = 'error'
+                raise
+            finally:
+                await batches.aclose()
+                _record(operation, collection, started, status)
+
+        return generator_wrapper
+
+    @functools.wraps(func)
+    async def wrapper(collection, *args, **kwargs):
+        started = time.perf_counter()
+        try:
+            result = await func(collection, *args, **kwargs)
+        except BaseException:
+            _record(operation, collection, started, 'error')
+            raise
+        _record(operation, collection, started, 'ok', _documents_of(result) if operation in READ_OPERATIONS else ())
+        return result
+
+    return wrapper
+
+
+def shutdown():
+    """
+    Shuts down the repository thread pool, waiting for the running database calls to finish.
+    """
+    global _executor
+    if _executor is not None:
+        _executor.shutdown(wait=True)
+        _executor = None
+
+
+@_instrumented
 async def get_all(collection):
     """
     Fetches all documents from a specified collection.
@@ -18,18 +234,205 @@ async def get_all(collection):
     """
     collection_name = collection.name
     try:
-        return list(my_db[collection_name].find({}))
+        return await _run(list, get_database()[collection_name].find({}))
+    except Exception as e:
+        raise RuntimeError(f"Error fetching data from collection {collection_name}: {e}")
+
+
+@_instrumented
+async def find(collection, query, projection=None, sort=None):
+    """
+    Fetches the documents matching a filter from a specified collection.
+    Args:
+        collection (Collections): The collection to fetch documents from.
+            Should be a value from the Collections enum.
+        query (dict): The MongoDB filter the documents must match.
+        projection (dict, optional): The fields to include or exclude in the returned documents.
+        sort (list, optional): A list of (field, direction) pairs to sort the documents by.
+    Returns:
+        list: A list of the matching documents.
+    Raises:
+        RuntimeError: If there is an error fetching data from the collection.
+    """
+    collection_name = collection.name
+    try:
+        cursor = get_database()[collection_name].find(query, projection)
+        if sort:
+            cursor = cursor.sort(sort)
+        return await _run(list, cursor)
+    except Exception as e:
+        raise RuntimeError(f"Error fetching data from collection {collection_name}: {e}")
+
+
+@_instrumented
+async def aggregate(collection, pipeline):
+    """
+    Runs an aggregation pipeline on a specified collection.
+    Args:
+        collection (Collections): The collection to aggregate.
+            Should be a value from the Collections enum.
+        pipeline (list): The aggregation stages, e.g. [{"$match": ...}, {"$group": ...}].
+    Returns:
+        list: The documents produced by the pipeline.
+    Raises:
+        RuntimeError: If there is an error running the pipeline.
+    """
+    collection_name = collection.name
+    try:
+        return await _run(lambda: list(get_database()[collection_name].aggregate(pipeline)))
+    except Exception as e:
+        raise RuntimeError(f"Error aggregating data from collection {collection_name}: {e}")
+
+
+@_instrumented
+async def iter_find(collection, query, projection=None, sort=None, batch_size=1000):
+    """
+    Iterates over the documents matching a filter in batches, without loading them all in memory.
+    Each batch is read from the database cursor in a single call, so at most batch_size
+    documents are held at a time.
+    Args:
+        collection (Collections): The collection to fetch documents from.
+            Should be a value from the Collections enum.
+        query (dict): The MongoDB filter the documents must match.
+        projection (dict, optional): The fields to include or exclude in the returned documents.
+        sort (list, optional): A list of (field, direction) pairs to sort the documents by.
+        batch_size (int): The number of documents in each batch.
+    Yields:
+        list: The next batch of matching documents.
+    Raises:
+        RuntimeError: If there is an error fetching data from the collection.
+    """
+    collection_name = collection.name
+    cursor = get_database()[collection_name].find(query, projection, batch_size=batch_size)
+    if sort:
+        cursor = cursor.sort(sort)
+    try:
+        while True:
+            try:
+                batch = await _run(lambda: list(itertools.islice(cursor, batch_size)))
+            except Exception as e:
+                raise RuntimeError(f"Error fetching data from collection {collection_name}: {e}")
+            if not batch:
+                break
+            yield batch
+    finally:
+        cursor.close()
+
+
+def encode_cursor(values):
+    """
+    Encodes the sort-key values of the last document of a page into an opaque cursor token.
+    Args:
+        values (list): The values of the sort keys, in sort order.
+    Returns:
+        str: A URL-safe cursor token.
+    """
+    return base64.urlsafe_b64encode(json_util.dumps(values).encode()).decode()
+
+
+def decode_cursor(token):
+    """
+    Decodes a cursor token created by encode_cursor.
+    Args:
+        token (str): The cursor token.
+    Returns:
+        list: The values of the sort keys, in sort order.
+    Raises:
+        ValueError: If the token is not a valid cursor.
+    """
+    try:
+        values = json_util.loads(base64.urlsafe_b64decode(token.encode()))
+    except Exception:
+        raise ValueError("Invalid cursor")
+    if not isinstance(values, list):
+        raise ValueError("Invalid cursor")
+    return values
+
+
+@_instrumented
+async def find_page(collection, query, sort_keys, limit=None, after=None, projection=None):
+    """
+    Fetches one page of the documents matching a filter, using keyset pagination.
+    The documents are sorted ascending by sort_keys and each page starts right after the
+    document the cursor points to, so fetching a page costs the same wherever it is in the
+    result set. The last key should be unique so that no document is skipped or repeated.
+    Args:
+        collection (Collections): The collection to fetch documents from.
+            Should be a value from the Collections enum.
+        query (dict): The MongoDB filter the documents must match.
+        sort_keys (list): The fields to sort and paginate by, e.g. ['date', 'id'].
+        limit (int, optional): The maximum number of documents in the page. All the remaining
+            documents are returned when it is None.
+        after (str, optional): The next_cursor of the previous page.
+        projection (list, optional): The fields to return. The sort keys are always returned.
+    Returns:
+        dict: The page documents under 'items' and the cursor of the next page under
+            'next_cursor', or None when this is the last page.
+    Raises:
+        ValueError: If the cursor is invalid.
+        RuntimeError: If there is an error fetching data from the collection.
+    """
+    if after is not None:
+        values = decode_cursor(after)
+        if len(values) != len(sort_keys):
+            raise ValueError("Invalid cursor")
+        # Documents sorting strictly after the cursor: (k1 > v1) or (k1 == v1 and k2 > v2) or ...
+        after_filter = {"$or": [{**dict(zip(sort_keys[:i], values[:i])), key: {"$gt": values[i]}}
+                                for i, key in enumerate(sort_keys)]}
+        query = {"$and": [query, after_filter]}
+    if projection is not None:
+        projection = {**{field: 1 for field in projection}, **{key: 1 for key in sort_keys}}
+    collection_name = collection.name
+    try:
+        cursor = get_database()[collection_name].find(query, projection).sort([(key, 1) for key in sort_keys])
+        if limit is not None:
+            # One extra document tells whether there is a next page
+            cursor = cursor.limit(limit + 1)
+        items = await _run(list, cursor)
     except Exception as e:
         raise RuntimeError(f"Error fetching data from collection {collection_name}: {e}")
+    next_cursor = None
+    if limit is not None and len(items) > limit:
+        items = items[:limit]
+        next_cursor = encode_cursor([items[-1][key] for key in sort_keys])
+    return {"items": items, "next_cursor": next_cursor}
 
 
-async def get_by_id(collection, document_id):
+@_instrumented
+async def find_one(collection, query, projection=None, sort=None, session=None):
+    """
+    Fetches the first document matching a filter from a specified collection.
+    Args:
+        collection (Collections): The collection to fetch the document from.
+            Should be a value from the Collections enum.
+        query (dict): The MongoDB filter the document must match.
+        projection (dict, optional): The fields to include or exclude in the returned document.
+        sort (list, optional): A list of (field, direction) pairs; the first document in this order is returned.
+        session (ClientSession, optional): The session of the unit of work the call is part of.
+    Returns:
+        dict: The matching document, or None if no document matches.
+    Raises:
+        RuntimeError: If there is an error fetching data from the collection.
+    """
+    collection_name = collection.name
+    try:
+        options = _session_options(session)
+        if sort:
+            options['sort'] = sort
+        return await _run(get_database()[collection_name].find_one, query, projection, **options)
+    except Exception as e:
+        raise RuntimeError(f"Error fetching data from collection {collection_name}: {e}")
+
+
+@_instrumented
+async def get_by_id(collection, document_id, session=None):
     """
     Fetches a document from a specified collection by its ID.
     Args:
         collection (Collections): The collection to fetch the document from.
             Should be a value from the Collections enum.
         document_id (str): The ID of the document to fetch.
+        session (ClientSession, optional): The session of the unit of work the call is part of.
     Returns:
         dict: The document retrieved from the specified collection.
     Raises:
@@ -37,33 +440,113 @@ async def get_by_id(collection, document_id):
     """
     collection_name = collection.name
     try:
-        return my_db[collection_name].find_one({"id": document_id})
+        return await _run(get_database()[collection_name].find_one, {"id": document_id},
+                          **_session_options(session))
     except Exception as e:
         raise RuntimeError(f"Error fetching data from collection {collection_name}: {e}")
 
 
-async def add(collection, document):
+@_instrumented
+async def add(collection, document, session=None):
     """
     Adds a new document to a specified collection.
     Args:
         collection (Collections): The collection to add the document to.
             Should be a value from the Collections enum.
         document (dict): The document to add to the collection.
+        session (ClientSession, optional): The session of the unit of work the call is part of.
     Returns:
         dict: The inserted document ID.
     Raises:
         RuntimeError: If there is an error adding the document to the collection.
     """
-    print(f"insert:  {document}")
     collection_name = collection.name
     try:
-        result = my_db[collection_name].insert_one(document)
+        result = await _run(get_database()[collection_name].insert_one, document, **_session_options(session))
         return {"id": str(result.inserted_id)}
     except Exception as e:
         raise RuntimeError(f"Error adding document to collection {collection_name}: {e}")
 
 
-async def update(collection, document_id, updated_data):
+@_instrumented
+async def add_unique(collection, document):
+    """
+    Adds a new document to a specified collection unless it would duplicate a unique index key,
+    e.g. to claim a key that only one caller may hold.
+    Args:
+        collection (Collections): The collection to add the document to.
+            Should be a value from the Collections enum.
+        document (dict): The document to add to the collection.
+    Returns:
+        bool: True if the document was added, False if a document with the same unique key exists.
+    Raises:
+        RuntimeError: If there is an error adding the document to the collection.
+    """
+    collection_name = collection.name
+    try:
+        await _run(get_database()[collection_name].insert_one, document)
+        return True
+    except DuplicateKeyError:
+        return False
+    except Exception as e:
+        raise RuntimeError(f"Error adding document to collection {collection_name}: {e}")
+
+
+@_instrumented
+async def add_many(collection, documents, ordered=True):
+    """
+    Adds several new documents to a specified collection in one bulk insert.
+    Args:
+        collection (Collections): The collection to add the documents to.
+            Should be a value from the Collections enum.
+        documents (list): The documents to add to the collection.
+        ordered (bool): Whether to stop at the first failed document, or insert all the others.
+    Returns:
+        int: The number of inserted documents.
+    Raises:
+        RuntimeError: If there is an error adding the documents to the collection.
+    """
+    collection_name = collection.name
+    if not documents:
+        return 0
+    try:
+        result = await _run(get_database()[collection_name].insert_many, documents, ordered=ordered)
+        return len(result.inserted_ids)
+    except Exception as e:
+        raise RuntimeError(f"Error adding documents to collection {collection_name}: {e}")
+
+
+@_instrumented
+async def add_many_unordered(collection, documents):
+    """
+    Adds several new documents to a specified collection in one unordered bulk insert, and reports
+    the documents that could not be inserted instead of failing the whole call.
+    Args:
+        collection (Collections): The collection to add the documents to.
+            Should be a value from the Collections enum.
+        documents (list): The documents to add to the collection.
+    Returns:
+        dict: The number of inserted documents under 'inserted', and under 'errors' the
+            {'index', 'message'} of every document that failed, index being its position in documents.
+    Raises:
+        RuntimeError: If there is an error other than failed documents, e.g. the database is unavailable.
+    """
+    collection_name = collection.name
+    if not documents:
+        return {'inserted': 0, 'errors': []}
+    try:
+        result = await _run(get_database()[collection_name].insert_many, documents, ordered=False)
+        return {'inserted': len(result.inserted_ids), 'errors': []}
+    except BulkWriteError as e:
+        return {'inserted': e.details['nInserted'],
+                'errors': [{'index': error['index'], 'message': error['errmsg']}
+                           for error in e.details['writeErrors']]}
+    except Exception as e:
+        raise RuntimeError(f"Error adding documents to collection {collection_name}: {e}")
+
+
+@_instrumented
+async def update(collection, document_id, updated_data, session=None):
     """
     Updates an existing document in a specified collection.
     Args:
@@ -71,6 +554,7 @@ async def update(collection, document_id, updated_data):
             Should be a value from the Collections enum.
         document_id (str): The ID of the document to update.
         updated_data (dict): The updated data for the document.
+        session (ClientSession, optional): The session of the unit of work the call is part of.
     Returns:
         dict: The updated document.
     Raises:
@@ -78,19 +562,47 @@ async def update(collection, document_id, updated_data):
     """
     collection_name = collection.name
     try:
-        result = my_db[collection_name].update_one({"id": document_id}, {"$set": updated_data})
+        result = await _run(get_database()[collection_name].update_one, {"id": document_id}, {"$set": updated_data},
+                            **_session_options(session))
         return updated_data
     except Exception as e:
         raise RuntimeError(f"Error updating document in collection {collection_name}: {e}")
 
 
-async def delete(collection, document_id):
+@_instrumented
+async def update_one(collection, query, updated_data, session=None):
+    """
+    Updates the first document matching a filter, e.g. to change a document only while it is
+    still in an expected state.
+    Args:
+        collection (Collections): The collection containing the document to update.
+            Should be a value from the Collections enum.
+        query (dict): The MongoDB filter selecting the document.
+        updated_data (dict): The fields to set in the document.
+        session (ClientSession, optional): The session of the unit of work the call is part of.
+    Returns:
+        bool: Whether a document matched the filter.
+    Raises:
+        RuntimeError: If there is an error updating the document in the collection.
+    """
+    collection_name = collection.name
+    try:
+        result = await _run(get_database()[collection_name].update_one, query, {"$set": updated_data},
+                            **_session_options(session))
+        return result.matched_count > 0
+    except Exception as e:
+        raise RuntimeError(f"Error updating document in collection {collection_name}: {e}")
+
+
+@_instrumented
+async def delete(collection, document_id, session=None):
     """
     Deletes a document from a specified collection by its ID.
     Args:
         collection (Collections): The collection to delete the document from.
             Should be a value from the Collections enum.
         document_id (str): The ID of the document to delete.
+        session (ClientSession, optional): The session of the unit of work the call is part of.
     Returns:
         dict: The deleted document.
     Raises:
@@ -99,9 +611,206 @@ async def delete(collection, document_id):
     """
     collection_name = collection.name
     try:
-        deleted_document = my_db[collection_name].find_one_and_delete({"id": document_id})
+        deleted_document = await _run(get_database()[collection_name].find_one_and_delete, {"id": document_id},
+                                      **_session_options(session))
         if not deleted_document:
             raise ValueError(f"No document with ID {document_id} found in collection {collection_name}")
         return deleted_document
     except Exception as e:
         raise RuntimeError(f"Error deleting document from collection {collection_name}: {e}")
+
+
+@_instrumented
+async def delete_many(collection, query, session=None):
+    """
+    Deletes all the documents matching a filter from a specified collection.
+    Args:
+        collection (Collections): The collection to delete the documents from.
+            Should be a value from the Collections enum.
+        query (dict): The MongoDB filter the documents must match.
+        session (ClientSession, optional): The session of the unit of work the call is part of.
+    Returns:
+        int: The number of deleted documents.
+    Raises:
+        RuntimeError: If there is an error deleting the documents from the collection.
+    """
+    collection_name = collection.name
+    try:
+        result = await _run(get_database()[collection_name].delete_many, query, **_session_options(session))
+        return result.deleted_count
+    except Exception as e:
+        raise RuntimeError(f"Error deleting documents from collection {collection_name}: {e}")
+
+
+async def create_indexes():
+    """
+    Creates the indexes listed in INDEXES. Creating an index that already exists is a no-op,
+    so this is safe to call on every startup.
+    If a unique index cannot be built because the collection already holds duplicate values,
+    a non-unique index is created instead so the lookups stay indexed, and a warning is logged.
+    Raises:
+        RuntimeError: If there is an error creating an index.
+    """
+    for collection, keys, options in INDEXES:
+        collection_name = collection.name
+        try:
+            await _run(get_database()[collection_name].create_index, keys, **options)
+        except OperationFailure as e:
+            if not (options.get('unique') and e.code == DUPLICATE_KEY_ERROR):
+                raise RuntimeError(f"Error creating index on collection {collection_name}: {e}")
+            logging.warning(f"Collection {collection_name} holds duplicate {keys} values, "
+                            f"creating a non-unique index instead: {e}")
+            await _run(get_database()[collection_name].create_index, keys)
+        except Exception as e:
+            raise RuntimeError(f"Error creating index on collection {collection_name}: {e}")
+
+
+@_instrumented
+async def increment(collection, query, increments, upsert=False, projection=None, session=None):
+    """
+    Atomically increments numeric fields of a document with a single $inc update.
+    Args:
+        collection (Collections): The collection containing the document to update.
+            Should be a value from the Collections enum.
+        query (dict): The MongoDB filter selecting the document.
+        increments (dict): The amount to add to each field, e.g. {"balance": -20}.
+        upsert (bool): Whether to create the document if no document matches the filter.
+        projection (dict, optional): The fields to include or exclude in the returned document.
+        session (ClientSession, optional): The session of the unit of work the call is part of.
+    Returns:
+        dict: The document after the update, or None if no document matched and upsert is False.
+    Raises:
+        RuntimeError: If there is an error updating the document in the collection.
+    """
+    collection_name = collection.name
+    try:
+        return await _run(get_database()[collection_name].find_one_and_update, query, {"$inc": increments},
+                          projection=projection, upsert=upsert, return_document=ReturnDocument.AFTER,
+                          **_session_options(session))
+    except Exception as e:
+        raise RuntimeError(f"Error updating document in collection {collection_name}: {e}")
+
+
+@_instrumented
+async def allocate_ids(collection, count=1):
+    """
+    Reserves a block of consecutive ids for new documents of a collection.
+    The ids come from a sequence document in the counters collection that is advanced with a
+    single $inc, so allocation is constant-time and concurrent callers never get the same id.
+    Args:
+        collection (Collections): The collection the ids are allocated for.
+            Should be a value from the Collections enum.
+        count (int): The number of ids to reserve.
+    Returns:
+        int: The first id of the reserved block; the block is [first, first + count).
+    Raises:
+        ValueError: If count is not positive.
+        RuntimeError: If there is an error updating the sequence.
+    """
+    if count < 1:
+        raise ValueError("count must be positive")
+    counter = await increment(Collections.counters, {"_id": collection.name}, {"seq": count}, upsert=True)
+    return counter['seq'] - count + 1
+
+
+async def sync_counters():
+    """
+    Moves each sequence in SEQUENCES past the highest id already stored in its collection,
+    so documents inserted before the sequence existed are never given a duplicate id.
+    The sequence is only ever raised ($max), so this is safe to call on every startup.
+    Raises:
+        RuntimeError: If there is an error reading a collection or updating its sequence.
+    """
+    for collection in SEQUENCES:
+        collection_name = collection.name
+        try:
+            last = await _run(get_database()[collection_name].find_one, {}, {"id": 1}, sort=[("id", -1)])
+            if last is not None:
+                await _run(get_database()[Collections.counters.name].update_one, {"_id": collection_name},
+                           {"$max": {"seq": last['id']}}, upsert=True)
+        except Exception as e:
+            raise RuntimeError(f"Error synchronizing the id sequence of collection {collection_name}: {e}")
+
+
+async def transactions_supported():
+    """
+    Checks whether the database supports multi-document transactions: DB_TRANSACTIONS is "auto"
+    and the server is a replica set member or a mongos. The answer is kept for the current database.
+    Returns:
+        bool: Whether run_in_transaction runs its work in a transaction.
+    Raises:
+        RuntimeError: If there is an error asking the server.
+    """
+    global _transactions_checked
+    database = get_database()
+    checked, supported = _transactions_checked
+    if checked is database:
+        return supported
+    if settings.DB_TRANSACTIONS == 'off' or not isinstance(database, Database):
+        supported = False
+    else:
+        try:
+            hello = await _run(database.command, 'hello')
+        except Exception as e:
+            raise RuntimeError(f"Error checking transaction support of database {database.name}: {e}")
+        supported = 'setName' in hello or hello.get('msg') == 'isdbgrid'
+    _transactions_checked = (database, supported)
+    return supported
+
+
+async def _commit(session, max_attempts):
+    """
+    Commits the transaction of a session, retrying while the outcome of the commit is unknown.
+    Committing again is safe, the server applies a transaction once.
+    """
+    for attempt in range(1, max_attempts + 1):
+        try:
+            return await _run(session.commit_transaction)
+        except PyMongoError as e:
+            if attempt == max_attempts or not e.has_error_label('UnknownTransactionCommitResult'):
+                raise
+
+
+async def run_in_transaction(work, max_attempts=3):
+    """
+    Runs a unit of work: several repository calls that must all be applied or none of them.
+    When transactions are supported, the work runs in a transaction that is committed when it
+    returns and aborted when it raises, and the whole work runs again if the transaction fails
+    with a transient error, e.g. a write conflict with a concurrent transaction.
+    Otherwise the work runs without a session, each call is applied on its own, and the work
+    must undo its earlier calls itself if a later one fails.
+    Args:
+        work (callable): An async function taking the session to pass to its repository calls,
+            or None. A session cannot be used concurrently, so the calls must be awaited one
+            after the other; and as the work may run more than once, it must not have effects
+            outside the database before it returns.
+        max_attempts (int): The maximum number of times the work runs, and the commit is tried.
+    Returns:
+        The result of the work.
+    Raises:
+        Whatever the work raises, once the transaction is aborted.
+        PyMongoError: If the transaction cannot be committed.
+    """
+    if not await transactions_supported():
+        return await work(None)
+    client = get_database().client
+    for attempt in range(1, max_attempts + 1):
+        session = await _run(client.start_session)
+        try:
+            session.start_transaction()
+            try:
+                result = await work(session)
+                await _commit(session, max_attempts)
+            except BaseException:
+                if session.in_transaction:
+                    await _run(session.abort_transaction)
+                raise
+            db_transactions.inc(outcome='committed')
+            return result
+        except Exception as e:
+            if attempt == max_attempts or not _has_error_label(e, 'TransientTransactionError'):
+                db_transactions.inc(outcome='aborted')
+                raise
+            db_transactions.inc(outcome='retried')
+        finally:
+            await _run(session.end_session)
@@ -1,5 +1,161 @@
+import atexit
+import inspect
+import json
 import logging
+import queue
+import reprlib
+import threading
+import time
 from functools import wraps
+from logging.handlers import QueueHandler, QueueListener
+
+from app.config import settings
+from app.metrics import metrics
+
+# Truncating repr for the logged arguments and results: only the first items of long
+# lists and dicts and the start of long strings are rendered, so the cost of logging a
+# call does not grow with the size of the payload.
+_payload_repr = reprlib.Repr()
+_payload_repr.maxlevel = 3
+_payload_repr.maxlist = 10
+_payload_repr.maxtuple = 10
+_payload_repr.maxdict = 10
+_payload_repr.maxset = 10
+_payload_repr.maxstring = 200
+_payload_repr.maxother = 200
+
+_listener = None
+_setup_lock = threading.Lock()
+
+call_duration = metrics.histogram('service_call_duration_seconds',
+                                  'Wall-clock duration of the service functions wrapped by log_decorator.',
+                                  ('function', 'status'))
+
+
+class DroppingQueueHandler(QueueHandler):
+    """
+    A QueueHandler that drops records while its queue is full instead of blocking the caller.
+    """
+
+    def __init__(self, log_queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+
+    def enqueue(self, record):
+        """
+        Put a record on the queue, counting it as dropped when the queue is full.
+        Args:
+            record (logging.LogRecord): The record to write.
+        """
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+def truncate(value, max_chars: int = None):
+    """
+    Render a value for the log, truncated to a bounded length.
+    Args:
+        value: The value to render.
+        max_chars (int, optional): The maximum length; settings.LOG_MAX_PAYLOAD_CHARS when omitted.
+    Returns:
+        str: The truncated representation of the value.
+    """
+    max_chars = settings.LOG_MAX_PAYLOAD_CHARS if max_chars is None else max_chars
+    text = _payload_repr.repr(value)
+    if len(text) > max_chars:
+        text = text[:max_chars] + '...'
+    return text
+
+
+def setup_logging(log_file):
+    """
+    Route the application log through a background writer, once per process.
+    Records are put on a bounded queue by the logging call and written to the log file
+    by a QueueListener thread, so the request path never waits for the disk.
+    Args:
+        log_file (str): The name of the file where logs will be written.
+    """
+    global _listener
+    with _setup_lock:
+        if _listener is not None:
+            return
+        file_handler = logging.FileHandler(log_file)
+        file_handler.setFormatter(logging.Formatter(
+            fmt='%(asctime)s - %(name)s - %(levelname)s - %(message)s',  # Log message format
+            datefmt='%Y-%m-%d %H:%M:%S'  # Date format for log entries
+        ))
+        root = logging.getLogger()
+        root.setLevel(settings.LOG_LEVEL)
+        root.addHandler(DroppingQueueHandler(queue.Queue(settings.LOG_QUEUE_SIZE)))
+        _listener = QueueListener(root.handlers[-1].queue, file_handler, respect_handler_level=True)
+        _listener.start()
+        atexit.register(shutdown)
+
+
+def shutdown():
+    """
+    Write the queued log records and stop the background writer.
+    """
+    global _listener
+    with _setup_lock:
+        if _listener is None:
+            return
+        _listener.stop()
+        for handler in _listener.handlers:
+            handler.close()
+        root = logging.getLogger()
+        for handler in [h for h in root.handlers if isinstance(h, DroppingQueueHandler)]:
+            root.removeHandler(handler)
+        _listener = None
+
+
+def result_size(result):
+    """
+    Return the size of a call result: the number of items of a list, tuple or set,
+    the number of fields of a dict, and None for any other value.
+    Args:
+        result: The result of the call.
+    Returns:
+        int: The size of the result, or None.
+    """
+    if isinstance(result, (list, tuple, set, dict)):
+        return len(result)
+    return None
+
+
+def log_call(logger, function_name, args, kwargs, started, status, result=None, error=None):
+    """
+    Record a finished call: observe its duration in the latency histogram and, when INFO
+    is enabled, log it as a single JSON record.
+    Args:
+        logger (logging.Logger): The logger to write to.
+        function_name (str): The name of the function, e.g. 'expense_service.get_expenses'.
+        args (tuple): The positional arguments of the call.
+        kwargs (dict): The keyword arguments of the call.
+        started (float): The time.perf_counter() value at the start of the call.
+        status (str): 'ok' if the call returned and 'error' if it raised.
+        result: The result of the call.
+        error (Exception, optional): The exception the call raised.
+    """
+    duration = time.perf_counter() - started
+    call_duration.observe(duration, function=function_name, status=status)
+    if not logger.isEnabledFor(logging.INFO):
+        return
+    record = {
+        'function': function_name,
+        'status': status,
+        'duration_ms': round(duration * 1000, 3),
+        'args': truncate(args),
+        'kwargs': truncate(kwargs),
+    }
+    if error is None:
+        record['result_size'] = result_size(result)
+        record['result'] = truncate(result)
+    else:
+        record['error'] = truncate(f'{type(error).__name__}: {error}')
+    logger.info('%s', json.dumps(record, ensure_ascii=False))
 
 
 def log_decorator(log_file):
@@ -14,25 +170,26 @@ def log_decorator(log_file):
 
     Usage:
         @log_decorator('app.log')
-        def my_function(arg1, arg2):
+        async def my_function(arg1, arg2):
             pass
 
-    The log entries will include:
-    - Timestamp of the log entry
-    - Name of the logger
-    - Log level (INFO)
-    - Name of the function being called
-    - Arguments passed to the function
-    - Function's return value
+    Each call is logged once it finishes, as a JSON record with:
+    - function: The module and name of the function being called
+    - status: 'ok', or 'error' if the function raised
+    - duration_ms: The wall-clock duration of the call; for coroutine functions,
+      the time until the awaited coroutine finishes
+    - args, kwargs: The arguments, truncated to settings.LOG_MAX_PAYLOAD_CHARS
+    - result_size, result: The size of the return value and the value itself, truncated
+    - error: The exception, if the function raised
+
+    The duration is also observed in the service_call_duration_seconds histogram,
+    labelled by function and status. The records are written by a background thread
+    (see setup_logging), and nothing is rendered when the log level is above INFO.
     """
 
-    # Configure logging with the specified log file
-    logging.basicConfig(
-        filename=log_file,  # Log file name
-        level=logging.INFO,  # Log level set to INFO
-        format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',  # Log message format
-        datefmt='%Y-%m-%d %H:%M:%S'  # Date format for log entries
-    )
+    # Configure the background writer of the specified log file
+    setup_logging(log_file)
+    logger = logging.getLogger()
 
     def wrapper(func):
         """
@@ -42,6 +199,29 @@ def log_decorator(log_file):
         Returns:
             function: The wrapped function that includes logging.
         """
+        function_name = f"{func.__module__.rsplit('.', 1)[-1]}.{func.__name__}"
+
+        if inspect.iscoroutinefunction(func):
+            @wraps(func)
+            async def async_inner_wrapper(*args, **kwargs):
+                """
+                Wrapper coroutine that awaits the decorated coroutine function and logs the call.
+                Args:
+                    *args: Positional arguments passed to the decorated function.
+                    **kwargs: Keyword arguments passed to the decorated function.
+                Returns:
+                    The result of the awaited call.
+                """
+                started = time.perf_counter()
+                try:
+                    result = await func(*args, **kwargs)
+                except BaseException as e:
+                    log_call(logger, function_name, args, kwargs, started, 'error', error=e)
+                    raise
+                log_call(logger, function_name, args, kwargs, started, 'ok', result=result)
+                return result
+
+            return async_inner_wrapper
 
         @wraps(func)
         def inner_wrapper(*args, **kwargs):
@@ -53,9 +233,13 @@ def log_decorator(log_file):
             Returns:
                 The result of the function call.
             """
-            logging.info(f"Calling function '{func.__name__}' with arguments {args} and keyword arguments {kwargs}")
-            result = func(*args, **kwargs)
-            logging.info(f"Function '{func.__name__}' returned {result}")
+            started = time.perf_counter()
+            try:
+                result = func(*args, **kwargs)
+            except BaseException as e:
+                log_call(logger, function_name, args, kwargs, started, 'error', error=e)
+                raise
+            log_call(logger, function_name, args, kwargs, started, 'ok', result=result)
             return result
 
         return inner_wrapper
@@ -1,19 +1,61 @@
-import uvicorn
+from contextlib import asynccontextmanager
+
 from fastapi import FastAPI
 from app.controllers.user_controller import user_router
 from app.controllers.expense_controller import expense_router
 from app.controllers.revenue_controller import revenue_router
 from app.controllers.vizualization_controller import visualization_router
+from app.controllers.export_controller import export_router
+from app.controllers.health_controller import health_router
+from app.controllers.import_controller import import_router
+from app.controllers.metrics_controller import metrics_router
+from app.config import settings
+from app.database import database_connection, repository
+from app.metrics.middleware import MetricsMiddleware
+from app.services import ledger_service, render_pool, rollup_service
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """
+    Runs the startup and shutdown work of the application.
+    On startup, the database client is created, the indexes the queries rely on are created
+    and the id sequences are synchronized with the stored documents, the monthly rollups are
+    backfilled if the rollup backend is used and they are empty, and the compactor writing
+    the balance snapshots is started; on shutdown, the compactor is stopped, the repository
+    thread pool and the chart render pool are shut down and the database client is closed.
+    """
+    database_connection.connect()
+    await repository.create_indexes()
+    await repository.sync_counters()
+    if settings.ANALYTICS_BACKEND == 'rollup':
+        await rollup_service.backfill()
+    ledger_service.start_compactor()
+    yield
+    await ledger_service.stop_compactor()
+    repository.shutdown()
+    render_pool.shutdown()
+    database_connection.close()
+
 
 # Create an instance of the FastAPI application
-app = FastAPI()
+app = FastAPI(lifespan=lifespan)
+
+# Record the latency of every request, exposed at /metrics
+app.add_middleware(MetricsMiddleware)
 
 # Include the routers with the appropriate prefixes
 app.include_router(user_router, prefix='/user')
 app.include_router(expense_router, prefix='/expense')
 app.include_router(revenue_router, prefix='/revenue')
 app.include_router(visualization_router, prefix='/vis')
+app.include_router(export_router, prefix='/export')
+app.include_router(import_router, prefix='/import')
+app.include_router(metrics_router, prefix='/metrics')
+app.include_router(health_router, prefix='/health')
 
 # Run the application using uvicorn
 if __name__ == "__main__":
+    import uvicorn
+
     uvicorn.run("main:app", host="127.0.0.1", port=8000, reload=True)
@@ -0,0 +1,260 @@
+import bisect
+import math
+import threading
+
+# Default histogram buckets, in seconds, from 1 millisecond to 10 seconds.
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+_registry = {}
+_registry_lock = threading.Lock()
+
+# Functions called before every exposition, to refresh the gauges sampled from other modules.
+_collect_hooks = []
+
+
+def _escape(value):
+    """
+    Escape a label value for the Prometheus text format.
+    """
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _format_labels(names, values, extra=None):
+    """
+    Format a label set, e.g. {function="get_expenses",status="ok"}.
+    Args:
+        names (tuple): The label names.
+        values (tuple): The label values, in the order of the names.
+        extra (tuple, optional): An additional (name, value) pair, such as the 'le' of a bucket.
+    Returns:
+        str: The formatted labels, or an empty string when there are none.
+    """
+    pairs = list(zip(names, values))
+    if extra is not None:
+        pairs.append(extra)
+    if not pairs:
+        return ''
+    return '{' + ','.join(f'{name}="{_escape(value)}"' for name, value in pairs) + '}'
+
+
+def _format_value(value):
+    """
+    Format a sample value for the Prometheus text format.
+    """
+    if value == math.inf:
+        return '+Inf'
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+class _Metric:
+    """
+    Base class of the metrics: a named family of samples, one per label set.
+    It is safe to update from several threads.
+    """
+
+    type_name = None
+
+    def __init__(self, name: str, documentation: str, label_names=()):
+        self.name = name
+        self.documentation = documentation
+        self.label_names = tuple(label_names)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def _key(self, labels):
+        """
+        Return the label values of a sample, in the order of the label names.
+        Raises:
+            ValueError: If the labels do not match the label names of the metric.
+        """
+        if set(labels) != set(self.label_names):
+            raise ValueError(f"Metric {self.name} expects the labels {self.label_names}, got {tuple(labels)}")
+        return tuple(str(labels[name]) for name in self.label_names)
+
+    def _samples(self):
+        """
+        Yield the (suffix, label values, extra label, value) of every sample of the metric.
+        """
+        raise NotImplementedError
+
+    def expose(self):
+        """
+        Render the metric in the Prometheus text format.
+        Returns:
+            list: The lines of the metric.
+        """
+        lines = [f'# HELP {self.name} {self.documentation}', f'# TYPE {self.name} {self.type_name}']
+        with self._lock:
+            samples = list(self._samples())
+        for suffix, values, extra, value in samples:
+            lines.append(f'{self.name}{suffix}{_format_labels(self.label_names, values, extra)} {_format_value(value)}')
+        return lines
+
+
+class Counter(_Metric):
+    """
+    A monotonically increasing count, such as a number of calls.
+    """
+
+    type_name = 'counter'
+
+    def inc(self, amount: float = 1, **labels):
+        """
+        Increase the counter of a label set.
+        Args:
+            amount (float): The amount to add; must not be negative.
+            **labels: The label values of the sample.
+        """
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def _samples(self):
+        for key, value in self._values.items():
+            yield '_total', key, None, value
+
+
+class Gauge(_Metric):
+    """
+    A value that can go up and down, such as a queue depth or a cache size.
+    """
+
+    type_name = 'gauge'
+
+    def set(self, value: float, **labels):
+        """
+        Set the value of a label set.
+        Args:
+            value (float): The current value.
+            **labels: The label values of the sample.
+        """
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = value
+
+    def _samples(self):
+        for key, value in self._values.items():
+            yield '', key, None, value
+
+
+class Histogram(_Metric):
+    """
+    A distribution of observed values, such as durations, counted in cumulative buckets.
+    """
+
+    type_name = 'histogram'
+
+    def __init__(self, name: str, documentation: str, label_names=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, documentation, label_names)
+        self.buckets = tuple(sorted(buckets)) + (math.inf,)
+
+    def observe(self, value: float, **labels):
+        """
+        Record an observed value for a label set.
+        Args:
+            value (float): The observed value.
+            **labels: The label values of the sample.
+        """
+        key = self._key(labels)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            counts, total = self._values.get(key, ([0] * len(self.buckets), 0.0))
+            counts[index] += 1
+            self._values[key] = (counts, total + value)
+
+    def _samples(self):
+        for key, (counts, total) in self._values.items():
+            cumulative = 0
+            for bound, count in zip(self.buckets, counts):
+                cumulative += count
+                yield '_bucket', key, ('le', _format_value(bound)), cumulative
+            yield '_sum', key, None, total
+            yield '_count', key, None, cumulative
+
+
+def _get_or_create(metric_class, name, documentation, label_names, **kwargs):
+    """
+    Return the registered metric with a name, registering a new one if there is none.
+    Raises:
+        ValueError: If a different kind of metric is registered under the name.
+    """
+    with _registry_lock:
+        metric = _registry.get(name)
+        if metric is None:
+            metric = _registry[name] = metric_class(name, documentation, label_names, **kwargs)
+        elif not isinstance(metric, metric_class) or metric.label_names != tuple(label_names):
+            raise ValueError(f"Metric {name} is already registered with a different type or labels")
+        return metric
+
+
+def counter(name: str, documentation: str, label_names=()):
+    """
+    Return the registered counter with a name, registering it on first use.
+    Args:
+        name (str): The metric name, without the '_total' suffix.
+        documentation (str): The help text of the metric.
+        label_names (tuple): The names of the labels of the samples.
+    Returns:
+        Counter: The counter.
+    """
+    return _get_or_create(Counter, name, documentation, label_names)
+
+
+def gauge(name: str, documentation: str, label_names=()):
+    """
+    Return the registered gauge with a name, registering it on first use.
+    Args:
+        name (str): The metric name.
+        documentation (str): The help text of the metric.
+        label_names (tuple): The names of the labels of the samples.
+    Returns:
+        Gauge: The gauge.
+    """
+    return _get_or_create(Gauge, name, documentation, label_names)
+
+
+def histogram(name: str, documentation: str, label_names=(), buckets=DEFAULT_BUCKETS):
+    """
+    Return the registered histogram with a name, registering it on first use.
+    Args:
+        name (str): The metric name.
+        documentation (str): The help text of the metric.
+        label_names (tuple): The names of the labels of the samples.
+        buckets (tuple): The upper bounds of the buckets; '+Inf' is added.
+    Returns:
+        Histogram: The histogram.
+    """
+    return _get_or_create(Histogram, name, documentation, label_names, buckets=buckets)
+
+
+def on_collect(hook):
+    """
+    Register a function called before every exposition, typically to set gauges from
+    the stats of a module, such as the render pool or a cache.
+    Args:
+        hook (callable): A function taking no arguments.
+    Returns:
+        callable: The hook, so that this can be used as a decorator.
+    """
+    with _registry_lock:
+        _collect_hooks.append(hook)
+    return hook
+
+
+def expose():
+    """
+    Render all the registered metrics in the Prometheus text format.
+    Returns:
+        str: The metrics, ready to be scraped.
+    """
+    with _registry_lock:
+        hooks = list(_collect_hooks)
+    for hook in hooks:
+        hook()
+    with _registry_lock:
+        metrics = list(_registry.values())
+    return '\n'.join(line for metric in metrics for line in metric.expose()) + '\n'
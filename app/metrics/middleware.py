@@ -0,0 +1,53 @@
+import time
+
+from app.metrics import metrics
+
+request_duration = metrics.histogram('http_request_duration_seconds',
+                                     'Duration of the HTTP requests, until the last byte of the response is sent.',
+                                     ('method', 'route', 'status'))
+
+
+def route_template(scope):
+    """
+    Return the path template of the route that handled a request, e.g. '/user/{user_id}'.
+    include_router stores the routes with the prefix of their router, so the route's path is the full template.
+    Newer FastAPI releases keep the included routes unprefixed, and put the full route in the scope instead.
+    Args:
+        scope (dict): The ASGI scope of the request, after routing.
+    Returns:
+        str: The path template, or 'unmatched' if no route handled the request.
+    """
+    route = scope.get('fastapi', {}).get('effective_route_context') or scope.get('route')
+    path = getattr(route, 'path', None)
+    return path if path is not None else 'unmatched'
+
+
+class MetricsMiddleware:
+    """
+    ASGI middleware recording the latency of every HTTP request in a histogram labelled by
+    method, route template and status code. Requests matching no route are recorded under
+    the route 'unmatched', so that the number of label sets stays bounded.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] != 'http':
+            await self.app(scope, receive, send)
+            return
+
+        started = time.perf_counter()
+        status = 500
+
+        async def send_with_status(message):
+            nonlocal status
+            if message['type'] == 'http.response.start':
+                status = message['status']
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            request_duration.observe(time.perf_counter() - started, method=scope['method'],
+                                     route=route_template(scope), status=status)
@@ -0,0 +1,53 @@
+"""
+Opens the ledger of the users created before the ledger existed, or verifies the ledgers.
+
+A user's ledger is opened with an 'opening' entry of their current balance, so run it once while
+the users are not writing. Balances before the opening entry are not recorded.
+
+Usage:
+    python -m app.scripts.open_ledgers                     # open the ledgers that are still empty
+    python -m app.scripts.open_ledgers --compact           # also write the balance snapshots now
+    python -m app.scripts.open_ledgers --verify            # report the balances that differ from their ledger
+    python -m app.scripts.open_ledgers --verify --user-id 325962801
+"""
+import argparse
+import asyncio
+import sys
+
+from app.database import repository
+from app.services import ledger_service
+
+
+async def main(user_id: str = None, verify: bool = False, compact: bool = False):
+    """
+    Open, compact or verify the ledgers.
+    Args:
+        user_id (str, optional): The ID of the user to verify; all the users when omitted.
+        verify (bool): Whether to only compare the balances with the ledgers.
+        compact (bool): Whether to write the balance snapshots after opening the ledgers.
+    Returns:
+        int: The exit code; 1 when verification found mismatches.
+    """
+    try:
+        await repository.create_indexes()
+        if not verify:
+            print(f"Opened {await ledger_service.open_accounts()} ledgers")
+            if compact:
+                print(f"Wrote {await ledger_service.compact()} balance snapshots")
+            return 0
+        mismatches = await ledger_service.verify(user_id)
+        for mismatch in mismatches:
+            print(f"{mismatch['userId']}: balance {mismatch['balance']}, ledger {mismatch['ledger']}")
+        print(f"{len(mismatches)} mismatched balances")
+        return 1 if mismatches else 0
+    finally:
+        repository.shutdown()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--user-id', help='only verify the ledger of this user')
+    parser.add_argument('--verify', action='store_true', help='compare the balances instead of opening the ledgers')
+    parser.add_argument('--compact', action='store_true', help='write the balance snapshots after opening the ledgers')
+    args = parser.parse_args()
+    sys.exit(asyncio.run(main(args.user_id, args.verify, args.compact)))
@@ -0,0 +1,47 @@
+"""
+Regenerates the monthly_rollups collection from the raw expenses and revenues, or verifies it.
+
+Usage:
+    python -m app.scripts.rebuild_rollups                     # rebuild the rollups of all the users
+    python -m app.scripts.rebuild_rollups --user-id 325962801 # rebuild the rollups of one user
+    python -m app.scripts.rebuild_rollups --verify            # report the rollups that do not match
+"""
+import argparse
+import asyncio
+import sys
+
+from app.database import repository
+from app.services import rollup_service
+
+
+async def main(user_id: str = None, verify: bool = False):
+    """
+    Rebuild or verify the rollups.
+    Args:
+        user_id (str, optional): The ID of the user to process; all the users when omitted.
+        verify (bool): Whether to only compare the rollups with the raw collections.
+    Returns:
+        int: The exit code; 1 when verification found mismatches.
+    """
+    try:
+        await repository.create_indexes()
+        if not verify:
+            written = await rollup_service.rebuild(user_id)
+            print(f"Rebuilt {written} rollups")
+            return 0
+        mismatches = await rollup_service.verify(user_id)
+        for mismatch in mismatches:
+            print(f"{mismatch['userId']} {mismatch['month']} {mismatch['kind']}: "
+                  f"expected {mismatch['expected']}, stored {mismatch['stored']}")
+        print(f"{len(mismatches)} mismatched rollups")
+        return 1 if mismatches else 0
+    finally:
+        repository.shutdown()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--user-id', help='only process the rollups of this user')
+    parser.add_argument('--verify', action='store_true', help='compare the rollups instead of rebuilding them')
+    args = parser.parse_args()
+    sys.exit(asyncio.run(main(args.user_id, args.verify)))
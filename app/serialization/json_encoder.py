@@ -0,0 +1,52 @@
+import json
+
+from bson import json_util
+from bson.json_util import RELAXED_JSON_OPTIONS
+from fastapi.responses import JSONResponse
+
+try:
+    import orjson
+except ImportError:  # orjson is optional, the standard library encoder is used without it
+    orjson = None
+
+
+def _default(obj):
+    """
+    Encode the BSON types the JSON encoder does not know, such as ObjectId and datetime.
+    The output is the relaxed Extended JSON produced by bson.json_util, e.g. {"$oid": "..."}
+    and {"$date": "2024-05-27T15:41:49.252Z"}.
+    Args:
+        obj: The object to encode.
+    Returns:
+        The JSON-compatible representation of the object.
+    Raises:
+        TypeError: If the object cannot be encoded.
+    """
+    return json_util.default(obj, RELAXED_JSON_OPTIONS)
+
+
+def dumps(content):
+    """
+    Encode MongoDB documents to JSON in a single pass.
+    Produces the same document structure as json_util.dumps, using orjson when it is installed.
+    Args:
+        content: The documents to encode, e.g. a dict or a list of dicts.
+    Returns:
+        bytes: The UTF-8 encoded JSON.
+    """
+    if orjson is not None:
+        # Datetimes are passed to _default so they are encoded as {"$date": ...} like json_util does
+        return orjson.dumps(content, default=_default, option=orjson.OPT_PASSTHROUGH_DATETIME)
+    return json.dumps(content, default=_default, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+
+
+class MongoJSONResponse(JSONResponse):
+    """
+    A JSON response that encodes MongoDB documents directly.
+    Replaces the json.loads(json_util.dumps(...)) round trip followed by FastAPI's own
+    serialization with a single encoding pass. Return it from the endpoint, so FastAPI
+    does not serialize the content again.
+    """
+
+    def render(self, content) -> bytes:
+        return dumps(content)
@@ -0,0 +1,133 @@
+import asyncio
+
+from app.config import settings
+from app.database import repository
+from app.database.database_connection import Collections
+from app.services import expense_service, revenue_service, rollup_service
+
+BACKENDS = ('rollup', 'mongo', 'pandas')
+
+
+def _check_backend(backend: str):
+    """
+    Resolve and validate the analytics backend.
+    Args:
+        backend (str): The requested backend, or None for the ANALYTICS_BACKEND setting.
+    Returns:
+        str: The backend to use.
+    Raises:
+        ValueError: If the backend is not supported.
+    """
+    backend = backend or settings.ANALYTICS_BACKEND
+    if backend not in BACKENDS:
+        raise ValueError(f"Unsupported analytics backend {backend}, expected one of {list(BACKENDS)}")
+    return backend
+
+
+def _merge_months(monthly_expenses: dict, monthly_revenues: dict):
+    """
+    Merge the monthly expense and revenue totals into aligned lists.
+    Args:
+        monthly_expenses (dict): The total expenses of each month, keyed by 'YYYY-MM'.
+        monthly_revenues (dict): The total revenues of each month, keyed by 'YYYY-MM'.
+    Returns:
+        dict: The sorted 'months', and the matching 'expenses' and 'revenues' totals (0 for a month without any).
+    """
+    months = sorted(set(monthly_expenses) | set(monthly_revenues))
+    return {
+        'months': months,
+        'expenses': [monthly_expenses.get(month, 0.0) for month in months],
+        'revenues': [monthly_revenues.get(month, 0.0) for month in months]
+    }
+
+
+async def _monthly_totals_mongo(collection, user_id: str):
+    """
+    Sum the amounts of a user's transactions per month inside MongoDB.
+    """
+    pipeline = [
+        {'$match': {'userId': user_id}},
+        {'$group': {'_id': {'$dateToString': {'format': '%Y-%m', 'date': '$date'}},
+                    'total': {'$sum': '$amount'}}},
+    ]
+    groups = await repository.aggregate(collection, pipeline)
+    return {group['_id']: float(group['total']) for group in groups}
+
+
+def _monthly_totals_pandas(transactions: list):
+    """
+    Sum the amounts of transactions per month with pandas.
+    pandas is imported here rather than at module load, as the default backends never need it.
+    """
+    import pandas as pd
+
+    df = pd.DataFrame(transactions, columns=['date', 'amount'])
+    df['month'] = pd.to_datetime(df['date']).dt.to_period('M')
+    totals = df.groupby('month')['amount'].sum()
+    return {str(month): float(total) for month, total in totals.items()}
+
+
+async def monthly_totals(user_id: str, backend: str = None):
+    """
+    Compute the total expenses and revenues of each month for a specific user.
+    Args:
+        user_id (str): The ID of the user.
+        backend (str, optional): 'rollup', 'mongo' or 'pandas'; the ANALYTICS_BACKEND setting when omitted.
+    Returns:
+        dict: The sorted 'months' ('YYYY-MM'), and the matching 'expenses' and 'revenues' totals.
+    Raises:
+        ValueError: If the backend is not supported.
+        Exception: If there is an error during the process.
+    """
+    try:
+        backend = _check_backend(backend)
+        if backend == 'rollup':
+            monthly_expenses, monthly_revenues = await rollup_service.get_monthly_totals(user_id)
+        elif backend == 'mongo':
+            monthly_expenses, monthly_revenues = await asyncio.gather(
+                _monthly_totals_mongo(Collections.expenses, user_id),
+                _monthly_totals_mongo(Collections.revenues, user_id)
+            )
+        else:
+            expenses, revenues = await asyncio.gather(
+                expense_service.get_expenses(user_id, ['date', 'amount']),
+                revenue_service.get_revenues(user_id, ['date', 'amount'])
+            )
+            monthly_expenses = _monthly_totals_pandas(expenses)
+            monthly_revenues = _monthly_totals_pandas(revenues)
+        return _merge_months(monthly_expenses, monthly_revenues)
+    except Exception as e:
+        raise e
+
+
+async def category_totals(user_id: str, backend: str = None):
+    """
+    Compute the total expenses of each category (beneficiary) for a specific user.
+    Args:
+        user_id (str): The ID of the user.
+        backend (str, optional): 'mongo' or 'pandas'; the ANALYTICS_BACKEND setting when omitted.
+            The rollups hold no categories, so 'rollup' uses 'mongo'.
+    Returns:
+        dict: The total amount of each category, sorted by category.
+    Raises:
+        ValueError: If the backend is not supported.
+        Exception: If there is an error during the process.
+    """
+    try:
+        if _check_backend(backend) in ('rollup', 'mongo'):
+            pipeline = [
+                {'$match': {'userId': user_id}},
+                {'$group': {'_id': '$beneficiary', 'total': {'$sum': '$amount'}}},
+                {'$sort': {'_id': 1}},
+            ]
+            groups = await repository.aggregate(Collections.expenses, pipeline)
+            return {group['_id']: float(group['total']) for group in groups}
+
+        import pandas as pd
+
+        expenses = await expense_service.get_expenses(user_id, ['beneficiary', 'amount'])
+        df = pd.DataFrame(expenses, columns=['beneficiary', 'amount'])
+        totals = df.groupby('beneficiary')['amount'].sum().sort_index()
+        return {category: float(total) for category, total in totals.items()}
+    except Exception as e:
+        raise e
@@ -0,0 +1,49 @@
+# Supported resampling frequencies and their pandas offset aliases.
+FREQUENCIES = {
+    'daily': 'D',
+    'weekly': 'W',
+    'monthly': 'ME',
+}
+
+
+def compute_balance_series(current_balance: float, expenses: list, revenues: list, frequency: str = None):
+    """
+    Compute a user's balance after each of their transactions.
+    The signed amounts of all the transactions are merged, sorted once and summed cumulatively,
+    so the cost is O(n log n) in the number of transactions. The series is anchored on the
+    current balance: the opening balance is the current balance minus the net of all the
+    transactions, and the last point of the series is the current balance.
+    Args:
+        current_balance (float): The user's current balance.
+        expenses (list): The user's expenses, each with a 'date' and an 'amount'.
+        revenues (list): The user's revenues, each with a 'date' and an 'amount'.
+        frequency (str, optional): 'daily', 'weekly' or 'monthly' to return the balance at the end
+            of each period instead of after each transaction date.
+    Returns:
+        dict: The 'opening_balance', and the 'dates' and matching 'balances' of the series.
+    Raises:
+        ValueError: If the frequency is not supported.
+    """
+    if frequency is not None and frequency not in FREQUENCIES:
+        raise ValueError(f"Unsupported frequency {frequency}, expected one of {list(FREQUENCIES)}")
+    # pandas is imported on first use, so that processes serving no balance chart never load it
+    import pandas as pd
+
+    amounts = pd.Series(
+        [-expense['amount'] for expense in expenses] + [revenue['amount'] for revenue in revenues],
+        index=pd.DatetimeIndex([expense['date'] for expense in expenses] + [revenue['date'] for revenue in revenues]),
+        dtype=float
+    )
+    opening_balance = current_balance - amounts.sum()
+    if amounts.empty:
+        return {'opening_balance': float(opening_balance), 'dates': [], 'balances': []}
+
+    # Net amount per date, in date order, then the running balance
+    balances = amounts.groupby(level=0).sum().cumsum() + opening_balance
+    if frequency is not None:
+        balances = balances.resample(FREQUENCIES[frequency]).last().ffill()
+    return {
+        'opening_balance': float(opening_balance),
+        'dates': balances.index.to_pydatetime().tolist(),
+        'balances': balances.tolist()
+    }
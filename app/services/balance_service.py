@@ -1,22 +1,40 @@
-from app.models.user import User
-from app.services import user_service
+from app.cache import user_cache
+from app.database import repository
+from app.database.database_connection import Collections
+from app.services import ledger_service
 
 
-async def change_balance(user_id: str, difference: float):
+async def change_balance(user_id: str, difference: float, kind: str = 'adjustment', reference=None, session=None):
     """
-    Adjusts the balance of a user by a specified difference.
+    Adjusts the balance of a user by a specified difference, and appends the change to the user's ledger.
+    The adjustment is a single atomic $inc on the user's balance, so concurrent
+    changes to the same balance never overwrite each other. The user's cached document is
+    invalidated; within a transaction the caller invalidates it again once it is committed.
     Args:
-        user_id (int): The ID of the user whose balance will be updated.
-        difference (int): The amount to adjust the user's balance by.
+        user_id (str): The ID of the user whose balance will be updated.
+        difference (float): The amount to adjust the user's balance by.
+        kind (str): What changed the balance, recorded in the ledger: 'expense', 'revenue', 'import'
+            or 'adjustment'.
+        reference (optional): The ID of the transaction that changed the balance, recorded in the ledger.
+        session (ClientSession, optional): The session of the unit of work the change is part of.
     Returns:
-        None
+        float: The user's new balance.
     Raises:
-        Exception: If there is an error retrieving or updating the user.
+        ValueError: If the user is not found.
+        RuntimeError: If there is an error updating the user or the ledger.
     """
+    # _id is projected so a matched user always returns a document, even one that had no balance
+    updated_user = await repository.increment(Collections.users, {"id": user_id}, {"balance": difference},
+                                              projection={"_id": 1, "balance": 1}, session=session)
+    if updated_user is None:
+        raise ValueError("User not found")
+    user_cache.invalidate(user_id)
     try:
-        existing_user = await user_service.get_user_by_id(user_id)
-        new_user = User(**existing_user)
-        new_user.balance += difference
-        await user_service.update_user(user_id, new_user)
-    except Exception as e:
-        raise e
\ No newline at end of file
+        await ledger_service.append(user_id, difference, kind, reference, session=session)
+    except Exception:
+        if session is None:
+            # Without a transaction, take the change back so the balance stays the sum of the ledger
+            await repository.increment(Collections.users, {"id": user_id}, {"balance": -difference})
+            user_cache.invalidate(user_id)
+        raise
+    return updated_user.get('balance', 0)
@@ -0,0 +1,147 @@
+import io
+
+# Supported image formats and their media types.
+MEDIA_TYPES = {
+    'png': 'image/png',
+    'svg': 'image/svg+xml',
+}
+
+
+def _new_figure(figsize):
+    """
+    Create a figure that is not registered with pyplot, so concurrent renders never share state.
+    Args:
+        figsize (tuple): The width and height of the figure in inches.
+    Returns:
+        Figure: A new figure with an Agg canvas.
+    """
+    # matplotlib is imported by the first render, in the render worker processes; the API
+    # processes only use MEDIA_TYPES and check_format and never load it.
+    import matplotlib
+    from matplotlib.backends.backend_agg import FigureCanvasAgg
+    from matplotlib.figure import Figure
+
+    # Render without a display; the charts are only ever written to in-memory buffers.
+    matplotlib.use('Agg')
+    figure = Figure(figsize=figsize, layout='tight')
+    FigureCanvasAgg(figure)
+    return figure
+
+
+def check_format(image_format: str):
+    """
+    Validate that an image format is supported.
+    Args:
+        image_format (str): The image format to validate.
+    Returns:
+        str: The validated image format.
+    Raises:
+        ValueError: If the image format is not one of MEDIA_TYPES.
+    """
+    if image_format not in MEDIA_TYPES:
+        raise ValueError(f"Unsupported image format {image_format}, expected one of {list(MEDIA_TYPES)}")
+    return image_format
+
+
+def _to_image(figure, image_format: str):
+    """
+    Render a figure into an image.
+    Args:
+        figure (Figure): The figure to render.
+        image_format (str): The image format, one of MEDIA_TYPES.
+    Returns:
+        bytes: The rendered image.
+    Raises:
+        ValueError: If the image format is not supported.
+    """
+    check_format(image_format)
+    buffer = io.BytesIO()
+    figure.savefig(buffer, format=image_format)
+    return buffer.getvalue()
+
+
+def render_expense_and_revenue_by_date(data: dict, image_format: str = 'png'):
+    """
+    Render a graph showing expenses and revenues over time.
+    Args:
+        data (dict): 'user_id', and 'expense_dates', 'expense_amounts', 'revenue_dates'
+            and 'revenue_amounts' lists sorted by date.
+        image_format (str): The image format, one of MEDIA_TYPES.
+    Returns:
+        bytes: The rendered image.
+    """
+    figure = _new_figure((10, 6))
+    ax = figure.add_subplot()
+    ax.plot(data['expense_dates'], data['expense_amounts'], 'o-', label='Expenses')
+    ax.plot(data['revenue_dates'], data['revenue_amounts'], 'o-', label='Revenues')
+    ax.set_xlabel('Date')
+    ax.set_ylabel('Amount')
+    ax.set_title(f"Revenues & Expenses for User ID = {data['user_id']}")
+    ax.legend()
+    ax.grid(True)
+    ax.tick_params(axis='x', labelrotation=45)
+    return _to_image(figure, image_format)
+
+
+def render_balance_over_time(data: dict, image_format: str = 'png'):
+    """
+    Render a graph showing the balance over time.
+    Args:
+        data (dict): 'user_id', and 'dates' and 'balances' lists of the same length.
+        image_format (str): The image format, one of MEDIA_TYPES.
+    Returns:
+        bytes: The rendered image.
+    """
+    figure = _new_figure((10, 6))
+    ax = figure.add_subplot()
+    ax.plot(data['dates'], data['balances'], 'o-', label='Balance')
+    ax.set_xlabel('Date')
+    ax.set_ylabel('Balance')
+    ax.set_title(f"Balance Over Time for User ID = {data['user_id']}")
+    ax.legend()
+    ax.grid(True)
+    ax.tick_params(axis='x', labelrotation=45)
+    return _to_image(figure, image_format)
+
+
+def render_expense_distribution_by_category(data: dict, image_format: str = 'png'):
+    """
+    Render a pie chart showing the distribution of expenses by category.
+    Args:
+        data (dict): 'user_id', and 'categories' mapping each category to its total amount.
+        image_format (str): The image format, one of MEDIA_TYPES.
+    Returns:
+        bytes: The rendered image.
+    """
+    figure = _new_figure((8, 8))
+    ax = figure.add_subplot()
+    ax.pie(list(data['categories'].values()), labels=list(data['categories'].keys()), autopct='%1.1f%%',
+           startangle=140)
+    ax.set_title(f"Expense Distribution by Category for User ID = {data['user_id']}")
+    ax.axis('equal')
+    return _to_image(figure, image_format)
+
+
+def render_monthly_summary(data: dict, image_format: str = 'png'):
+    """
+    Render a bar chart showing the monthly summary of revenues and expenses.
+    Args:
+        data (dict): 'user_id', and 'months', 'expenses' and 'revenues' lists of the same length.
+        image_format (str): The image format, one of MEDIA_TYPES.
+    Returns:
+        bytes: The rendered image.
+    """
+    figure = _new_figure((10, 6))
+    ax = figure.add_subplot()
+    positions = range(len(data['months']))
+    width = 0.25
+    ax.bar([position - width / 2 for position in positions], data['expenses'], width, label='Expenses')
+    ax.bar([position + width / 2 for position in positions], data['revenues'], width, label='Revenues')
+    ax.set_xticks(list(positions), data['months'])
+    ax.set_title(f"Monthly Summary for User ID = {data['user_id']}")
+    ax.set_xlabel('Month')
+    ax.set_ylabel('Amount')
+    ax.tick_params(axis='x', labelrotation=45)
+    ax.grid(True)
+    ax.legend()
+    return _to_image(figure, image_format)
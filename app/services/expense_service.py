@@ -1,25 +1,48 @@
+from app.cache import chart_cache, user_cache
 from app.database import repository
 from app.database.database_connection import Collections
 from app.log.log import log_decorator
 from app.models.expense import Expense
-from app.services import balance_service
+from app.services import balance_service, idempotency_service, rollup_service
 
 
 @log_decorator('app.log')
-async def get_expenses(user_id: str):
+async def get_expenses(user_id: str, fields: list = None):
     """
     Retrieve all expenses for a specific user from the database.
     Args:
         user_id (str): The ID of the user whose expenses are to be retrieved.
+        fields (list, optional): The fields to return; all of them when omitted.
     Returns:
         list: A list of expense documents for the specified user.
     Raises:
         Exception: If there is an error during the retrieval process.
     """
     try:
-        expenses = await repository.get_all(Collections.expenses)
-        filtered_expenses = [expense for expense in expenses if expense.get('userId') == user_id]
-        return filtered_expenses
+        projection = {field: 1 for field in fields} if fields else None
+        return await repository.find(Collections.expenses, {'userId': user_id}, projection)
+    except Exception as e:
+        raise e
+
+
+@log_decorator('app.log')
+async def get_expenses_page(user_id: str, limit: int = None, after: str = None, fields: list = None):
+    """
+    Retrieve one page of a user's expenses, ordered by date and ID.
+    Args:
+        user_id (str): The ID of the user whose expenses are to be retrieved.
+        limit (int, optional): The maximum number of expenses in the page; all of them when omitted.
+        after (str, optional): The next_cursor returned with the previous page.
+        fields (list, optional): The fields to return; 'date' and 'id' are always included.
+    Returns:
+        dict: The expense documents under 'items' and the cursor of the next page under 'next_cursor'.
+    Raises:
+        ValueError: If the cursor is invalid.
+        Exception: If there is an error during the retrieval process.
+    """
+    try:
+        return await repository.find_page(Collections.expenses, {'userId': user_id}, ['date', 'id'],
+                                          limit=limit, after=after, projection=fields)
     except Exception as e:
         raise e
 
@@ -47,28 +70,52 @@ async def get_expense_by_id(expense_id: int, user_id: str):
 
 
 @log_decorator('app.log')
-async def add_expense(new_expense: Expense):
+async def add_expense(new_expense: Expense, idempotency_key: str = None):
     """
     Add a new expense entry to the database.
+    The expense is inserted before the user's balance is changed, in one unit of work: in a transaction
+    when the database supports them, otherwise the writes already applied are undone if the balance
+    or the rollups cannot be changed.
     Args:
         new_expense (Expense): The expense object to add.
+        idempotency_key (str, optional): The Idempotency-Key of the request. A retried request with
+            the same key returns the result of the first one and adds nothing.
     Returns:
         dict: The added expense document.
     Raises:
-        ValueError: If the expense object is null or the expense ID already exists.
+        ValueError: If the expense object is null or the user is not found.
+        IdempotencyKeyReusedError: If the idempotency key was used with a different request.
+        IdempotencyKeyInUseError: If a request with the same idempotency key is still being processed.
         Exception: If there is an error during the addition process.
     """
     if new_expense is None:
         raise ValueError("Expense object is null")
-    expenses = await repository.get_all(Collections.expenses)
-    if expenses is None:
-        new_expense.id = 0
-    else:
-        max_item = max(expenses, key=lambda item: item['id'])
-        new_expense.id = max_item['id'] + 1
+
+    async def work(session):
+        # The id is allocated outside the transaction, so concurrent additions never conflict on the sequence
+        new_expense.id = await repository.allocate_ids(Collections.expenses)
+        result = await repository.add(Collections.expenses, new_expense.dict(), session=session)
+        balance_changed = False
+        try:
+            await balance_service.change_balance(new_expense.userId, new_expense.amount * -1,
+                                                 kind='expense', reference=new_expense.id, session=session)
+            balance_changed = True
+            await rollup_service.record_change('expense', new_transaction=new_expense, session=session)
+        except Exception:
+            if session is None:
+                # Without a transaction, undo the writes already applied
+                if balance_changed:
+                    await balance_service.change_balance(new_expense.userId, new_expense.amount,
+                                                         kind='expense', reference=new_expense.id)
+                await repository.delete(Collections.expenses, new_expense.id)
+            raise
+        return result
+
     try:
-        await balance_service.change_balance(new_expense.userId, new_expense.amount * -1)
-        return await repository.add(Collections.expenses, new_expense.dict())
+        result = await idempotency_service.run_once('POST /expense', idempotency_key, new_expense.dict(), work)
+        chart_cache.invalidate_user(new_expense.userId)
+        user_cache.invalidate(new_expense.userId)
+        return result
     except ValueError as ve:
         raise ValueError(ve)
     except Exception as e:
@@ -79,6 +126,8 @@ async def add_expense(new_expense: Expense):
 async def update_expense(expense_id: int, new_expense: Expense):
     """
     Update an existing expense entry's data.
+    The expense, the user's balance and the rollups are updated in one unit of work: in a transaction
+    when the database supports them, otherwise the writes already applied are undone if a later one fails.
     Args:
         expense_id (int): The ID of the expense entry to update.
         new_expense (Expense): The updated expense object.
@@ -95,9 +144,31 @@ async def update_expense(expense_id: int, new_expense: Expense):
         raise ValueError("Expense not found")
     existing_expense = Expense(**existing_expense)
     new_expense.id = existing_expense.id
+
+    async def work(session):
+        result = await repository.update(Collections.expenses, expense_id, new_expense.dict(), session=session)
+        balance_changed = False
+        try:
+            await balance_service.change_balance(new_expense.userId, existing_expense.amount - new_expense.amount,
+                                                 kind='expense', reference=new_expense.id, session=session)
+            balance_changed = True
+            await rollup_service.record_change('expense', existing_expense, new_expense, session=session)
+        except Exception:
+            if session is None:
+                # Without a transaction, undo the writes already applied
+                if balance_changed:
+                    await balance_service.change_balance(new_expense.userId,
+                                                         new_expense.amount - existing_expense.amount,
+                                                         kind='expense', reference=new_expense.id)
+                await repository.update(Collections.expenses, expense_id, existing_expense.dict())
+            raise
+        return result
+
     try:
-        await balance_service.change_balance(new_expense.userId, existing_expense.amount - new_expense.amount)
-        return await repository.update(Collections.expenses, expense_id, new_expense.dict())
+        result = await repository.run_in_transaction(work)
+        chart_cache.invalidate_user(new_expense.userId)
+        user_cache.invalidate(new_expense.userId)
+        return result
     except ValueError as ve:
         raise ValueError(ve)
     except Exception as e:
@@ -108,6 +179,8 @@ async def update_expense(expense_id: int, new_expense: Expense):
 async def delete_expense(expense_id: int, user_id: str):
     """
     Delete an expense entry from the database.
+    The expense, the user's balance and the rollups are updated in one unit of work: in a transaction
+    when the database supports them, otherwise the writes already applied are undone if a later one fails.
     Args:
         expense_id (int): The ID of the expense entry to delete.
         user_id (str): The ID of the user who owns the expense.
@@ -121,9 +194,30 @@ async def delete_expense(expense_id: int, user_id: str):
     if existing_expense is None:
         raise ValueError("Expense not found")
     existing_expense = Expense(**existing_expense)
+
+    async def work(session):
+        result = await repository.delete(Collections.expenses, expense_id, session=session)
+        balance_changed = False
+        try:
+            await balance_service.change_balance(existing_expense.userId, existing_expense.amount,
+                                                 kind='expense', reference=existing_expense.id, session=session)
+            balance_changed = True
+            await rollup_service.record_change('expense', old_transaction=existing_expense, session=session)
+        except Exception:
+            if session is None:
+                # Without a transaction, undo the writes already applied
+                if balance_changed:
+                    await balance_service.change_balance(existing_expense.userId, existing_expense.amount * -1,
+                                                         kind='expense', reference=existing_expense.id)
+                await repository.add(Collections.expenses, existing_expense.dict())
+            raise
+        return result
+
     try:
-        await balance_service.change_balance(existing_expense.userId, existing_expense.amount)
-        return await repository.delete(Collections.expenses, expense_id)
+        result = await repository.run_in_transaction(work)
+        chart_cache.invalidate_user(existing_expense.userId)
+        user_cache.invalidate(existing_expense.userId)
+        return result
     except ValueError as ve:
         raise ValueError(ve)
     except Exception as e:
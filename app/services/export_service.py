@@ -0,0 +1,126 @@
+import csv
+import heapq
+import io
+
+from app.config import settings
+from app.database import repository
+from app.database.database_connection import Collections
+from app.serialization import json_encoder
+
+# Supported export formats and their media types.
+MEDIA_TYPES = {
+    'ndjson': 'application/x-ndjson',
+    'csv': 'text/csv',
+}
+
+# Columns of the CSV export. 'counterparty' holds the beneficiary of an expense or the benefactor of a revenue.
+CSV_COLUMNS = ['kind', 'id', 'userId', 'amount', 'date', 'counterparty', 'documentation']
+
+
+async def _next_or_none(stream):
+    """
+    Return the next item of an async iterator, or None when it is exhausted.
+    """
+    try:
+        return await stream.__anext__()
+    except StopAsyncIteration:
+        return None
+
+
+async def _transactions(collection, kind: str, user_id: str):
+    """
+    Stream the transactions of one collection for a user, ordered by date and ID.
+    Args:
+        collection (Collections): The collection to read.
+        kind (str): The kind of transaction added to each record ('expense' or 'revenue').
+        user_id (str): The ID of the user.
+    Yields:
+        dict: The next transaction, with a 'kind' field.
+    """
+    async for batch in repository.iter_find(collection, {'userId': user_id}, {'_id': 0},
+                                            sort=[('date', 1), ('id', 1)],
+                                            batch_size=settings.EXPORT_BATCH_SIZE):
+        for transaction in batch:
+            yield {'kind': kind, **transaction}
+
+
+async def transaction_history(user_id: str):
+    """
+    Stream all the expenses and revenues of a user merged in date order.
+    Both collections are read in batches and merged as they are read, so memory use
+    does not depend on the size of the history.
+    Args:
+        user_id (str): The ID of the user.
+    Yields:
+        dict: The next transaction, with a 'kind' field of 'expense' or 'revenue'.
+    """
+    streams = [_transactions(Collections.expenses, 'expense', user_id),
+               _transactions(Collections.revenues, 'revenue', user_id)]
+    # Heap of the next transaction of every stream, keyed by date and stream index
+    heap = []
+    for index, stream in enumerate(streams):
+        transaction = await _next_or_none(stream)
+        if transaction is not None:
+            heap.append((transaction['date'], index, transaction))
+    heapq.heapify(heap)
+    while heap:
+        _, index, transaction = heap[0]
+        yield transaction
+        following = await _next_or_none(streams[index])
+        if following is None:
+            heapq.heappop(heap)
+        else:
+            heapq.heapreplace(heap, (following['date'], index, following))
+
+
+async def _ndjson_chunks(user_id: str):
+    """
+    Stream a user's transaction history as newline-delimited JSON, EXPORT_BATCH_SIZE lines per chunk.
+    """
+    lines = []
+    async for transaction in transaction_history(user_id):
+        lines.append(json_encoder.dumps(transaction) + b'\n')
+        if len(lines) >= settings.EXPORT_BATCH_SIZE:
+            yield b''.join(lines)
+            lines = []
+    if lines:
+        yield b''.join(lines)
+
+
+async def _csv_chunks(user_id: str):
+    """
+    Stream a user's transaction history as CSV with a header row, EXPORT_BATCH_SIZE rows per chunk.
+    """
+    buffer = io.StringIO()
+    writer = csv.DictWriter(buffer, fieldnames=CSV_COLUMNS, extrasaction='ignore')
+    writer.writeheader()
+    rows = 0
+    async for transaction in transaction_history(user_id):
+        transaction['counterparty'] = transaction.get('beneficiary', transaction.get('benefactor'))
+        transaction['date'] = transaction['date'].isoformat()
+        writer.writerow(transaction)
+        rows += 1
+        if rows >= settings.EXPORT_BATCH_SIZE:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+            rows = 0
+    yield buffer.getvalue()
+
+
+def export_transactions(user_id: str, export_format: str):
+    """
+    Stream a user's full transaction history encoded in the requested format.
+    Args:
+        user_id (str): The ID of the user.
+        export_format (str): 'ndjson' for one JSON document per line, or 'csv'.
+    Returns:
+        async generator: The chunks of the export.
+    Raises:
+        ValueError: If the export format is not supported.
+    """
+    if export_format == 'ndjson':
+        return _ndjson_chunks(user_id)
+    if export_format == 'csv':
+        return _csv_chunks(user_id)
+    raise ValueError(f"Unsupported export format {export_format}, expected one of {list(MEDIA_TYPES)}")
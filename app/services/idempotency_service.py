@@ -0,0 +1,111 @@
+import hashlib
+from datetime import datetime, timedelta, timezone
+
+from bson import json_util
+
+from app.config import settings
+from app.database import repository
+from app.database.database_connection import Collections
+
+
+class IdempotencyKeyInUseError(RuntimeError):
+    """
+    Raised when a request with the same Idempotency-Key is still being processed.
+    """
+
+
+class IdempotencyKeyReusedError(RuntimeError):
+    """
+    Raised when an Idempotency-Key is sent again with a different request.
+    """
+
+
+def fingerprint(request):
+    """
+    Return a hash identifying a request, so a key sent again with another request is detected.
+    Args:
+        request: The request, e.g. the dict of the posted model or the bytes of an import body.
+    Returns:
+        str: The SHA-256 of the request's extended JSON, with the keys sorted.
+    """
+    return hashlib.sha256(json_util.dumps(request, sort_keys=True).encode('utf-8')).hexdigest()
+
+
+async def run_once(scope: str, key: str, request, work, transactional: bool = True):
+    """
+    Run the work of a request once per Idempotency-Key, so a client can retry a request whose
+    response it did not receive without applying it twice.
+    The key is claimed with a pending record before the work runs. The result of the work is stored
+    in the record, in the same transaction as the work when transactions are supported, and is
+    returned again to every later request with the key. If the work fails, the record is removed
+    so the request can be retried. If the work was applied without a transaction but its result
+    could not be stored, the record is marked applied, so a retry is refused with IdempotencyKeyInUseError
+    instead of applying the work twice. A claim still pending IDEMPOTENCY_LEASE seconds after it was
+    made, e.g. because the process running the work died, is taken over by the next retry.
+    The records expire IDEMPOTENCY_TTL seconds after their creation.
+    Args:
+        scope (str): The endpoint the key belongs to, e.g. 'POST /expense'; the same key may be used
+            on different endpoints.
+        key (str): The Idempotency-Key sent by the client. Without one, the work just runs.
+        request: The request, to detect a key that is sent again with a different request.
+        work (callable): An async function taking the session of the unit of work (or None) and
+            returning the result of the request, which must be storable in MongoDB.
+        transactional (bool): Whether the work runs with repository.run_in_transaction; when False it
+            runs without a session and the result is stored after it returns.
+    Returns:
+        The result of the work, or the stored result of the first request with the key.
+    Raises:
+        IdempotencyKeyReusedError: If the key was used with a different request.
+        IdempotencyKeyInUseError: If the first request with the key is still being processed.
+        Exception: Whatever the work raises.
+    """
+    applied = False
+
+    async def work_and_store(session):
+        nonlocal applied
+        result = await work(session)
+        # Without a transaction the work is applied now, even if its result cannot be stored
+        applied = session is None
+        await repository.update(Collections.idempotency_keys, record_id, {'status': 'done', 'response': result},
+                                session=session)
+        return result
+
+    if key is None:
+        return await (repository.run_in_transaction(work) if transactional else work(None))
+
+    record_id = f'{scope}:{key}'
+    request_hash = fingerprint(request)
+    while True:
+        now = datetime.now(timezone.utc)
+        if await repository.add_unique(Collections.idempotency_keys,
+                                       {'id': record_id, 'fingerprint': request_hash, 'status': 'pending',
+                                        'createdAt': now, 'claimedAt': now}):
+            break
+        record = await repository.find_one(Collections.idempotency_keys, {'id': record_id})
+        if record is None:
+            # The record expired or its request failed since the claim, try again
+            continue
+        if record['fingerprint'] != request_hash:
+            raise IdempotencyKeyReusedError("The Idempotency-Key was already used with a different request")
+        if record['status'] == 'done':
+            return record['response']
+        # Take over a claim whose lease expired; the filter lets only one retry win it
+        expired = now - timedelta(seconds=settings.IDEMPOTENCY_LEASE)
+        if record['status'] == 'pending' and await repository.update_one(
+                Collections.idempotency_keys, {'id': record_id, 'status': 'pending', 'claimedAt': {'$lt': expired}},
+                {'claimedAt': now}):
+            break
+        raise IdempotencyKeyInUseError("A request with this Idempotency-Key is still being processed")
+
+    try:
+        if transactional:
+            return await repository.run_in_transaction(work_and_store)
+        return await work_and_store(None)
+    except BaseException:
+        if applied:
+            # The work must not run again, so the claim may not be taken over once its lease expires
+            await repository.update_one(Collections.idempotency_keys, {'id': record_id, 'status': 'pending'},
+                                        {'status': 'applied'})
+        else:
+            await repository.delete_many(Collections.idempotency_keys, {'id': record_id, 'status': 'pending'})
+        raise
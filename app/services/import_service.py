@@ -0,0 +1,242 @@
+import asyncio
+import csv
+import hashlib
+import io
+from collections import defaultdict
+
+from bson import json_util
+from pydantic import ValidationError
+
+from app.cache import chart_cache, user_cache
+from app.config import settings
+from app.database import repository
+from app.database.database_connection import Collections
+from app.log.log import log_decorator
+from app.models.expense import Expense
+from app.models.revenue import Revenue
+from app.services import balance_service, idempotency_service, rollup_service
+
+# Supported import formats.
+FORMATS = ('json', 'ndjson', 'csv')
+
+# The model, collection and counterparty field of every kind of transaction.
+KINDS = {
+    'expense': (Expense, Collections.expenses, 'beneficiary'),
+    'revenue': (Revenue, Collections.revenues, 'benefactor'),
+}
+
+
+def parse_rows(body: bytes, import_format: str):
+    """
+    Split an import body into its rows.
+    The rows have the shape of the export: a 'kind' of 'expense' or 'revenue' and the fields of the
+    transaction, with the beneficiary or benefactor either under its own name or under 'counterparty'.
+    JSON is parsed as MongoDB Extended JSON, so the {"$date": ...} dates of the export are read as dates.
+    Args:
+        body (bytes): The import body: a JSON array, one JSON object per line, or CSV with a header line.
+        import_format (str): 'json', 'ndjson' or 'csv'.
+    Returns:
+        list: (row number, record) pairs, numbered from 1 in the order of the body. The record is a dict,
+            or an error message for a row that could not be parsed.
+    Raises:
+        ValueError: If the format is not supported, the body cannot be parsed, or it has more than
+            IMPORT_MAX_ROWS rows.
+    """
+    if import_format not in FORMATS:
+        raise ValueError(f"Unsupported import format {import_format}, expected one of {list(FORMATS)}")
+    try:
+        text = body.decode('utf-8-sig')
+    except UnicodeDecodeError:
+        raise ValueError("The import must be UTF-8 encoded")
+
+    if import_format == 'json':
+        try:
+            records = json_util.loads(text)
+        except ValueError as e:
+            raise ValueError(f"Invalid JSON: {e}")
+        if not isinstance(records, list):
+            raise ValueError("A JSON import must be an array of transactions")
+    elif import_format == 'ndjson':
+        records = []
+        for line in filter(str.strip, text.splitlines()):
+            try:
+                records.append(json_util.loads(line))
+            except ValueError as e:
+                records.append(f"Invalid JSON: {e}")
+    else:
+        records = list(csv.DictReader(io.StringIO(text)))
+
+    if len(records) > settings.IMPORT_MAX_ROWS:
+        raise ValueError(f"The import has {len(records)} rows, the maximum is {settings.IMPORT_MAX_ROWS}")
+    return [(row, record if isinstance(record, (dict, str)) else "A transaction must be an object")
+            for row, record in enumerate(records, start=1)]
+
+
+def validate_row(record: dict):
+    """
+    Validate one row against the Expense or Revenue model.
+    The row's id is ignored; the imported transactions get newly allocated ids.
+    Args:
+        record (dict): The parsed row.
+    Returns:
+        tuple: The kind of the transaction and the validated Expense or Revenue.
+    Raises:
+        ValueError: If the kind is not supported, a CSV row has more fields than the header,
+            or the transaction is invalid.
+    """
+    if None in record:
+        # csv.DictReader collects the fields beyond the header under the key None
+        raise ValueError("The row has more fields than the header")
+    kind = record.get('kind')
+    if kind not in KINDS:
+        raise ValueError(f"Unsupported kind {kind!r}, expected one of {list(KINDS)}")
+    model, _, counterparty = KINDS[kind]
+    fields = {key: value for key, value in record.items() if key not in ('kind', 'id', '_id', 'counterparty')}
+    if record.get('counterparty') is not None:
+        fields.setdefault(counterparty, record['counterparty'])
+    try:
+        return kind, model(**fields, id=0)
+    except ValidationError as e:
+        raise ValueError('; '.join(f"{'.'.join(map(str, error['loc']))}: {error['msg']}" for error in e.errors()))
+
+
+async def _insert(kind: str, rows: list):
+    """
+    Insert the validated transactions of one kind with a block of newly allocated ids.
+    Args:
+        kind (str): 'expense' or 'revenue'.
+        rows (list): (row number, transaction) pairs.
+    Returns:
+        tuple: The inserted transactions, and the errors of the rows that failed to insert.
+    """
+    if not rows:
+        return [], []
+    _, collection, _ = KINDS[kind]
+    first_id = await repository.allocate_ids(collection, len(rows))
+    for offset, (_, transaction) in enumerate(rows):
+        transaction.id = first_id + offset
+    result = await repository.add_many_unordered(collection, [transaction.dict() for _, transaction in rows])
+    failed = {error['index']: error['message'] for error in result['errors']}
+    inserted = [transaction for index, (_, transaction) in enumerate(rows) if index not in failed]
+    return inserted, [{'row': rows[index][0], 'error': message} for index, message in failed.items()]
+
+
+async def _raise_and_undo(results: list, inserted: dict, balance_changes: list = (), rollups: list = ()):
+    """
+    Raise the first error of a step of an import, after undoing the writes the import already applied,
+    so a failed import leaves nothing behind and can be retried with the same idempotency key.
+    Args:
+        results (list): The results of the step, from asyncio.gather with return_exceptions=True.
+        inserted (dict): The inserted transactions of each kind, deleted again.
+        balance_changes (list): The (user_id, difference) balance changes applied, changed back.
+        rollups (list): The (kind, user_id, date, amount, count) rollup updates applied, subtracted again.
+    Raises:
+        Exception: The first error of the step, if any.
+    """
+    error = next((result for result in results if isinstance(result, BaseException)), None)
+    if error is None:
+        return
+    await asyncio.gather(
+        *(repository.delete_many(KINDS[kind][1], {'id': {'$in': [transaction.id for transaction in transactions]}})
+          for kind, transactions in inserted.items() if transactions),
+        *(balance_service.change_balance(user_id, -difference, kind='import')
+          for user_id, difference in balance_changes),
+        *(rollup_service.record(kind, user_id, date, -amount, -count)
+          for kind, user_id, date, amount, count in rollups),
+    )
+    raise error
+
+
+async def _import(body: bytes, import_format: str):
+    """
+    Import a batch of expenses and revenues; see import_transactions.
+    """
+    records = parse_rows(body, import_format)
+    errors = []
+    valid = {kind: [] for kind in KINDS}
+    for row, record in records:
+        if isinstance(record, str):
+            errors.append({'row': row, 'error': record})
+            continue
+        try:
+            kind, transaction = validate_row(record)
+        except ValueError as e:
+            errors.append({'row': row, 'error': str(e)})
+            continue
+        valid[kind].append((row, transaction))
+
+    # Rows of unknown users are rejected with a single query for all the users
+    user_ids = list({transaction.userId for rows in valid.values() for _, transaction in rows})
+    users = await repository.find(Collections.users, {'id': {'$in': user_ids}}, {'_id': 0, 'id': 1}) \
+        if user_ids else []
+    existing = {user['id'] for user in users}
+    for kind, rows in valid.items():
+        errors += [{'row': row, 'error': "User not found"} for row, transaction in rows
+                   if transaction.userId not in existing]
+        valid[kind] = [(row, transaction) for row, transaction in rows if transaction.userId in existing]
+
+    inserts = await asyncio.gather(*(_insert(kind, rows) for kind, rows in valid.items()), return_exceptions=True)
+    inserted = {kind: result[0] for kind, result in zip(valid, inserts) if not isinstance(result, BaseException)}
+    await _raise_and_undo(inserts, inserted)
+    net = defaultdict(float)
+    rollups = {}
+    for kind, (transactions, insert_errors) in zip(valid, inserts):
+        errors += insert_errors
+        sign = -1 if kind == 'expense' else 1
+        for transaction in transactions:
+            net[transaction.userId] += sign * transaction.amount
+            key = (kind, transaction.userId, rollup_service.month_of(transaction.date))
+            date, amount, count = rollups.get(key, (transaction.date, 0.0, 0))
+            rollups[key] = (date, amount + transaction.amount, count + 1)
+
+    changes = list(net.items())
+    new_balances = await asyncio.gather(*(balance_service.change_balance(user_id, difference, kind='import')
+                                          for user_id, difference in changes), return_exceptions=True)
+    changed = [change for change, balance in zip(changes, new_balances) if not isinstance(balance, BaseException)]
+    await _raise_and_undo(new_balances, inserted, changed)
+    rollups = [(kind, user_id, date, amount, count) for (kind, user_id, _), (date, amount, count) in rollups.items()]
+    recorded = await asyncio.gather(*(rollup_service.record(*rollup) for rollup in rollups), return_exceptions=True)
+    applied = [rollup for rollup, result in zip(rollups, recorded) if not isinstance(result, BaseException)]
+    await _raise_and_undo(recorded, inserted, changed, applied)
+    for user_id in net:
+        chart_cache.invalidate_user(user_id)
+        user_cache.invalidate(user_id)
+
+    return {
+        'rows': len(records),
+        'imported': {kind: len(transactions) for kind, transactions in inserted.items()},
+        'failed': len(errors),
+        'errors': sorted(errors, key=lambda error: error['row']),
+        'balances': {user_id: balance for (user_id, _), balance in zip(changes, new_balances)},
+    }
+
+
+@log_decorator('app.log')
+async def import_transactions(body: bytes, import_format: str, idempotency_key: str = None):
+    """
+    Import a batch of expenses and revenues.
+    All the rows are validated before anything is written. The valid rows of each kind get one
+    block of ids and are written with a single unordered insert_many, so a failed row does not
+    stop the others. Then every affected user's balance gets one $inc of the net amount of their
+    inserted transactions, and their monthly rollups one $inc per month.
+    The import is not one transaction, as the rows that fail must not undo the others, so a client
+    that retries an import whose response it did not receive should send an idempotency key. If a
+    balance or rollup update fails, the writes already applied are undone before the error is raised.
+    Args:
+        body (bytes): The import body: a JSON array, one JSON object per line, or CSV with a header line.
+        import_format (str): 'json', 'ndjson' or 'csv'.
+        idempotency_key (str, optional): The Idempotency-Key of the request. A retried import with
+            the same key returns the result of the first one and imports nothing.
+    Returns:
+        dict: The number of 'rows', the number of 'imported' expenses and revenues, the number of
+            'failed' rows with their {'row', 'error'} under 'errors', and the new 'balances' of the
+            affected users.
+    Raises:
+        ValueError: If the format is not supported, the body cannot be parsed, or it has too many rows.
+        IdempotencyKeyReusedError: If the idempotency key was used with a different import.
+        IdempotencyKeyInUseError: If an import with the same idempotency key is still being processed.
+        RuntimeError: If there is an error writing to the database.
+    """
+    request = {'format': import_format, 'body': hashlib.sha256(body).hexdigest()}
+    return await idempotency_service.run_once('POST /import', idempotency_key, request,
+                                              lambda session: _import(body, import_format), transactional=False)
@@ -0,0 +1,216 @@
+import asyncio
+import logging
+from datetime import datetime, timedelta, timezone
+
+from app.config import settings
+from app.database import repository
+from app.database.database_connection import Collections
+from app.log.log import log_decorator
+from app.metrics import metrics
+
+# The task running the snapshot compactor, started by start_compactor().
+_compactor = None
+
+snapshots_written = metrics.counter('ledger_snapshots', 'Balance snapshots written by the ledger compactor.')
+
+
+def now():
+    """
+    Return the current time as a naive UTC datetime, the way MongoDB returns the stored dates.
+    """
+    return datetime.now(timezone.utc).replace(tzinfo=None)
+
+
+def as_utc(moment: datetime):
+    """
+    Return a datetime as a naive UTC datetime; naive datetimes are taken as UTC.
+    """
+    if moment.tzinfo is not None:
+        moment = moment.astimezone(timezone.utc).replace(tzinfo=None)
+    return moment
+
+
+async def append(user_id: str, amount: float, kind: str, reference=None, session=None):
+    """
+    Append an entry to a user's ledger. Entries are never changed or removed while the user exists;
+    a correction is a new entry.
+    Args:
+        user_id (str): The ID of the user.
+        amount (float): The signed change of the balance.
+        kind (str): What changed the balance: 'opening', 'expense', 'revenue', 'import' or 'adjustment'.
+        reference (optional): The ID of the transaction that changed the balance.
+        session (ClientSession, optional): The session of the unit of work the entry is part of.
+    Raises:
+        RuntimeError: If there is an error adding the entry.
+    """
+    await repository.add(Collections.ledger, {'userId': user_id, 'at': now(), 'amount': amount, 'kind': kind,
+                                              'reference': reference}, session=session)
+
+
+async def _balance_at(user_id: str, at: datetime):
+    """
+    Compute a user's balance at a moment from the last snapshot before it and the ledger entries since.
+    Args:
+        user_id (str): The ID of the user.
+        at (datetime): The moment, as a naive UTC datetime.
+    Returns:
+        dict: The 'balance', the time of the snapshot it started from under 'snapshot_at' (None
+            without one) and the number of ledger entries summed under 'entries'; or None when
+            the user has neither a snapshot nor an entry before the moment.
+    """
+    snapshot = await repository.find_one(Collections.balance_snapshots, {'userId': user_id, 'at': {'$lte': at}},
+                                         {'_id': 0, 'at': 1, 'balance': 1}, sort=[('at', -1)])
+    window = {'$lte': at}
+    if snapshot is not None:
+        window['$gt'] = snapshot['at']
+    tail = await repository.aggregate(Collections.ledger, [
+        {'$match': {'userId': user_id, 'at': window}},
+        {'$group': {'_id': None, 'amount': {'$sum': '$amount'}, 'entries': {'$sum': 1}}},
+    ])
+    amount, entries = (tail[0]['amount'], tail[0]['entries']) if tail else (0, 0)
+    if snapshot is None and not entries:
+        return None
+    return {
+        'balance': (snapshot['balance'] if snapshot is not None else 0) + amount,
+        'snapshot_at': snapshot['at'] if snapshot is not None else None,
+        'entries': entries,
+    }
+
+
+@log_decorator('app.log')
+async def get_balance_at(user_id: str, at: datetime = None):
+    """
+    Return a user's balance at a moment, as recorded by the ledger.
+    Args:
+        user_id (str): The ID of the user.
+        at (datetime, optional): The moment; now when omitted. Naive datetimes are taken as UTC.
+    Returns:
+        dict: The 'userId', the moment under 'at', the 'balance', the time of the snapshot the balance
+            was computed from under 'snapshot_at' and the number of ledger entries read under 'entries'.
+    Raises:
+        ValueError: If the ledger has no entry for the user before the moment.
+        RuntimeError: If there is an error reading the ledger.
+    """
+    at = as_utc(at) if at is not None else now()
+    balance = await _balance_at(user_id, at)
+    if balance is None:
+        raise ValueError(f"No balance is recorded for user {user_id} at {at.isoformat()}")
+    return {'userId': user_id, 'at': at, **balance}
+
+
+async def compact(cutoff: datetime = None):
+    """
+    Write a balance snapshot at a cutoff time for every user with ledger entries since the last snapshots.
+    Each snapshot is computed from the user's previous snapshot and the entries since, so a run
+    reads about one interval of entries. The users are processed LEDGER_SNAPSHOT_BATCH_SIZE at a time,
+    so a run never holds more than a batch of the repository threads.
+    Args:
+        cutoff (datetime, optional): The time of the snapshots; LEDGER_SNAPSHOT_DELAY seconds ago when omitted.
+    Returns:
+        int: The number of snapshots written.
+    Raises:
+        RuntimeError: If there is an error reading the ledger or writing the snapshots.
+    """
+    cutoff = as_utc(cutoff) if cutoff is not None else now() - timedelta(seconds=settings.LEDGER_SNAPSHOT_DELAY)
+    latest = await repository.find_one(Collections.balance_snapshots, {}, {'_id': 0, 'at': 1}, sort=[('at', -1)])
+    window = {'$lte': cutoff}
+    if latest is not None:
+        if latest['at'] >= cutoff:
+            return 0
+        window['$gt'] = latest['at']
+    users = [group['_id'] for group in await repository.aggregate(Collections.ledger, [
+        {'$match': {'at': window}},
+        {'$group': {'_id': '$userId'}},
+    ])]
+    inserted = 0
+    for start in range(0, len(users), settings.LEDGER_SNAPSHOT_BATCH_SIZE):
+        batch = users[start:start + settings.LEDGER_SNAPSHOT_BATCH_SIZE]
+        balances = await asyncio.gather(*(_balance_at(user_id, cutoff) for user_id in batch))
+        result = await repository.add_many_unordered(Collections.balance_snapshots, [
+            {'userId': user_id, 'at': cutoff, 'balance': balance['balance']}
+            for user_id, balance in zip(batch, balances)
+        ])
+        snapshots_written.inc(result['inserted'])
+        inserted += result['inserted']
+    return inserted
+
+
+async def _run_compactor(interval: float):
+    """
+    Run compact() every `interval` seconds until cancelled. A failed run is logged and the next one retries.
+    """
+    while True:
+        await asyncio.sleep(interval)
+        try:
+            await compact()
+        except Exception as e:
+            logging.warning(f"Writing the balance snapshots failed: {e}")
+
+
+def start_compactor():
+    """
+    Startup hook: starts the snapshot compactor on the running event loop, unless
+    LEDGER_SNAPSHOT_INTERVAL is 0 or it is already running.
+    """
+    global _compactor
+    if settings.LEDGER_SNAPSHOT_INTERVAL > 0 and _compactor is None:
+        _compactor = asyncio.get_running_loop().create_task(_run_compactor(settings.LEDGER_SNAPSHOT_INTERVAL))
+
+
+async def stop_compactor():
+    """
+    Shutdown hook: cancels the snapshot compactor and waits for it to stop.
+    """
+    global _compactor
+    compactor, _compactor = _compactor, None
+    if compactor is not None:
+        compactor.cancel()
+        try:
+            await compactor
+        except asyncio.CancelledError:
+            pass
+
+
+async def open_accounts():
+    """
+    Append an 'opening' entry with the current balance of every user whose ledger is empty, e.g. the
+    users created before the ledger existed. Run it while the users are not writing, as a balance
+    change between reading the balance and appending the entry would be counted twice.
+    Returns:
+        int: The number of opened ledgers.
+    Raises:
+        RuntimeError: If there is an error reading the users or writing the ledger.
+    """
+    users, opened = await asyncio.gather(
+        repository.find(Collections.users, {}, {'_id': 0, 'id': 1, 'balance': 1}),
+        repository.aggregate(Collections.ledger, [{'$group': {'_id': '$userId'}}]),
+    )
+    opened = {group['_id'] for group in opened}
+    entries = [{'userId': user['id'], 'at': now(), 'amount': user.get('balance', 0), 'kind': 'opening',
+                'reference': None} for user in users if user['id'] not in opened]
+    return await repository.add_many(Collections.ledger, entries) if entries else 0
+
+
+async def verify(user_id: str = None, tolerance: float = 1e-6):
+    """
+    Compare the users' balances with the sums of their ledgers.
+    Args:
+        user_id (str, optional): The ID of the user to verify; all the users when omitted.
+        tolerance (float): The largest difference between the two that is not a mismatch.
+    Returns:
+        list: The mismatches, each with the 'userId', its 'balance' and the sum of its 'ledger'
+            (None when the ledger is empty).
+    Raises:
+        RuntimeError: If there is an error reading the users or the ledger.
+    """
+    match = {'userId': user_id} if user_id is not None else {}
+    users, sums = await asyncio.gather(
+        repository.find(Collections.users, {'id': user_id} if user_id is not None else {},
+                        {'_id': 0, 'id': 1, 'balance': 1}),
+        repository.aggregate(Collections.ledger, [{'$match': match},
+                                                  {'$group': {'_id': '$userId', 'amount': {'$sum': '$amount'}}}]),
+    )
+    sums = {group['_id']: group['amount'] for group in sums}
+    return [{'userId': user['id'], 'balance': user.get('balance', 0), 'ledger': sums.get(user['id'])}
+            for user in users
+            if user['id'] not in sums or abs(sums[user['id']] - user.get('balance', 0)) > tolerance]
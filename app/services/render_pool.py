@@ -0,0 +1,204 @@
+import asyncio
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from multiprocessing.context import SpawnContext
+
+from app.config import settings
+from app.metrics import metrics
+
+
+class RenderPoolBusyError(RuntimeError):
+    """
+    Raised when RENDER_QUEUE_SIZE charts are already queued or being rendered.
+    """
+
+
+# Process pool rendering the charts, created on first use, and the context that started its workers.
+_pool = None
+_context = None
+
+# Render metrics. They are updated from the pool's result thread, so they are guarded by _lock.
+_lock = threading.Lock()
+_stats = {
+    'submitted': 0,
+    'completed': 0,
+    'failed': 0,
+    'rejected': 0,
+    'timed_out': 0,
+    'recycled': 0,
+    'in_flight': 0,
+    'render_seconds_total': 0.0,
+    'render_seconds_max': 0.0,
+}
+
+
+def _render(kind: str, data: dict, image_format: str):
+    """
+    Render a chart in a worker process.
+    Args:
+        kind (str): The chart to render; chart_renderer.render_<kind> is called.
+        data (dict): The data payload of the chart.
+        image_format (str): The image format, 'png' or 'svg'.
+    Returns:
+        tuple: The rendered image, and the seconds the rendering took.
+    """
+    from app.services import chart_renderer
+    start = time.perf_counter()
+    image = getattr(chart_renderer, f'render_{kind}')(data, image_format)
+    return image, time.perf_counter() - start
+
+
+class _WorkerContext(SpawnContext):
+    """
+    A spawn context that keeps the worker processes it creates, so the workers of a recycled pool
+    can be terminated.
+    """
+
+    def __init__(self):
+        super().__init__()
+        self.processes = []
+
+    def Process(self, *args, **kwargs):
+        process = super().Process(*args, **kwargs)
+        self.processes.append(process)
+        return process
+
+
+def _get_pool():
+    """
+    Returns the render process pool, creating it on first use.
+    The workers are spawned rather than forked, so they do not inherit the threads
+    and open connections of the server process.
+    Returns:
+        ProcessPoolExecutor: A pool of RENDER_POOL_SIZE processes.
+    """
+    global _pool, _context
+    if _pool is None:
+        _context = _WorkerContext()
+        _pool = ProcessPoolExecutor(max_workers=settings.RENDER_POOL_SIZE, mp_context=_context)
+    return _pool
+
+
+def _recycle(pool):
+    """
+    Shuts down a render pool and terminates its workers, so a hung or crashed render does not keep
+    its worker. The jobs still running in the pool fail, which releases their queue slots.
+    The next render creates a new pool.
+    Args:
+        pool (ProcessPoolExecutor): The pool to recycle; nothing is done if it was already replaced.
+    """
+    global _pool, _context
+    with _lock:
+        if _pool is not pool:
+            return
+        processes = list(_context.processes)
+        _pool = _context = None
+        _stats['recycled'] += 1
+    pool.shutdown(wait=False, cancel_futures=True)
+    for process in processes:
+        if process.is_alive():
+            process.terminate()
+
+
+def _on_done(future):
+    """
+    Releases the queue slot of a finished render job and records its outcome.
+    Runs when the job really ends in its worker, even if the request already timed out.
+    """
+    with _lock:
+        _stats['in_flight'] -= 1
+        if future.cancelled():
+            return
+        if future.exception() is not None:
+            _stats['failed'] += 1
+            return
+        _, elapsed = future.result()
+        _stats['completed'] += 1
+        _stats['render_seconds_total'] += elapsed
+        _stats['render_seconds_max'] = max(_stats['render_seconds_max'], elapsed)
+
+
+async def render(kind: str, data: dict, image_format: str = 'png'):
+    """
+    Render a chart on the render process pool without blocking the event loop.
+    Args:
+        kind (str): The chart to render, e.g. 'monthly_summary'.
+        data (dict): The data payload of the chart.
+        image_format (str): The image format, 'png' or 'svg'.
+    Returns:
+        bytes: The rendered image.
+    Raises:
+        RenderPoolBusyError: If the render queue is full.
+        TimeoutError: If the image is not ready within RENDER_TIMEOUT seconds. The pool is then
+            recycled, failing the other jobs it was running.
+        ValueError: If the image format is not supported.
+        RuntimeError: If a render worker crashed.
+    """
+    with _lock:
+        if _stats['in_flight'] >= settings.RENDER_QUEUE_SIZE:
+            _stats['rejected'] += 1
+            raise RenderPoolBusyError("Too many charts are being rendered, please try again later")
+        _stats['in_flight'] += 1
+        _stats['submitted'] += 1
+    pool = _get_pool()
+    try:
+        future = pool.submit(_render, kind, data, image_format)
+    except Exception:
+        with _lock:
+            _stats['in_flight'] -= 1
+        raise
+    future.add_done_callback(_on_done)
+    try:
+        image, _ = await asyncio.wait_for(asyncio.wrap_future(future), settings.RENDER_TIMEOUT)
+        return image
+    except asyncio.TimeoutError:
+        with _lock:
+            _stats['timed_out'] += 1
+        # The job would keep its worker and queue slot until it ends; recycle the pool to free them
+        _recycle(pool)
+        raise TimeoutError(f"Rendering the chart took more than {settings.RENDER_TIMEOUT} seconds")
+    except BrokenProcessPool as e:
+        # A worker died; replace the pool so the next request gets working processes
+        _recycle(pool)
+        raise RuntimeError(f"The chart renderer crashed: {e}")
+
+
+def stats():
+    """
+    Returns the render metrics.
+    Returns:
+        dict: The pool configuration, the current queue depth and in-flight jobs, the job counters
+            and the render times of the completed jobs in seconds.
+    """
+    with _lock:
+        result = dict(_stats)
+    result['pool_size'] = settings.RENDER_POOL_SIZE
+    result['queue_size'] = settings.RENDER_QUEUE_SIZE
+    result['queue_depth'] = max(0, result['in_flight'] - settings.RENDER_POOL_SIZE)
+    result['render_seconds_avg'] = (result['render_seconds_total'] / result['completed']
+                                    if result['completed'] else 0.0)
+    return result
+
+
+render_pool_stats = metrics.gauge('render_pool', 'The render pool metrics returned by render_pool.stats().', ('stat',))
+
+
+@metrics.on_collect
+def _collect_metrics():
+    """
+    Copies the render metrics into the render_pool gauge before the metrics are exposed.
+    """
+    for stat, value in stats().items():
+        render_pool_stats.set(value, stat=stat)
+
+
+def shutdown():
+    """
+    Shuts down the render process pool.
+    """
+    global _pool, _context
+    if _pool is not None:
+        _pool.shutdown(wait=True, cancel_futures=True)
+        _pool = _context = None
@@ -1,25 +1,48 @@
+from app.cache import chart_cache, user_cache
 from app.database import repository
 from app.database.database_connection import Collections
 from app.log.log import log_decorator
 from app.models.revenue import Revenue
-from app.services import balance_service
+from app.services import balance_service, idempotency_service, rollup_service
 
 
 @log_decorator('app.log')
-async def get_revenues(user_id: str):
+async def get_revenues(user_id: str, fields: list = None):
     """
     Retrieve all revenues from the database for a specific user.
     Args:
         user_id (str): The ID of the user whose revenues will be retrieved.
+        fields (list, optional): The fields to return; all of them when omitted.
     Returns:
         list: A list of revenue documents from the database.
     Raises:
         Exception: If there is an error during the retrieval process.
     """
     try:
-        revenues = await repository.get_all(Collections.revenues)
-        filtered_revenues = [revenue for revenue in revenues if revenue.get('userId') == user_id]
-        return filtered_revenues
+        projection = {field: 1 for field in fields} if fields else None
+        return await repository.find(Collections.revenues, {'userId': user_id}, projection)
+    except Exception as e:
+        raise e
+
+
+@log_decorator('app.log')
+async def get_revenues_page(user_id: str, limit: int = None, after: str = None, fields: list = None):
+    """
+    Retrieve one page of a user's revenues, ordered by date and ID.
+    Args:
+        user_id (str): The ID of the user whose revenues are to be retrieved.
+        limit (int, optional): The maximum number of revenues in the page; all of them when omitted.
+        after (str, optional): The next_cursor returned with the previous page.
+        fields (list, optional): The fields to return; 'date' and 'id' are always included.
+    Returns:
+        dict: The revenue documents under 'items' and the cursor of the next page under 'next_cursor'.
+    Raises:
+        ValueError: If the cursor is invalid.
+        Exception: If there is an error during the retrieval process.
+    """
+    try:
+        return await repository.find_page(Collections.revenues, {'userId': user_id}, ['date', 'id'],
+                                          limit=limit, after=after, projection=fields)
     except Exception as e:
         raise e
 
@@ -47,29 +70,52 @@ async def get_revenue_by_id(revenue_id: int, user_id: str):
 
 
 @log_decorator('app.log')
-async def add_revenue(new_revenue: Revenue):
+async def add_revenue(new_revenue: Revenue, idempotency_key: str = None):
     """
     Add a new revenue entry to the database.
+    The revenue is inserted before the user's balance is changed, in one unit of work: in a transaction
+    when the database supports them, otherwise the writes already applied are undone if the balance
+    or the rollups cannot be changed.
     Args:
         new_revenue (Revenue): The revenue object to add.
+        idempotency_key (str, optional): The Idempotency-Key of the request. A retried request with
+            the same key returns the result of the first one and adds nothing.
     Returns:
         dict: The added revenue document.
     Raises:
-        ValueError: If the revenue object is null or the revenue ID already exists.
+        ValueError: If the revenue object is null or the user is not found.
+        IdempotencyKeyReusedError: If the idempotency key was used with a different request.
+        IdempotencyKeyInUseError: If a request with the same idempotency key is still being processed.
         Exception: If there is an error during the addition process.
     """
     if new_revenue is None:
         raise ValueError("Expense object is null")
-    revenues = await repository.get_all(Collections.revenues)
-    if revenues is None:
-        new_revenue.id = 0
-    else:
-        max_item = max(revenues, key=lambda item: item['id'])
-        new_revenue.id = max_item['id'] + 1
+
+    async def work(session):
+        # The id is allocated outside the transaction, so concurrent additions never conflict on the sequence
+        new_revenue.id = await repository.allocate_ids(Collections.revenues)
+        result = await repository.add(Collections.revenues, new_revenue.dict(), session=session)
+        balance_changed = False
+        try:
+            await balance_service.change_balance(new_revenue.userId, new_revenue.amount,
+                                                 kind='revenue', reference=new_revenue.id, session=session)
+            balance_changed = True
+            await rollup_service.record_change('revenue', new_transaction=new_revenue, session=session)
+        except Exception:
+            if session is None:
+                # Without a transaction, undo the writes already applied
+                if balance_changed:
+                    await balance_service.change_balance(new_revenue.userId, new_revenue.amount * -1,
+                                                         kind='revenue', reference=new_revenue.id)
+                await repository.delete(Collections.revenues, new_revenue.id)
+            raise
+        return result
+
     try:
-        print(new_revenue)
-        await balance_service.change_balance(new_revenue.userId, new_revenue.amount)
-        return await repository.add(Collections.revenues, new_revenue.dict())
+        result = await idempotency_service.run_once('POST /revenue', idempotency_key, new_revenue.dict(), work)
+        chart_cache.invalidate_user(new_revenue.userId)
+        user_cache.invalidate(new_revenue.userId)
+        return result
     except ValueError as ve:
         raise ValueError(ve)
     except Exception as e:
@@ -80,6 +126,8 @@ async def add_revenue(new_revenue: Revenue):
 async def update_revenue(revenue_id: int, new_revenue: Revenue):
     """
     Update an existing revenue entry's data.
+    The revenue, the user's balance and the rollups are updated in one unit of work: in a transaction
+    when the database supports them, otherwise the writes already applied are undone if a later one fails.
     Args:
         revenue_id (int): The ID of the revenue entry to update.
         new_revenue (Revenue): The updated revenue object.
@@ -97,11 +145,33 @@ async def update_revenue(revenue_id: int, new_revenue: Revenue):
     print(existing_revenue['amount'])
     existing_revenue = Revenue(**existing_revenue)
     new_revenue.id = existing_revenue.id
+
+    async def work(session):
+        result = await repository.update(Collections.revenues, revenue_id, new_revenue.dict(), session=session)
+        balance_changed = False
+        try:
+            await balance_service.change_balance(new_revenue.userId, new_revenue.amount - existing_revenue.amount,
+                                                 kind='revenue', reference=new_revenue.id, session=session)
+            balance_changed = True
+            await rollup_service.record_change('revenue', existing_revenue, new_revenue, session=session)
+        except Exception:
+            if session is None:
+                # Without a transaction, undo the writes already applied
+                if balance_changed:
+                    await balance_service.change_balance(new_revenue.userId,
+                                                         existing_revenue.amount - new_revenue.amount,
+                                                         kind='revenue', reference=new_revenue.id)
+                await repository.update(Collections.revenues, revenue_id, existing_revenue.dict())
+            raise
+        return result
+
     try:
         print(new_revenue.amount)
         print(existing_revenue.amount)
-        await balance_service.change_balance(new_revenue.userId, new_revenue.amount - existing_revenue.amount)
-        return await repository.update(Collections.revenues, revenue_id, new_revenue.dict())
+        result = await repository.run_in_transaction(work)
+        chart_cache.invalidate_user(new_revenue.userId)
+        user_cache.invalidate(new_revenue.userId)
+        return result
     except ValueError as ve:
         raise ValueError(ve)
     except Exception as e:
@@ -112,6 +182,8 @@ async def update_revenue(revenue_id: int, new_revenue: Revenue):
 async def delete_revenue(revenue_id: int, user_id: str):
     """
     Delete a revenue entry from the database.
+    The revenue, the user's balance and the rollups are updated in one unit of work: in a transaction
+    when the database supports them, otherwise the writes already applied are undone if a later one fails.
     Args:
         revenue_id (int): The ID of the revenue entry to delete.
         user_id (str): The ID of the user who owns the revenue.
@@ -125,9 +197,30 @@ async def delete_revenue(revenue_id: int, user_id: str):
     if existing_revenue is None:
         raise ValueError("Expense not found")
     existing_revenue = Revenue(**existing_revenue)
+
+    async def work(session):
+        result = await repository.delete(Collections.revenues, revenue_id, session=session)
+        balance_changed = False
+        try:
+            await balance_service.change_balance(existing_revenue.userId, existing_revenue.amount * -1,
+                                                 kind='revenue', reference=existing_revenue.id, session=session)
+            balance_changed = True
+            await rollup_service.record_change('revenue', old_transaction=existing_revenue, session=session)
+        except Exception:
+            if session is None:
+                # Without a transaction, undo the writes already applied
+                if balance_changed:
+                    await balance_service.change_balance(existing_revenue.userId, existing_revenue.amount,
+                                                         kind='revenue', reference=existing_revenue.id)
+                await repository.add(Collections.revenues, existing_revenue.dict())
+            raise
+        return result
+
     try:
-        await balance_service.change_balance(existing_revenue.userId, existing_revenue.amount * -1)
-        return await repository.delete(Collections.revenues, revenue_id)
+        result = await repository.run_in_transaction(work)
+        chart_cache.invalidate_user(existing_revenue.userId)
+        user_cache.invalidate(existing_revenue.userId)
+        return result
     except ValueError as ve:
         raise ValueError(ve)
     except Exception as e:
@@ -0,0 +1,182 @@
+import asyncio
+import logging
+from datetime import timezone
+
+from app.database import repository
+from app.database.database_connection import Collections
+
+# The transaction collections rolled up, keyed by the 'kind' stored in the rollups.
+KINDS = {
+    'expense': Collections.expenses,
+    'revenue': Collections.revenues,
+}
+
+
+def month_of(date):
+    """
+    Return the month of a transaction date as 'YYYY-MM', in UTC like MongoDB stores it.
+    Args:
+        date (datetime): The transaction date; naive dates are taken as UTC.
+    Returns:
+        str: The month of the date.
+    """
+    if date.tzinfo is not None:
+        date = date.astimezone(timezone.utc)
+    return date.strftime('%Y-%m')
+
+
+async def record(kind: str, user_id: str, date, amount: float, count: int, session=None):
+    """
+    Add an amount and a transaction count to a user's rollup of one month, creating it if needed.
+    Args:
+        kind (str): 'expense' or 'revenue'.
+        user_id (str): The ID of the user.
+        date (datetime): A date in the month to update.
+        amount (float): The amount to add to the month's total; negative to remove one.
+        count (int): The number of transactions to add to the month's count; negative to remove some.
+        session (ClientSession, optional): The session of the unit of work the update is part of.
+    Raises:
+        RuntimeError: If there is an error updating the rollup.
+    """
+    await repository.increment(Collections.monthly_rollups,
+                               {'userId': user_id, 'month': month_of(date), 'kind': kind},
+                               {'total': amount, 'count': count}, upsert=True, session=session)
+
+
+async def record_change(kind: str, old_transaction=None, new_transaction=None, session=None):
+    """
+    Update the rollups after a transaction was added, updated or deleted.
+    Args:
+        kind (str): 'expense' or 'revenue'.
+        old_transaction (Expense | Revenue, optional): The transaction before the change; None when it was added.
+        new_transaction (Expense | Revenue, optional): The transaction after the change; None when it was deleted.
+        session (ClientSession, optional): The session of the unit of work the change is part of.
+    Raises:
+        RuntimeError: If there is an error updating the rollups.
+    """
+    if old_transaction is not None and new_transaction is not None \
+            and month_of(old_transaction.date) == month_of(new_transaction.date):
+        await record(kind, new_transaction.userId, new_transaction.date,
+                     new_transaction.amount - old_transaction.amount, 0, session=session)
+        return
+    if old_transaction is not None:
+        await record(kind, old_transaction.userId, old_transaction.date, -old_transaction.amount, -1, session=session)
+    if new_transaction is not None:
+        await record(kind, new_transaction.userId, new_transaction.date, new_transaction.amount, 1, session=session)
+
+
+async def get_monthly_totals(user_id: str):
+    """
+    Read a user's monthly totals from the rollups.
+    Args:
+        user_id (str): The ID of the user.
+    Returns:
+        tuple: The total expenses and the total revenues of each month, as dicts keyed by 'YYYY-MM'.
+    Raises:
+        RuntimeError: If there is an error reading the rollups.
+    """
+    rollups = await repository.find(Collections.monthly_rollups, {'userId': user_id, 'count': {'$gt': 0}},
+                                    {'_id': 0, 'month': 1, 'kind': 1, 'total': 1})
+    totals = {kind: {} for kind in KINDS}
+    for rollup in rollups:
+        totals[rollup['kind']][rollup['month']] = float(rollup['total'])
+    return totals['expense'], totals['revenue']
+
+
+async def compute_rollups(user_id: str = None):
+    """
+    Compute the rollups from the raw expenses and revenues.
+    Args:
+        user_id (str, optional): The ID of the user to compute; all the users when omitted.
+    Returns:
+        list: The rollup documents, each with 'userId', 'month', 'kind', 'total' and 'count'.
+    Raises:
+        RuntimeError: If there is an error reading the transactions.
+    """
+    match = {'userId': user_id} if user_id is not None else {}
+    pipeline = [
+        {'$match': match},
+        {'$group': {'_id': {'userId': '$userId', 'month': {'$dateToString': {'format': '%Y-%m', 'date': '$date'}}},
+                    'total': {'$sum': '$amount'}, 'count': {'$sum': 1}}},
+    ]
+    results = await asyncio.gather(*[repository.aggregate(collection, pipeline) for collection in KINDS.values()])
+    return [{'userId': group['_id']['userId'], 'month': group['_id']['month'], 'kind': kind,
+             'total': group['total'], 'count': group['count']}
+            for kind, groups in zip(KINDS, results) for group in groups]
+
+
+async def rebuild(user_id: str = None):
+    """
+    Regenerate the rollups from the raw expenses and revenues.
+    The rollups of the rebuilt users are replaced, so writes made while the rebuild runs may be lost;
+    run it while the users being rebuilt are not writing.
+    Args:
+        user_id (str, optional): The ID of the user to rebuild; all the users when omitted.
+    Returns:
+        int: The number of rollup documents written.
+    Raises:
+        RuntimeError: If there is an error reading the transactions or writing the rollups.
+    """
+    rollups = await compute_rollups(user_id)
+    await repository.delete_many(Collections.monthly_rollups, {'userId': user_id} if user_id is not None else {})
+    return await repository.add_many(Collections.monthly_rollups, rollups, ordered=False)
+
+
+async def backfill():
+    """
+    Compute the rollups when the monthly_rollups collection is empty, e.g. on the first start of a
+    deployment whose transactions were written before the rollups existed. Called at startup when
+    ANALYTICS_BACKEND is 'rollup', so the monthly summary is never read from missing rollups.
+    The rollups are inserted without deleting anything, and the rollups another worker already
+    inserted are skipped, so workers starting together write each rollup once.
+    Returns:
+        int: The number of rollup documents written; 0 when the rollups already exist.
+    Raises:
+        RuntimeError: If there is an error reading the transactions or writing the rollups.
+    """
+    if await repository.find_one(Collections.monthly_rollups, {}, {'_id': 1}) is not None:
+        return 0
+    result = await repository.add_many_unordered(Collections.monthly_rollups, await compute_rollups())
+    if result['inserted']:
+        logging.warning(f"The monthly rollups were empty; backfilled {result['inserted']} rollups")
+    return result['inserted']
+
+
+def _summary(rollup):
+    """
+    Return the total and count of a rollup, or None when there is no rollup.
+    """
+    return {'total': rollup['total'], 'count': rollup['count']} if rollup is not None else None
+
+
+async def verify(user_id: str = None, tolerance: float = 1e-6):
+    """
+    Compare the stored rollups with the rollups computed from the raw expenses and revenues.
+    Args:
+        user_id (str, optional): The ID of the user to verify; all the users when omitted.
+        tolerance (float): The largest difference between two totals that is not a mismatch.
+    Returns:
+        list: The mismatches, each with the 'userId', 'month' and 'kind' of the rollup and
+            its 'expected' and 'stored' total and count (None when the rollup is missing).
+    Raises:
+        RuntimeError: If there is an error reading the transactions or the rollups.
+    """
+    expected = {(rollup['userId'], rollup['month'], rollup['kind']): rollup
+                for rollup in await compute_rollups(user_id)}
+    stored = {(rollup['userId'], rollup['month'], rollup['kind']): rollup
+              for rollup in await repository.find(Collections.monthly_rollups,
+                                                  {'userId': user_id} if user_id is not None else {})
+              if rollup['count'] != 0 or abs(rollup['total']) > tolerance}
+    mismatches = []
+    for key in sorted(set(expected) | set(stored)):
+        expected_rollup, stored_rollup = expected.get(key), stored.get(key)
+        if expected_rollup is not None and stored_rollup is not None \
+                and expected_rollup['count'] == stored_rollup['count'] \
+                and abs(expected_rollup['total'] - stored_rollup['total']) <= tolerance:
+            continue
+        mismatches.append({
+            'userId': key[0], 'month': key[1], 'kind': key[2],
+            'expected': _summary(expected_rollup),
+            'stored': _summary(stored_rollup),
+        })
+    return mismatches
@@ -1,10 +1,9 @@
-import asyncio
-
+from app.cache import chart_cache, user_cache
 from app.database import repository
 from app.database.database_connection import Collections
 from app.log.log import log_decorator
 from app.models.user import User
-from app.services import revenue_service, expense_service
+from app.services import balance_service, ledger_service
 
 
 @log_decorator('app.log')
@@ -22,10 +21,31 @@ async def get_users():
         raise e
 
 
+@log_decorator('app.log')
+async def get_users_page(limit: int = None, after: str = None, fields: list = None):
+    """
+    Retrieve one page of users, ordered by ID.
+    Args:
+        limit (int, optional): The maximum number of users in the page; all of them when omitted.
+        after (str, optional): The next_cursor returned with the previous page.
+        fields (list, optional): The fields to return; 'id' is always included.
+    Returns:
+        dict: The user documents under 'items' and the cursor of the next page under 'next_cursor'.
+    Raises:
+        ValueError: If the cursor is invalid.
+        Exception: If there is an error during the retrieval process.
+    """
+    try:
+        return await repository.find_page(Collections.users, {}, ['id'], limit=limit, after=after,
+                                          projection=fields)
+    except Exception as e:
+        raise e
+
+
 @log_decorator('app.log')
 async def get_user_by_id(user_id: str):
     """
-    Retrieve a user by their ID.
+    Retrieve a user by their ID, from the user cache when it holds them.
     Args:
         user_id (str): The ID of the user to retrieve.
     Returns:
@@ -35,7 +55,7 @@ async def get_user_by_id(user_id: str):
         Exception: If there is an error during the retrieval process.
     """
     try:
-        return await repository.get_by_id(Collections.users, user_id)
+        return await user_cache.get_or_load(user_id, lambda: repository.get_by_id(Collections.users, user_id))
     except Exception as e:
         raise e
 
@@ -44,20 +64,29 @@ async def get_user_by_id(user_id: str):
 async def add_user(new_user: User):
     """
     Add a new user to the database.
+    The user's ledger is opened with their initial balance in the same unit of work.
     Args:
         new_user (User): The user object to add.
     Returns:
         dict: The added user document.
     Raises:
-        ValueError: If the user object is null or the user ID already exists.
+        ValueError: If the user object is null or the user ID or email already exists.
         Exception: If there is an error during the addition process.
     """
     if new_user is None:
         raise ValueError("User object is null")
     if await get_user_by_id(new_user.id) is not None:
         raise ValueError("User ID already exists")
+    if await repository.find_one(Collections.users, {'email': new_user.email}, {'_id': 1}) is not None:
+        raise ValueError("Email already exists")
+
+    async def work(session):
+        result = await repository.add(Collections.users, new_user.dict(), session=session)
+        await ledger_service.append(new_user.id, new_user.balance, 'opening', session=session)
+        return result
+
     try:
-        return await repository.add(Collections.users, new_user.dict())
+        return await repository.run_in_transaction(work)
     except Exception as e:
         raise e
 
@@ -66,6 +95,8 @@ async def add_user(new_user: User):
 async def login(email, password):
     """
     Authenticate a user based on their email and password.
+    The user is found with the unique email index. The whole document is read, with no projection,
+    because it is what the login returns.
     Args:
         email (str): The email address of the user.
         password (str): The password of the user.
@@ -78,8 +109,7 @@ async def login(email, password):
     if email is None or password is None:
         raise ValueError("Please enter all values")
     try:
-        users = await get_users()
-        user = next((u for u in users if u['email'] == email), None)
+        user = await repository.find_one(Collections.users, {'email': email})
         if user is None:
             raise ValueError("User not found")
         if not password == user['password']:
@@ -93,17 +123,44 @@ async def login(email, password):
 async def update_user(user_id: str, updated_data: User):
     """
     Update an existing user's data.
+    A new balance is applied as an adjustment of the current one, appended to the user's ledger,
+    so balance changes made concurrently are kept; the update and the adjustment are one unit of work.
     Args:
         user_id (str): The ID of the user to update.
         updated_data (User): The updated user object.
     Returns:
-        dict: The updated user document.
+        dict: The updated user document, with the balance stored after the adjustment.
     Raises:
         ValueError: If the user object is null or the user is not found.
         Exception: If there is an error during the update process.
     """
+    if updated_data is None:
+        raise ValueError("User object is null")
+
+    async def work(session):
+        existing_user = await repository.get_by_id(Collections.users, user_id, session=session)
+        if existing_user is None:
+            raise ValueError("User not found")
+        data = updated_data.dict()
+        balance = data.pop('balance')
+        difference = balance - existing_user.get('balance', 0)
+        result = await repository.update(Collections.users, user_id, data, session=session)
+        try:
+            if difference:
+                balance = await balance_service.change_balance(user_id, difference, session=session)
+        except Exception:
+            if session is None:
+                # Without a transaction, restore the fields already updated
+                restored = {field: existing_user.get(field) for field in data}
+                await repository.update(Collections.users, user_id, restored)
+            raise
+        return {**result, 'balance': balance}
+
     try:
-        return await repository.update(Collections.users, user_id, updated_data.dict())
+        result = await repository.run_in_transaction(work)
+        chart_cache.invalidate_user(user_id)
+        user_cache.invalidate(user_id)
+        return result
     except Exception as e:
         raise e
 
@@ -111,11 +168,17 @@ async def update_user(user_id: str, updated_data: User):
 @log_decorator('app.log')
 async def delete_user(user_id: str):
     """
-    Delete a user from the database.
+    Delete a user and all of their expenses, revenues, monthly rollups, ledger entries and
+    balance snapshots from the database, as one unit of work.
+    The user's data is removed with one bulk delete per collection rather than one call per document.
+    The user document is deleted first: a transaction added concurrently then fails to change the
+    balance and is undone, and without a transaction a failure part way leaves no user with part
+    of their data.
     Args:
         user_id (str): The ID of the user to delete.
     Returns:
-        dict: The deleted user document.
+        dict: The deleted user document, with the number of deleted expenses and revenues
+            under 'deleted_expenses' and 'deleted_revenues'.
     Raises:
         ValueError: If the user is not found.
         Exception: If there is an error during the deletion process.
@@ -123,24 +186,21 @@ async def delete_user(user_id: str):
     existing_user = await get_user_by_id(user_id)
     if existing_user is None:
         raise ValueError("User not found")
-    try:
-        # Get user's revenues and expenses concurrently
-        revenues_task = revenue_service.get_revenues(user_id)
-        expenses_task = expense_service.get_expenses(user_id)
-
-        # Await both tasks concurrently
-        revenues, expenses = await asyncio.gather(revenues_task, expenses_task)
-
-        # Delete user's revenues and expenses concurrently
-        delete_revenues_task = [revenue_service.delete_revenue(revenue['id'], user_id) for revenue in revenues]
-        delete_expenses_task = [expense_service.delete_expense(expense['id'], user_id) for expense in expenses]
 
-        # Await deletion of revenues and expenses concurrently
-        await asyncio.gather(*delete_revenues_task, *delete_expenses_task)
-
-        # Finally, delete the user
-        deleted_user = await repository.delete(Collections.users, user_id)
-        deleted_user['balance'] = existing_user['balance']
+    async def work(session):
+        deleted_user = await repository.delete(Collections.users, user_id, session=session)
+        deleted = {}
+        for collection in (Collections.revenues, Collections.expenses, Collections.monthly_rollups,
+                           Collections.ledger, Collections.balance_snapshots):
+            deleted[collection] = await repository.delete_many(collection, {'userId': user_id}, session=session)
+        deleted_user['deleted_expenses'] = deleted[Collections.expenses]
+        deleted_user['deleted_revenues'] = deleted[Collections.revenues]
         return deleted_user
+
+    try:
+        return await repository.run_in_transaction(work)
     except (ValueError, RuntimeError, Exception) as e:
         raise e
+    finally:
+        chart_cache.invalidate_user(user_id)
+        user_cache.invalidate(user_id)
@@ -1,181 +1,167 @@
-import matplotlib.pyplot as plt
-import pandas as pd
-from app.services import expense_service, revenue_service, user_service
+import asyncio
 
+from app.cache import chart_cache
+from app.services.balance_series import compute_balance_series
+from app.services import analytics_service, chart_renderer, expense_service, render_pool, revenue_service, \
+    user_service
 
-async def expense_and_revenue_by_date(user_id: str):
+
+async def expense_and_revenue_by_date(user_id: str, image_format: str = 'png'):
     """
     Generate a graph showing expenses and revenues over time for a specific user.
 
     Args:
         user_id (str): The ID of the user.
+        image_format (str): The image format, 'png' or 'svg'.
 
     Raises:
+        ValueError: If the image format is not supported.
         Exception: If there is an error during the process.
 
     Returns:
-        None
+        bytes: The rendered image.
     """
     try:
-        expenses = await expense_service.get_expenses(user_id)
-        revenues = await revenue_service.get_revenues(user_id)
-
-        # Sorting expenses and revenues by date
-        expenses = sorted(expenses, key=lambda expense: expense['date'])
-        revenues = sorted(revenues, key=lambda revenue: revenue['date'])
-
-        # Extracting dates and amounts
-        expense_dates = [expense['date'] for expense in expenses]
-        expense_amounts = [expense['amount'] for expense in expenses]
-        revenue_dates = [revenue['date'] for revenue in revenues]
-        revenue_amounts = [revenue['amount'] for revenue in revenues]
-
-        plt.figure(figsize=(10, 6))
-        plt.plot(expense_dates, expense_amounts, 'o-', label='Expenses')
-        plt.plot(revenue_dates, revenue_amounts, 'o-', label='Revenues')
-        plt.xlabel('Date')
-        plt.ylabel('Amount')
-        plt.title(f'Revenues & Expenses for User ID = {user_id}')
-        plt.legend()
-        plt.grid(True)
-        plt.xticks(rotation=45)
-        plt.show()
+        chart_renderer.check_format(image_format)
+
+        async def render():
+            expenses = await expense_service.get_expenses(user_id)
+            revenues = await revenue_service.get_revenues(user_id)
+
+            # Sorting expenses and revenues by date
+            expenses = sorted(expenses, key=lambda expense: expense['date'])
+            revenues = sorted(revenues, key=lambda revenue: revenue['date'])
+
+            # Extracting dates and amounts
+            data = {
+                'user_id': user_id,
+                'expense_dates': [expense['date'] for expense in expenses],
+                'expense_amounts': [expense['amount'] for expense in expenses],
+                'revenue_dates': [revenue['date'] for revenue in revenues],
+                'revenue_amounts': [revenue['amount'] for revenue in revenues]
+            }
+            return await render_pool.render('expense_and_revenue_by_date', data, image_format)
+
+        return await chart_cache.get_or_compute(user_id, 'expense_and_revenue_by_date', (image_format,), render)
 
     except Exception as e:
         raise e
 
 
-async def balance_over_time(user_id: str):
+async def balance_series(user_id: str, frequency: str = None):
+    """
+    Compute the balance of a specific user after each of their transactions.
+    Args:
+        user_id (str): The ID of the user.
+        frequency (str, optional): 'daily', 'weekly' or 'monthly' to get the balance at the end of
+            each period instead of after each transaction date.
+    Raises:
+        ValueError: If the user is not found or the frequency is not supported.
+        Exception: If there is an error during the process.
+    Returns:
+        dict: The 'opening_balance', and the 'dates' and matching 'balances' of the series.
+    """
+    try:
+        async def compute():
+            user = await user_service.get_user_by_id(user_id)
+            if not user:
+                raise ValueError("User not found")
+
+            expenses, revenues = await asyncio.gather(
+                expense_service.get_expenses(user_id, ['date', 'amount']),
+                revenue_service.get_revenues(user_id, ['date', 'amount'])
+            )
+            return compute_balance_series(user['balance'], expenses, revenues, frequency)
+
+        return await chart_cache.get_or_compute(user_id, 'balance_series', (frequency,), compute)
+
+    except Exception as e:
+        raise e
+
+
+async def balance_over_time(user_id: str, image_format: str = 'png', frequency: str = None):
     """
     Generate a graph showing the balance over time for a specific user.
     Args:
         user_id (str): The ID of the user.
+        image_format (str): The image format, 'png' or 'svg'.
+        frequency (str, optional): 'daily', 'weekly' or 'monthly' to plot the balance at the end of
+            each period instead of after each transaction date.
     Raises:
+        ValueError: If the user is not found, or the image format or frequency is not supported.
         Exception: If there is an error during the process.
     Returns:
-        None
+        bytes: The rendered image.
     """
     try:
-        user = await user_service.get_user_by_id(user_id)
-        if not user:
-            raise ValueError("User not found")
-
-        expenses = await expense_service.get_expenses(user_id)
-        revenues = await revenue_service.get_revenues(user_id)
-
-        # Getting all unique dates from expenses and revenues
-        dates = sorted(list(set([expense['date'] for expense in expenses] + [revenue['date'] for revenue in revenues])))
-
-        # Initial balance
-        balance = user['balance']
-        balances = [0.0]
-
-        # Calculating balance over time
-        for date in dates:
-            for expense in expenses:
-                if expense['date'] == date:
-                    balance -= expense['amount']
-            for revenue in revenues:
-                if revenue['date'] == date:
-                    balance += revenue['amount']
-            balances.append(balance)
-        dates.insert(0, dates[0])
-        plt.figure(figsize=(10, 6))
-        plt.plot(dates, balances, 'o-', label='Balance')
-        plt.xlabel('Date')
-        plt.ylabel('Balance')
-        plt.title(f'Balance Over Time for User ID = {user_id}')
-        plt.legend()
-        plt.grid(True)
-        plt.xticks(rotation=45)
-        plt.show()
+        chart_renderer.check_format(image_format)
+
+        async def render():
+            series = await balance_series(user_id, frequency)
+
+            # The line starts from the opening balance, before the first transaction
+            dates = series['dates'][:1] + series['dates']
+            balances = [series['opening_balance']] + series['balances'] if dates else []
+            return await render_pool.render('balance_over_time',
+                                            {'user_id': user_id, 'dates': dates, 'balances': balances}, image_format)
+
+        return await chart_cache.get_or_compute(user_id, 'balance_over_time', (image_format, frequency), render)
 
     except Exception as e:
         raise e
 
 
-async def expense_distribution_by_category(user_id: str):
+async def expense_distribution_by_category(user_id: str, image_format: str = 'png'):
     """
     Generate a pie chart showing the distribution of expenses by category for a specific user.
 
     Args:
         user_id (str): The ID of the user.
+        image_format (str): The image format, 'png' or 'svg'.
 
     Raises:
+        ValueError: If the image format is not supported.
         Exception: If there is an error during the process.
 
     Returns:
-        None
+        bytes: The rendered image.
     """
     try:
-        expenses = await expense_service.get_expenses(user_id)
-
-        # Aggregating expenses by category
-        categories = {}
-        for expense in expenses:
-            category = expense['beneficiary']
-            amount = expense['amount']
-            if category in categories:
-                categories[category] += amount
-            else:
-                categories[category] = amount
-
-        labels = categories.keys()
-        sizes = categories.values()
-
-        plt.figure(figsize=(8, 8))
-        plt.pie(sizes, labels=labels, autopct='%1.1f%%', startangle=140)
-        plt.title(f'Expense Distribution by Category for User ID = {user_id}')
-        plt.axis('equal')
-        plt.show()
+        chart_renderer.check_format(image_format)
+
+        async def render():
+            categories = await chart_cache.get_or_compute(user_id, 'category_totals', (),
+                                                          lambda: analytics_service.category_totals(user_id))
+            return await render_pool.render('expense_distribution_by_category',
+                                            {'user_id': user_id, 'categories': categories}, image_format)
+
+        return await chart_cache.get_or_compute(user_id, 'expense_distribution_by_category', (image_format,), render)
 
     except Exception as e:
         raise e
 
 
-async def monthly_summary(user_id: str):
+async def monthly_summary(user_id: str, image_format: str = 'png'):
     """
     Generate a bar chart showing the monthly summary of revenues and expenses for a specific user.
     Args:
         user_id (str): The ID of the user.
+        image_format (str): The image format, 'png' or 'svg'.
     Raises:
+        ValueError: If the image format is not supported.
         Exception: If there is an error during the process.
     Returns:
-        None
+        bytes: The rendered image.
     """
     try:
-        expenses = await expense_service.get_expenses(user_id)
-        revenues = await revenue_service.get_revenues(user_id)
-
-        # Converting dates to pandas datetime
-        expense_df = pd.DataFrame(expenses)
-        revenue_df = pd.DataFrame(revenues)
-        expense_df['date'] = pd.to_datetime(expense_df['date'])
-        revenue_df['date'] = pd.to_datetime(revenue_df['date'])
-
-        # Extracting month from dates
-        expense_df['month'] = expense_df['date'].dt.to_period('M')
-        revenue_df['month'] = revenue_df['date'].dt.to_period('M')
-
-        # Grouping by month and summing amounts
-        monthly_expenses = expense_df.groupby('month')['amount'].sum()
-        monthly_revenues = revenue_df.groupby('month')['amount'].sum()
-
-        # Creating a dataframe with expenses and revenues
-        df = pd.DataFrame({
-            'Expenses': monthly_expenses,
-            'Revenues': monthly_revenues
-        }).fillna(0)
-
-        # Plotting the bar chart
-        df.plot(kind='bar', figsize=(10, 6))
-        plt.title(f'Monthly Summary for User ID = {user_id}')
-        plt.xlabel('Month')
-        plt.ylabel('Amount')
-        plt.xticks(rotation=45)
-        plt.grid(True)
-        plt.legend()
-        plt.show()
+        chart_renderer.check_format(image_format)
+
+        async def render():
+            totals = await chart_cache.get_or_compute(user_id, 'monthly_totals', (),
+                                                      lambda: analytics_service.monthly_totals(user_id))
+            return await render_pool.render('monthly_summary', {'user_id': user_id, **totals}, image_format)
+
+        return await chart_cache.get_or_compute(user_id, 'monthly_summary', (image_format,), render)
 
     except Exception as e:
         raise e
@@ -0,0 +1,108 @@
+import asyncio
+import unittest
+from datetime import datetime
+
+import mongomock
+import pytest
+
+from app.database import database_connection, repository
+from app.models.expense import Expense
+from app.models.revenue import Revenue
+from app.services import analytics_service, expense_service, revenue_service, rollup_service
+
+
+@pytest.mark.asyncio
+class TestAnalytics(unittest.TestCase):
+    """
+    A test suite for the aggregates behind the monthly summary and expense distribution charts.
+    Each test checks that the rollups, the MongoDB aggregation pipeline and the pandas fallback return
+    the same results. The tests run on a mongomock database, seeded through the services so the
+    rollups are maintained like in production.
+    """
+
+    user_id = "325962801"
+
+    def setUp(self):
+        self.db = mongomock.MongoClient().db
+        database_connection.use_database(self.db)
+        asyncio.run(repository.create_indexes())
+        self.db.users.insert_many([{'id': self.user_id, 'email': 'a@example.com', 'balance': 1000.0},
+                                   {'id': '325962802', 'email': 'b@example.com', 'balance': 1000.0}])
+        for user_id, amount, date, beneficiary in [
+            (self.user_id, 120.5, datetime(2024, 1, 5), 'grocery'),
+            (self.user_id, 30, datetime(2024, 1, 31, 23, 59), 'rent'),
+            (self.user_id, 200, datetime(2024, 3, 1), 'grocery'),
+            ('325962802', 999, datetime(2024, 1, 10), 'grocery'),
+        ]:
+            asyncio.run(expense_service.add_expense(Expense(id=0, userId=user_id, amount=amount, date=date,
+                                                            beneficiary=beneficiary, documentation='')))
+        for amount, date in [(500, datetime(2024, 1, 1)), (450.25, datetime(2024, 2, 15))]:
+            asyncio.run(revenue_service.add_revenue(Revenue(id=0, userId=self.user_id, amount=amount, date=date,
+                                                            benefactor='work', documentation='')))
+        # An update that moves an expense to another month, and a deletion, maintain the rollups too
+        moved = self.db.expenses.find_one({'userId': self.user_id, 'beneficiary': 'rent'})
+        asyncio.run(expense_service.update_expense(moved['id'], Expense(
+            id=moved['id'], userId=self.user_id, amount=35, date=datetime(2024, 2, 1),
+            beneficiary='rent', documentation='')))
+        deleted = self.db.expenses.find_one({'userId': '325962802'})
+        asyncio.run(expense_service.delete_expense(deleted['id'], '325962802'))
+
+    def tearDown(self):
+        database_connection.use_database(None)
+
+    def test_monthly_totals_backends_match(self):
+        """
+        Test that the monthly totals are the same with every backend.
+
+        Expected behavior:
+            - All the backends return the same months, and the same expense and revenue totals for each month.
+            - The totals only include the user's own transactions.
+        """
+        results = {backend: asyncio.run(analytics_service.monthly_totals(self.user_id, backend))
+                   for backend in analytics_service.BACKENDS}
+        expected = {'months': ['2024-01', '2024-02', '2024-03'],
+                    'expenses': [120.5, 35.0, 200.0],
+                    'revenues': [500.0, 450.25, 0.0]}
+        for backend, result in results.items():
+            assert result['months'] == expected['months'], backend
+            assert result['expenses'] == pytest.approx(expected['expenses']), backend
+            assert result['revenues'] == pytest.approx(expected['revenues']), backend
+
+    def test_category_totals_backends_match(self):
+        """
+        Test that the expense totals per category are the same with every backend.
+
+        Expected behavior:
+            - All the backends return the same categories, in the same order, with the same totals.
+        """
+        results = {backend: asyncio.run(analytics_service.category_totals(self.user_id, backend))
+                   for backend in analytics_service.BACKENDS}
+        for backend, result in results.items():
+            assert list(result) == ['grocery', 'rent'], backend
+            assert result == pytest.approx({'grocery': 320.5, 'rent': 35.0}), backend
+
+    def test_backfill(self):
+        """
+        Test that the rollups of transactions written before the rollups existed are backfilled once.
+
+        Expected behavior:
+            - With the rollups removed, backfill writes them again and the rollup backend matches the mongo one.
+            - A second backfill writes nothing.
+        """
+        expected = asyncio.run(analytics_service.monthly_totals(self.user_id, 'mongo'))
+        self.db.monthly_rollups.delete_many({})
+        self.assertGreater(asyncio.run(rollup_service.backfill()), 0)
+        self.assertEqual(asyncio.run(rollup_service.backfill()), 0)
+        result = asyncio.run(analytics_service.monthly_totals(self.user_id, 'rollup'))
+        assert result['months'] == expected['months']
+        assert result['expenses'] == pytest.approx(expected['expenses'])
+
+    def test_unsupported_backend(self):
+        """
+        Test that an unsupported backend is rejected.
+
+        Expected behavior:
+            - A ValueError is raised.
+        """
+        with self.assertRaises(ValueError):
+            asyncio.run(analytics_service.monthly_totals(self.user_id, "spark"))
@@ -0,0 +1,87 @@
+import unittest
+from datetime import datetime
+
+from app.services.balance_series import compute_balance_series
+
+
+class TestBalanceSeries(unittest.TestCase):
+    """
+    A test suite for the balance series engine used by the balance charts and the /vis/balance-series endpoint.
+    Each test checks one property of the series computed from a fixed set of transactions.
+    """
+
+    expenses = [
+        {"date": datetime(2024, 1, 10), "amount": 30},
+        {"date": datetime(2024, 1, 3), "amount": 20},
+        {"date": datetime(2024, 2, 5), "amount": 50},
+    ]
+    revenues = [
+        {"date": datetime(2024, 1, 3), "amount": 100},
+        {"date": datetime(2024, 3, 1), "amount": 40},
+    ]
+
+    def test_anchored_on_current_balance(self):
+        """
+        Test that the series ends at the current balance and starts from the opening balance.
+
+        Expected behavior:
+            - The opening balance is the current balance minus the net of all the transactions.
+            - The balance after the last transaction is the current balance.
+        """
+        series = compute_balance_series(140, self.expenses, self.revenues)
+        assert series["opening_balance"] == 100
+        assert series["balances"][-1] == 140
+
+    def test_one_point_per_date_in_order(self):
+        """
+        Test that transactions on the same date are merged into one point and the points are sorted.
+
+        Expected behavior:
+            - The series has one point per distinct date, in date order, with the running balance.
+        """
+        series = compute_balance_series(140, self.expenses, self.revenues)
+        assert series["dates"] == [datetime(2024, 1, 3), datetime(2024, 1, 10), datetime(2024, 2, 5),
+                                   datetime(2024, 3, 1)]
+        assert series["balances"] == [180, 150, 100, 140]
+
+    def test_monthly_resampling(self):
+        """
+        Test resampling the series to the balance at the end of each month.
+
+        Expected behavior:
+            - The series has one point per month, holding the last balance of that month.
+        """
+        series = compute_balance_series(140, self.expenses, self.revenues, "monthly")
+        assert series["dates"] == [datetime(2024, 1, 31), datetime(2024, 2, 29), datetime(2024, 3, 31)]
+        assert series["balances"] == [150, 100, 140]
+
+    def test_resampling_carries_balance_over_empty_periods(self):
+        """
+        Test that periods without transactions keep the balance of the previous period.
+
+        Expected behavior:
+            - A day without transactions has the balance of the day before it.
+        """
+        series = compute_balance_series(140, self.expenses, self.revenues, "daily")
+        assert series["dates"][1] == datetime(2024, 1, 4)
+        assert series["balances"][1] == 180
+
+    def test_no_transactions(self):
+        """
+        Test the series of a user without transactions.
+
+        Expected behavior:
+            - The series is empty and the opening balance is the current balance.
+        """
+        series = compute_balance_series(75, [], [])
+        assert series == {"opening_balance": 75, "dates": [], "balances": []}
+
+    def test_unsupported_frequency(self):
+        """
+        Test that an unsupported frequency is rejected.
+
+        Expected behavior:
+            - A ValueError is raised.
+        """
+        with self.assertRaises(ValueError):
+            compute_balance_series(140, self.expenses, self.revenues, "hourly")
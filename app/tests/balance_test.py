@@ -0,0 +1,57 @@
+import asyncio
+import unittest
+
+import mongomock
+
+from app.database import database_connection, repository
+from app.services import balance_service
+
+
+class TestBalance(unittest.TestCase):
+    """
+    A test suite for the atomic balance changes of the users.
+    The tests run on a mongomock database.
+    """
+
+    def setUp(self):
+        self.db = mongomock.MongoClient().db
+        database_connection.use_database(self.db)
+        asyncio.run(repository.create_indexes())
+        self.db.users.insert_one({'id': '325962801', 'email': 'a@example.com', 'balance': 100.0})
+
+    def tearDown(self):
+        database_connection.use_database(None)
+
+    def test_change_balance(self):
+        """
+        Test that a balance change returns the new balance.
+
+        Expected behavior:
+            - The returned value is the stored balance after the change.
+            - Changing the balance of an unknown user raises a ValueError.
+        """
+        self.assertEqual(asyncio.run(balance_service.change_balance('325962801', -30.0)), 70.0)
+        self.assertEqual(self.db.users.find_one({'id': '325962801'})['balance'], 70.0)
+        with self.assertRaises(ValueError):
+            asyncio.run(balance_service.change_balance('999999999', 10.0))
+
+    def test_concurrent_changes_are_kept(self):
+        """
+        Test that concurrent balance changes never overwrite each other.
+
+        Expected behavior:
+            - The balance after concurrent changes is the sum of all of them.
+        """
+        differences = [5.0, -2.0, 10.0, -7.0, 1.0, 3.0, -4.0, 8.0] * 4
+
+        async def change():
+            return await asyncio.gather(*(balance_service.change_balance('325962801', difference)
+                                          for difference in differences))
+
+        asyncio.run(change())
+        self.assertEqual(self.db.users.find_one({'id': '325962801'})['balance'], 100.0 + sum(differences))
+        self.assertEqual(self.db.ledger.count_documents({'userId': '325962801'}), len(differences))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,57 @@
+from datetime import datetime
+
+import pytest
+
+from app.services import chart_renderer
+
+DATES = [datetime(2024, 1, 1), datetime(2024, 2, 1)]
+
+# The data payload of each chart, like visualization_service builds it.
+CHARTS = {
+    'expense_and_revenue_by_date': {'user_id': '325962801', 'expense_dates': DATES, 'expense_amounts': [10, 20],
+                                    'revenue_dates': DATES, 'revenue_amounts': [100, 50]},
+    'balance_over_time': {'user_id': '325962801', 'dates': DATES, 'balances': [90, 120]},
+    'expense_distribution_by_category': {'user_id': '325962801', 'categories': {'grocery': 30, 'rent': 70}},
+    'monthly_summary': {'user_id': '325962801', 'months': ['2024-01', '2024-02'], 'expenses': [10, 20],
+                        'revenues': [100, 50]},
+}
+
+
+@pytest.mark.parametrize('image_format', list(chart_renderer.MEDIA_TYPES))
+@pytest.mark.parametrize('kind', list(CHARTS))
+def test_render(kind, image_format):
+    """
+    Test that every chart renders in every supported image format.
+
+    Expected behavior:
+        - A PNG image starts with the PNG signature.
+        - An SVG image is an XML document with an svg element.
+    """
+    image = getattr(chart_renderer, f'render_{kind}')(CHARTS[kind], image_format)
+    if image_format == 'png':
+        assert image.startswith(b'\x89PNG')
+    else:
+        assert image.lstrip().startswith((b'<?xml', b'<svg'))
+        assert b'<svg' in image
+
+
+def test_every_chart_is_tested():
+    """
+    Test that CHARTS has a payload for every render function.
+
+    Expected behavior:
+        - The charts of CHARTS are the render_<kind> functions of chart_renderer.
+    """
+    kinds = {name[len('render_'):] for name in dir(chart_renderer) if name.startswith('render_')}
+    assert kinds == set(CHARTS)
+
+
+def test_unsupported_format():
+    """
+    Test that an unsupported image format is rejected.
+
+    Expected behavior:
+        - A ValueError is raised.
+    """
+    with pytest.raises(ValueError):
+        chart_renderer.render_balance_over_time(CHARTS['balance_over_time'], 'gif')
@@ -0,0 +1,75 @@
+import asyncio
+import unittest
+
+import mongomock
+
+from app.database import database_connection, repository
+from app.database.database_connection import Collections
+
+
+class TestCounters(unittest.TestCase):
+    """
+    A test suite for the id sequences of the expenses and revenues.
+    The tests run on a mongomock database.
+    """
+
+    def setUp(self):
+        self.db = mongomock.MongoClient().db
+        database_connection.use_database(self.db)
+
+    def tearDown(self):
+        database_connection.use_database(None)
+
+    def test_allocate_block(self):
+        """
+        Test that a block of ids is reserved from the sequence of its collection.
+
+        Expected behavior:
+            - The first allocation starts at 1, and the sequence is advanced by the size of the block.
+            - The sequences of the collections are independent.
+            - A count that is not positive is rejected.
+        """
+        self.assertEqual(asyncio.run(repository.allocate_ids(Collections.expenses, 5)), 1)
+        self.assertEqual(self.db.counters.find_one({'_id': 'expenses'})['seq'], 5)
+        self.assertEqual(asyncio.run(repository.allocate_ids(Collections.revenues)), 1)
+        self.assertEqual(asyncio.run(repository.allocate_ids(Collections.expenses)), 6)
+        with self.assertRaises(ValueError):
+            asyncio.run(repository.allocate_ids(Collections.expenses, 0))
+
+    def test_allocations_never_overlap(self):
+        """
+        Test that concurrent allocations get disjoint blocks.
+
+        Expected behavior:
+            - The blocks of concurrent allocations of several sizes cover consecutive ids once each.
+        """
+        counts = [3, 1, 4, 1, 5, 9, 2, 6]
+
+        async def allocate():
+            return await asyncio.gather(*(repository.allocate_ids(Collections.expenses, count) for count in counts))
+
+        firsts = asyncio.run(allocate())
+        ids = [id_ for first, count in zip(firsts, counts) for id_ in range(first, first + count)]
+        self.assertEqual(sorted(ids), list(range(1, sum(counts) + 1)))
+
+    def test_sync_counters(self):
+        """
+        Test that the sequences are moved past the ids already stored, and never moved back.
+
+        Expected behavior:
+            - A sequence behind the largest stored id is raised to it, so the next id follows it.
+            - A collection without documents gets no sequence.
+            - A sequence ahead of the stored ids is kept.
+        """
+        self.db.expenses.insert_many([{'id': 7}, {'id': 42}, {'id': 3}])
+        self.db.counters.insert_one({'_id': 'expenses', 'seq': 10})
+        asyncio.run(repository.sync_counters())
+        self.assertEqual(asyncio.run(repository.allocate_ids(Collections.expenses)), 43)
+        self.assertIsNone(self.db.counters.find_one({'_id': 'revenues'}))
+        self.db.counters.update_one({'_id': 'expenses'}, {'$set': {'seq': 100}})
+        asyncio.run(repository.sync_counters())
+        self.assertEqual(self.db.counters.find_one({'_id': 'expenses'})['seq'], 100)
+
+
+if __name__ == '__main__':
+    unittest.main()
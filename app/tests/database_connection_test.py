@@ -0,0 +1,53 @@
+import unittest
+from unittest import mock
+
+from app.config import settings
+from app.database import database_connection
+
+
+class TestDatabaseConnection(unittest.TestCase):
+    """
+    A test suite for the lazily created, configurable database client.
+    None of the tests needs a running database.
+    """
+
+    def test_client_options_follow_settings(self):
+        """
+        Test that the client is configured from the DB_* settings.
+
+        Expected behavior:
+            - The pool size, timeouts and read preference come from the settings.
+            - Compressors are only requested when DB_COMPRESSORS is set.
+        """
+        with mock.patch.multiple(settings, DB_MAX_POOL_SIZE=32, DB_SERVER_SELECTION_TIMEOUT_MS=1500,
+                                 DB_READ_PREFERENCE='secondaryPreferred', DB_COMPRESSORS=''):
+            options = database_connection.client_options()
+            self.assertEqual(options['maxPoolSize'], 32)
+            self.assertEqual(options['serverSelectionTimeoutMS'], 1500)
+            self.assertEqual(options['readPreference'], 'secondaryPreferred')
+            self.assertNotIn('compressors', options)
+        with mock.patch.object(settings, 'DB_COMPRESSORS', 'zlib'):
+            self.assertEqual(database_connection.client_options()['compressors'], 'zlib')
+
+    def test_use_database_replaces_configured_database(self):
+        """
+        Test that a replacement database is used without creating a client.
+
+        Expected behavior:
+            - get_database() returns the replacement and no client is created.
+            - The health report pings the replacement database.
+        """
+        database = mock.MagicMock()
+        database_connection.use_database(database)
+        try:
+            with mock.patch.object(database_connection, 'MongoClient') as client_class:
+                self.assertIs(database_connection.get_database(), database)
+                self.assertEqual(database_connection.health()['status'], 'ok')
+                client_class.assert_not_called()
+            database.command.assert_called_once_with('ping')
+        finally:
+            database_connection.use_database(None)
+
+
+if __name__ == '__main__':
+    unittest.main()
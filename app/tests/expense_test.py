@@ -1,4 +1,5 @@
 import asyncio
+import json
 import unittest
 from datetime import datetime
 
@@ -40,7 +41,7 @@ class TestHH(unittest.TestCase):
             "beneficiary": "string",
             "documentation": "string"
         }
-        result = asyncio.run(expense_controller.get_expense_by_id(16, "325962801"))
+        result = json.loads(asyncio.run(expense_controller.get_expense_by_id(16, "325962801")).body)
         assert result == expected_response
 
     def test_add_expense(self):
@@ -109,5 +110,5 @@ class TestHH(unittest.TestCase):
             "beneficiary": "mali b",
             "documentation": "payment on the work"
         }
-        result = asyncio.run(expense_controller.delete_expense(17, "325962801"))
+        result = json.loads(asyncio.run(expense_controller.delete_expense(17, "325962801")).body)
         assert result == expected_response
@@ -0,0 +1,112 @@
+import asyncio
+import csv
+import io
+import json
+import unittest
+from datetime import datetime
+from unittest import mock
+
+import mongomock
+
+from app.config import settings
+from app.database import database_connection, repository
+from app.services import export_service
+
+
+async def collect(chunks):
+    return [chunk async for chunk in chunks]
+
+
+class TestExport(unittest.TestCase):
+    """
+    A test suite for the streamed export of a user's transaction history.
+    The tests run on a mongomock database.
+    """
+
+    user_id = '325962801'
+
+    def setUp(self):
+        self.db = mongomock.MongoClient().db
+        database_connection.use_database(self.db)
+        self.db.expenses.insert_many([
+            {'id': 1, 'userId': self.user_id, 'amount': 10, 'date': datetime(2024, 1, 3),
+             'beneficiary': 'shop', 'documentation': ''},
+            {'id': 2, 'userId': self.user_id, 'amount': 20, 'date': datetime(2024, 1, 1),
+             'beneficiary': 'rent', 'documentation': 'january'},
+            {'id': 3, 'userId': self.user_id, 'amount': 30, 'date': datetime(2024, 1, 6),
+             'beneficiary': 'shop', 'documentation': ''},
+            {'id': 4, 'userId': '325962802', 'amount': 40, 'date': datetime(2024, 1, 2),
+             'beneficiary': 'shop', 'documentation': ''},
+        ])
+        self.db.revenues.insert_many([
+            {'id': 1, 'userId': self.user_id, 'amount': 500, 'date': datetime(2024, 1, 2),
+             'benefactor': 'work', 'documentation': ''},
+            {'id': 2, 'userId': self.user_id, 'amount': 50, 'date': datetime(2024, 1, 5),
+             'benefactor': 'gift', 'documentation': ''},
+        ])
+
+    def tearDown(self):
+        database_connection.use_database(None)
+
+    def test_history_is_merged_by_date(self):
+        """
+        Test that the expenses and revenues are merged into one stream ordered by date.
+
+        Expected behavior:
+            - Every transaction of the user is returned once, with its kind, ordered by date.
+            - The transactions of other users are not returned.
+        """
+        history = asyncio.run(collect(export_service.transaction_history(self.user_id)))
+        self.assertEqual([(transaction['kind'], transaction['id']) for transaction in history],
+                         [('expense', 2), ('revenue', 1), ('expense', 1), ('revenue', 2), ('expense', 3)])
+        self.assertEqual([transaction['date'] for transaction in history],
+                         sorted(transaction['date'] for transaction in history))
+
+    def test_batch_size(self):
+        """
+        Test that the collections are read and the export is written in batches of EXPORT_BATCH_SIZE.
+
+        Expected behavior:
+            - Both collections are read with the batch size.
+            - Every NDJSON chunk but the last has EXPORT_BATCH_SIZE lines, and all the lines are exported.
+        """
+        with mock.patch.object(settings, 'EXPORT_BATCH_SIZE', 2), \
+                mock.patch.object(repository, 'iter_find', wraps=repository.iter_find) as iter_find:
+            chunks = asyncio.run(collect(export_service.export_transactions(self.user_id, 'ndjson')))
+        self.assertEqual([call.kwargs['batch_size'] for call in iter_find.call_args_list], [2, 2])
+        self.assertEqual([chunk.count(b'\n') for chunk in chunks], [2, 2, 1])
+        lines = b''.join(chunks).splitlines()
+        self.assertEqual([json.loads(line)['amount'] for line in lines], [20, 500, 10, 50, 30])
+
+    def test_csv(self):
+        """
+        Test the CSV export.
+
+        Expected behavior:
+            - The first row is the header of CSV_COLUMNS, in the first chunk only.
+            - Each transaction is one row, with its beneficiary or benefactor as the counterparty
+              and its date in ISO format.
+        """
+        with mock.patch.object(settings, 'EXPORT_BATCH_SIZE', 2):
+            chunks = asyncio.run(collect(export_service.export_transactions(self.user_id, 'csv')))
+        self.assertEqual(len(chunks), 3)
+        self.assertEqual(sum(chunk.count(','.join(export_service.CSV_COLUMNS)) for chunk in chunks), 1)
+        rows = list(csv.reader(io.StringIO(''.join(chunks))))
+        self.assertEqual(rows[0], export_service.CSV_COLUMNS)
+        self.assertEqual(rows[1:3], [['expense', '2', self.user_id, '20', '2024-01-01T00:00:00', 'rent', 'january'],
+                                     ['revenue', '1', self.user_id, '500', '2024-01-02T00:00:00', 'work', '']])
+        self.assertEqual([row[5] for row in rows[3:]], ['shop', 'gift', 'shop'])
+
+    def test_unsupported_format(self):
+        """
+        Test that an unsupported export format is rejected.
+
+        Expected behavior:
+            - A ValueError is raised.
+        """
+        with self.assertRaises(ValueError):
+            export_service.export_transactions(self.user_id, 'xml')
+
+
+if __name__ == '__main__':
+    unittest.main()
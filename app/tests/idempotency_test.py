@@ -0,0 +1,266 @@
+import asyncio
+import json
+import os
+import unittest
+from datetime import datetime, timedelta, timezone
+from unittest import mock
+
+import mongomock
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from pymongo import MongoClient
+from pymongo.errors import OperationFailure
+
+from app.config import settings
+from app.controllers import expense_controller
+from app.controllers.expense_controller import expense_router
+from app.database import database_connection, repository
+from app.database.database_connection import Collections
+from app.models.expense import Expense
+from app.models.user import User
+from app.services import balance_service, expense_service, idempotency_service, rollup_service, user_service
+
+
+def transient_error():
+    """
+    Return a RuntimeError raised from a write conflict, like the repository functions raise it.
+    """
+    try:
+        raise OperationFailure('WriteConflict', 112, {'errorLabels': ['TransientTransactionError']})
+    except OperationFailure as e:
+        try:
+            raise RuntimeError(f"Error updating document in collection users: {e}")
+        except RuntimeError as wrapped:
+            return wrapped
+
+
+class TestIdempotency(unittest.TestCase):
+    """
+    A test suite for the units of work and the idempotency keys of the POST endpoints.
+    The tests run on a mongomock database, which has no transactions, so the writes are compensated.
+    """
+
+    def setUp(self):
+        self.db = mongomock.MongoClient().db
+        database_connection.use_database(self.db)
+        asyncio.run(repository.create_indexes())
+        self.db.users.insert_one({'id': '325962801', 'balance': 100.0})
+
+    def tearDown(self):
+        database_connection.use_database(None)
+
+    @staticmethod
+    def expense(**fields):
+        return Expense(**{'id': 0, 'userId': '325962801', 'amount': 10, 'date': datetime(2024, 1, 5),
+                          'beneficiary': 'shop', 'documentation': '', **fields})
+
+    def test_retried_request_is_applied_once(self):
+        """
+        Test that a request sent again with the same key returns the first result and changes nothing.
+
+        Expected behavior:
+            - The expense is inserted and the balance changed once.
+            - The key is stored as done, with the result of the request.
+        """
+        first = asyncio.run(expense_service.add_expense(self.expense(), 'key-1'))
+        second = asyncio.run(expense_service.add_expense(self.expense(), 'key-1'))
+        self.assertEqual(first, second)
+        self.assertEqual(self.db.expenses.count_documents({}), 1)
+        self.assertEqual(self.db.users.find_one({'id': '325962801'})['balance'], 90.0)
+        self.assertEqual(self.db.idempotency_keys.find_one({'id': 'POST /expense:key-1'})['status'], 'done')
+
+    def test_key_reused_with_another_request(self):
+        """
+        Test that a key sent with a different request is rejected, and a pending key is reported in use.
+
+        Expected behavior:
+            - A different request raises IdempotencyKeyReusedError.
+            - The same request while the first one is pending raises IdempotencyKeyInUseError.
+        """
+        asyncio.run(expense_service.add_expense(self.expense(), 'key-1'))
+        with self.assertRaises(idempotency_service.IdempotencyKeyReusedError):
+            asyncio.run(expense_service.add_expense(self.expense(amount=11), 'key-1'))
+        self.db.idempotency_keys.insert_one({'id': 'POST /expense:key-2', 'status': 'pending',
+                                             'fingerprint': idempotency_service.fingerprint(self.expense().dict())})
+        with self.assertRaises(idempotency_service.IdempotencyKeyInUseError):
+            asyncio.run(expense_service.add_expense(self.expense(), 'key-2'))
+
+    def test_failed_request_is_undone_and_can_be_retried(self):
+        """
+        Test that an expense whose balance cannot be changed is not kept, and that its key is released.
+
+        Expected behavior:
+            - Adding an expense of an unknown user raises a ValueError and leaves no expense.
+            - The key is removed, so the corrected request can be sent with it again.
+        """
+        with self.assertRaises(ValueError):
+            asyncio.run(expense_service.add_expense(self.expense(userId='999999999'), 'key-1'))
+        self.assertEqual(self.db.expenses.count_documents({}), 0)
+        self.assertIsNone(self.db.idempotency_keys.find_one({'id': 'POST /expense:key-1'}))
+
+    def test_failed_rollup_is_undone(self):
+        """
+        Test that an expense whose rollups cannot be updated is not kept, without a transaction either.
+
+        Expected behavior:
+            - The expense is removed, and the balance and its ledger are changed back.
+        """
+        with mock.patch.object(rollup_service, 'record_change', mock.AsyncMock(side_effect=RuntimeError("down"))):
+            with self.assertRaises(RuntimeError):
+                asyncio.run(expense_service.add_expense(self.expense(), 'key-1'))
+        self.assertEqual(self.db.expenses.count_documents({}), 0)
+        self.assertEqual(self.db.users.find_one({'id': '325962801'})['balance'], 100.0)
+        self.assertEqual(sum(entry['amount'] for entry in self.db.ledger.find()), 0)
+        self.assertIsNone(self.db.idempotency_keys.find_one({'id': 'POST /expense:key-1'}))
+
+    def test_failed_user_update_is_undone(self):
+        """
+        Test that a user update whose balance adjustment fails leaves the user unchanged, without a transaction.
+
+        Expected behavior:
+            - The error is raised and the updated fields are restored.
+        """
+        self.db.users.update_one({'id': '325962801'}, {'$set': {
+            'user_name': 'mali', 'password': 'S@sw.1fdfg', 'email': 'user@example.com', 'phone': '053-4198051',
+            'birth_date': datetime(2000, 5, 28)}})
+        before = self.db.users.find_one({'id': '325962801'}, {'_id': 0})
+        user = User(**{**before, 'user_name': 'dana', 'phone': '054-1234567', 'balance': 150})
+        with mock.patch.object(balance_service, 'change_balance', mock.AsyncMock(side_effect=RuntimeError("down"))):
+            with self.assertRaises(RuntimeError):
+                asyncio.run(user_service.update_user('325962801', user))
+        self.assertEqual(self.db.users.find_one({'id': '325962801'}, {'_id': 0}), before)
+
+    def test_applied_request_keeps_its_key(self):
+        """
+        Test that a request applied without a transaction keeps its key when its result cannot be stored.
+
+        Expected behavior:
+            - The expense is kept and the key is marked applied, so it is never taken over.
+            - A retry with the key is refused instead of adding the expense again.
+        """
+        with mock.patch.object(repository, 'update', mock.AsyncMock(side_effect=RuntimeError("down"))):
+            with self.assertRaises(RuntimeError):
+                asyncio.run(expense_service.add_expense(self.expense(), 'key-1'))
+        self.assertEqual(self.db.idempotency_keys.find_one({'id': 'POST /expense:key-1'})['status'], 'applied')
+        with mock.patch.object(settings, 'IDEMPOTENCY_LEASE', 0):
+            with self.assertRaises(idempotency_service.IdempotencyKeyInUseError):
+                asyncio.run(expense_service.add_expense(self.expense(), 'key-1'))
+        self.assertEqual(self.db.expenses.count_documents({}), 1)
+        self.assertEqual(self.db.users.find_one({'id': '325962801'})['balance'], 90.0)
+
+    def test_expired_claim_is_taken_over(self):
+        """
+        Test that a retry takes over a key left pending by a request that never finished.
+
+        Expected behavior:
+            - A claim younger than the lease is refused.
+            - A claim older than the lease is taken over, and the request is applied once.
+        """
+        claimed_at = datetime.now(timezone.utc) - timedelta(seconds=settings.IDEMPOTENCY_LEASE / 2)
+        self.db.idempotency_keys.insert_one({
+            'id': 'POST /expense:key-1', 'fingerprint': idempotency_service.fingerprint(self.expense().dict()),
+            'status': 'pending', 'createdAt': claimed_at, 'claimedAt': claimed_at})
+        with self.assertRaises(idempotency_service.IdempotencyKeyInUseError):
+            asyncio.run(expense_service.add_expense(self.expense(), 'key-1'))
+        self.db.idempotency_keys.update_one({'id': 'POST /expense:key-1'}, {'$set': {
+            'claimedAt': claimed_at - timedelta(seconds=settings.IDEMPOTENCY_LEASE)}})
+        first = asyncio.run(expense_service.add_expense(self.expense(), 'key-1'))
+        self.assertEqual(asyncio.run(expense_service.add_expense(self.expense(), 'key-1')), first)
+        self.assertEqual(self.db.idempotency_keys.find_one({'id': 'POST /expense:key-1'})['status'], 'done')
+        self.assertEqual(self.db.expenses.count_documents({}), 1)
+        self.assertEqual(self.db.users.find_one({'id': '325962801'})['balance'], 90.0)
+
+    def test_controller_key_header(self):
+        """
+        Test that the POST endpoints take the key from the Idempotency-Key header only.
+
+        Expected behavior:
+            - Two direct calls without a key, like the controller tests make, add two expenses.
+            - Two HTTP requests with the same header add one expense.
+        """
+        asyncio.run(expense_controller.add_expense(self.expense()))
+        asyncio.run(expense_controller.add_expense(self.expense(amount=11)))
+        self.assertEqual(self.db.expenses.count_documents({}), 2)
+        app = FastAPI()
+        app.include_router(expense_router, prefix='/expense')
+        client = TestClient(app)
+        body = json.loads(self.expense().json())
+        for _ in range(2):
+            self.assertEqual(client.post('/expense', json=body, headers={'Idempotency-Key': 'key-1'}).status_code, 200)
+        self.assertEqual(self.db.expenses.count_documents({}), 3)
+
+    def test_transient_errors_retry_the_transaction(self):
+        """
+        Test that a unit of work failing with a transient transaction error runs again in a new transaction.
+
+        Expected behavior:
+            - The first transaction is aborted and the second one committed.
+            - An error without the label aborts the transaction and is raised.
+        """
+        sessions = []
+
+        def start_session():
+            sessions.append(mock.MagicMock(in_transaction=True))
+            return sessions[-1]
+
+        database = mock.MagicMock()
+        database.client.start_session = start_session
+
+        async def conflicting(session):
+            if len(sessions) == 1:
+                raise transient_error()
+            return 'done'
+
+        async def failing(session):
+            raise ValueError("User not found")
+
+        with mock.patch.object(repository, 'get_database', return_value=database), \
+                mock.patch.object(repository, 'transactions_supported', mock.AsyncMock(return_value=True)):
+            self.assertEqual(asyncio.run(repository.run_in_transaction(conflicting)), 'done')
+            sessions[0].abort_transaction.assert_called_once()
+            sessions[1].commit_transaction.assert_called_once()
+            self.assertTrue(all(session.end_session.called for session in sessions))
+            with self.assertRaises(ValueError):
+                asyncio.run(repository.run_in_transaction(failing))
+            sessions[2].abort_transaction.assert_called_once()
+            self.assertEqual(len(sessions), 3)
+
+
+@unittest.skipUnless(os.getenv('TEST_REPLICA_SET_URI'), "TEST_REPLICA_SET_URI is not set")
+class TestTransactions(unittest.TestCase):
+    """
+    A test suite for the transactions, on a replica set, e.g. a single-node one started with
+    `mongod --replSet rs0` and `rs.initiate()`, given in TEST_REPLICA_SET_URI.
+    """
+
+    def setUp(self):
+        self.client = MongoClient(os.environ['TEST_REPLICA_SET_URI'])
+        self.client.drop_database('finance_master_test')
+        self.db = self.client['finance_master_test']
+        database_connection.use_database(self.db)
+        asyncio.run(repository.create_indexes())
+        self.db.users.insert_one({'id': '325962801', 'balance': 100.0})
+
+    def tearDown(self):
+        database_connection.use_database(None)
+        self.client.drop_database('finance_master_test')
+        self.client.close()
+
+    def test_failed_balance_change_rolls_back_the_insert(self):
+        """
+        Test that the insert of an expense is rolled back when the balance cannot be changed.
+
+        Expected behavior:
+            - Transactions are supported on the replica set.
+            - Adding an expense of an unknown user raises a ValueError and leaves no expense.
+        """
+        self.assertTrue(asyncio.run(repository.transactions_supported()))
+        expense = Expense(id=0, userId='999999999', amount=10, date=datetime(2024, 1, 5),
+                          beneficiary='shop', documentation='')
+        with self.assertRaises(ValueError):
+            asyncio.run(expense_service.add_expense(expense))
+        self.assertEqual(self.db[Collections.expenses.name].count_documents({}), 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,29 @@
+import os
+import subprocess
+import sys
+import unittest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+class TestImport(unittest.TestCase):
+    """
+    A test suite guarding the startup cost of the API processes.
+    """
+
+    def test_main_does_not_import_chart_libraries(self):
+        """
+        Test that importing the application does not load the chart and dataframe libraries.
+
+        Expected behavior:
+            - A fresh interpreter importing app.main has not imported matplotlib, pandas or numpy;
+              they are loaded by the first chart or balance series instead.
+        """
+        code = ("import sys, app.main; "
+                "print(','.join(m for m in ('matplotlib', 'pandas', 'numpy') if m in sys.modules))")
+        process = subprocess.run([sys.executable, '-c', code], cwd=ROOT, capture_output=True, text=True, check=True)
+        self.assertEqual(process.stdout.strip(), '')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,69 @@
+import json
+import unittest
+from datetime import datetime
+from unittest.mock import patch
+
+from bson import ObjectId, json_util
+
+from app.serialization import json_encoder
+from app.serialization.json_encoder import MongoJSONResponse
+
+
+class TestJSONEncoder(unittest.TestCase):
+    """
+    A test suite for the single-pass MongoDB JSON encoder.
+    Each test checks that the encoder produces the same documents as the json_util round trip it replaces.
+    """
+
+    documents = [
+        {
+            "_id": ObjectId("6654a9ce127d643d15c38f3e"),
+            "id": 16,
+            "userId": "325962801",
+            "amount": 320.5,
+            "date": datetime(2024, 5, 27, 15, 41, 49, 252000),
+            "beneficiary": "שוק 👼",
+            "documentation": None
+        },
+        {
+            "_id": ObjectId("665655198a59df43fd56be02"),
+            "id": 17,
+            "userId": "325962801",
+            "amount": 150,
+            "date": datetime(1960, 5, 28, 14, 48, 54),
+            "beneficiary": "mali b",
+            "documentation": "payment on the work"
+        }
+    ]
+
+    def test_matches_json_util(self):
+        """
+        Test that the encoded documents are the ones the json_util round trip produced.
+
+        Expected behavior:
+            - ObjectId and datetime values are encoded as relaxed Extended JSON, like json_util.dumps.
+        """
+        expected_response = json.loads(json_util.dumps(self.documents))
+        assert json.loads(json_encoder.dumps(self.documents)) == expected_response
+
+    def test_matches_json_util_without_orjson(self):
+        """
+        Test that the standard library fallback produces the same documents as the orjson encoder.
+
+        Expected behavior:
+            - The encoded documents do not depend on whether orjson is installed.
+        """
+        expected_response = json.loads(json_util.dumps(self.documents))
+        with patch.object(json_encoder, 'orjson', None):
+            assert json.loads(json_encoder.dumps(self.documents)) == expected_response
+
+    def test_response_body(self):
+        """
+        Test that MongoJSONResponse renders the documents with the encoder.
+
+        Expected behavior:
+            - The response body is the encoded documents, with a JSON media type.
+        """
+        response = MongoJSONResponse(self.documents[0])
+        assert response.media_type == "application/json"
+        assert json.loads(response.body) == json.loads(json_util.dumps(self.documents[0]))
@@ -0,0 +1,125 @@
+import asyncio
+import unittest
+from datetime import datetime, timedelta
+from unittest import mock
+
+import mongomock
+
+from app.config import settings
+from app.database import database_connection, repository
+from app.services import balance_service, ledger_service
+
+
+class TestLedger(unittest.TestCase):
+    """
+    A test suite for the users' ledgers and the point-in-time balances computed from their snapshots.
+    The tests run on a mongomock database.
+    """
+
+    def setUp(self):
+        self.db = mongomock.MongoClient().db
+        database_connection.use_database(self.db)
+        asyncio.run(repository.create_indexes())
+        self.db.users.insert_one({'id': '325962801', 'email': 'a@example.com', 'balance': 100.0})
+        self.db.ledger.insert_many([
+            {'userId': '325962801', 'at': datetime(2024, 1, 1), 'amount': 100.0, 'kind': 'opening'},
+            {'userId': '325962801', 'at': datetime(2024, 2, 1), 'amount': -30.0, 'kind': 'expense'},
+            {'userId': '325962801', 'at': datetime(2024, 3, 1), 'amount': 30.0, 'kind': 'revenue'},
+        ])
+
+    def tearDown(self):
+        database_connection.use_database(None)
+
+    def test_balance_at(self):
+        """
+        Test that the balance at a moment is the sum of the ledger entries up to it.
+
+        Expected behavior:
+            - Each moment sees the entries recorded until then, and none after.
+            - A moment before the first entry has no balance and raises a ValueError.
+        """
+        self.assertEqual(asyncio.run(ledger_service.get_balance_at('325962801', datetime(2024, 1, 15)))['balance'],
+                         100.0)
+        self.assertEqual(asyncio.run(ledger_service.get_balance_at('325962801', datetime(2024, 2, 1)))['balance'],
+                         70.0)
+        self.assertEqual(asyncio.run(ledger_service.get_balance_at('325962801'))['balance'], 100.0)
+        with self.assertRaises(ValueError):
+            asyncio.run(ledger_service.get_balance_at('325962801', datetime(2023, 12, 31)))
+
+    def test_compaction(self):
+        """
+        Test that the snapshots keep the balances unchanged and shorten the ledger scans.
+
+        Expected behavior:
+            - A run writes one snapshot per user with new entries, and a second run at the same cutoff none.
+            - The balance after the snapshot reads the snapshot and only the entries since.
+        """
+        self.assertEqual(asyncio.run(ledger_service.compact(datetime(2024, 2, 15))), 1)
+        self.assertEqual(asyncio.run(ledger_service.compact(datetime(2024, 2, 15))), 0)
+        balance = asyncio.run(ledger_service.get_balance_at('325962801', datetime(2024, 3, 2)))
+        self.assertEqual(balance['balance'], 100.0)
+        self.assertEqual(balance['snapshot_at'], datetime(2024, 2, 15))
+        self.assertEqual(balance['entries'], 1)
+        self.assertEqual(asyncio.run(ledger_service.compact(datetime(2024, 3, 15))), 1)
+        self.assertEqual(asyncio.run(ledger_service.get_balance_at('325962801', datetime(2024, 3, 20)))['entries'], 0)
+
+    def test_compaction_in_batches(self):
+        """
+        Test that the compactor computes the snapshots of LEDGER_SNAPSHOT_BATCH_SIZE users at a time.
+
+        Expected behavior:
+            - Every user with new entries gets a snapshot of their balance.
+            - No more than a batch of balances is computed at once.
+        """
+        self.db.ledger.insert_many([{'userId': f'1000000{i:02d}', 'at': datetime(2024, 1, 1), 'amount': float(i),
+                                     'kind': 'opening'} for i in range(7)])
+        balance_at = ledger_service._balance_at
+        running, most = 0, 0
+
+        async def counted(user_id, at):
+            nonlocal running, most
+            running += 1
+            most = max(most, running)
+            try:
+                await asyncio.sleep(0)
+                return await balance_at(user_id, at)
+            finally:
+                running -= 1
+
+        with mock.patch.object(settings, 'LEDGER_SNAPSHOT_BATCH_SIZE', 3), \
+                mock.patch.object(ledger_service, '_balance_at', counted):
+            self.assertEqual(asyncio.run(ledger_service.compact(datetime(2024, 2, 15))), 8)
+        self.assertEqual(most, 3)
+        self.assertEqual(self.db.balance_snapshots.find_one({'userId': '100000006'})['balance'], 6.0)
+
+    def test_balance_changes_are_appended(self):
+        """
+        Test that every balance change appends a signed entry, keeping the balance equal to its ledger.
+
+        Expected behavior:
+            - change_balance appends an entry of the difference.
+            - verify reports no mismatch, and reports a balance changed without the ledger.
+        """
+        asyncio.run(balance_service.change_balance('325962801', -12.5, kind='expense', reference=7))
+        entry = self.db.ledger.find_one({'reference': 7})
+        self.assertEqual((entry['amount'], entry['kind']), (-12.5, 'expense'))
+        self.assertEqual(asyncio.run(ledger_service.verify()), [])
+        self.db.users.update_one({'id': '325962801'}, {'$inc': {'balance': 1}})
+        self.assertEqual(len(asyncio.run(ledger_service.verify())), 1)
+
+    def test_open_accounts(self):
+        """
+        Test that the users without a ledger get an opening entry of their balance, once.
+
+        Expected behavior:
+            - Only the user with an empty ledger is opened, and a second run opens nothing.
+        """
+        self.db.users.insert_one({'id': '325962802', 'email': 'b@example.com', 'balance': 40.0})
+        self.assertEqual(asyncio.run(ledger_service.open_accounts()), 1)
+        self.assertEqual(asyncio.run(ledger_service.open_accounts()), 0)
+        balance = asyncio.run(ledger_service.get_balance_at('325962802', ledger_service.now() + timedelta(seconds=1)))
+        self.assertEqual(balance['balance'], 40.0)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,73 @@
+import asyncio
+import logging
+import queue
+import unittest
+
+from app.log.log import DroppingQueueHandler, call_duration, log_decorator, truncate
+
+
+class TestLog(unittest.TestCase):
+    """
+    A test suite for the bounded, non-blocking logging of log_decorator.
+    """
+
+    def test_truncate_bounds_payload(self):
+        """
+        Test that large arguments and results are rendered to a bounded length.
+
+        Expected behavior:
+            - A long list is rendered with its first items only.
+            - The rendering never exceeds the maximum length plus the ellipsis.
+        """
+        transactions = [{'id': i, 'amount': i * 10} for i in range(100000)]
+        text = truncate(transactions, 100)
+        self.assertTrue(text.startswith("[{'amount': 0, 'id': 0}"))
+        self.assertLessEqual(len(text), 103)
+        self.assertEqual(truncate((1, 'a')), "(1, 'a')")
+
+    def test_full_queue_drops_records(self):
+        """
+        Test that logging never blocks when the writer falls behind.
+
+        Expected behavior:
+            - Records beyond the queue size are dropped and counted.
+        """
+        handler = DroppingQueueHandler(queue.Queue(2))
+        logger = logging.getLogger('log_test')
+        logger.propagate = False
+        logger.addHandler(handler)
+        try:
+            for i in range(5):
+                logger.warning('record %s', i)
+        finally:
+            logger.removeHandler(handler)
+        self.assertEqual(handler.queue.qsize(), 2)
+        self.assertEqual(handler.dropped, 3)
+
+    def test_async_functions_are_awaited_and_timed(self):
+        """
+        Test that decorated coroutine functions are awaited and their duration recorded.
+
+        Expected behavior:
+            - The wrapper is itself a coroutine function returning the awaited result.
+            - Successful and failed calls are observed under their own status.
+        """
+        @log_decorator('app.log')
+        async def fetch(fail=False):
+            await asyncio.sleep(0.01)
+            if fail:
+                raise ValueError("Not found")
+            return [1, 2, 3]
+
+        self.assertEqual(asyncio.run(fetch()), [1, 2, 3])
+        with self.assertRaises(ValueError):
+            asyncio.run(fetch(fail=True))
+        lines = call_duration.expose()
+        self.assertIn('service_call_duration_seconds_count{function="log_test.fetch",status="ok"} 1', lines)
+        self.assertIn('service_call_duration_seconds_count{function="log_test.fetch",status="error"} 1', lines)
+        self.assertNotIn('service_call_duration_seconds_bucket{function="log_test.fetch",status="ok",le="0.005"} 1',
+                         lines)
+
+
+if __name__ == '__main__':
+    unittest.main()
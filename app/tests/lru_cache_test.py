@@ -0,0 +1,67 @@
+import unittest
+from unittest import mock
+
+from app.cache.lru_cache import LRUCache
+
+
+class TestLRUCache(unittest.TestCase):
+    """
+    A test suite for the LRU cache behind the chart and aggregate cache.
+    Each test checks one of the bounds of the cache.
+    """
+
+    def test_evicts_least_recently_used(self):
+        """
+        Test that the least recently used entry is evicted when the entry bound is reached.
+
+        Expected behavior:
+            - Reading an entry makes it the most recently used one.
+            - The entry that was not read is evicted and counted.
+        """
+        cache = LRUCache(2)
+        cache.set('a', 1)
+        cache.set('b', 2)
+        self.assertEqual(cache.get('a'), 1)
+        cache.set('c', 3)
+        self.assertIsNone(cache.get('b'))
+        self.assertEqual(cache.get('a'), 1)
+        self.assertEqual(cache.get('c'), 3)
+        self.assertEqual(cache.stats()['evictions'], 1)
+
+    def test_bounded_by_size(self):
+        """
+        Test that the total size of the entries stays within the byte bound.
+
+        Expected behavior:
+            - Older entries are evicted until the new entry fits.
+            - An entry larger than the bound is not cached.
+        """
+        cache = LRUCache(10, max_bytes=10)
+        cache.set('a', b'12345')
+        cache.set('b', b'12345')
+        cache.set('c', b'123')
+        self.assertIsNone(cache.get('a'))
+        self.assertEqual(cache.get('b'), b'12345')
+        cache.set('d', b'x' * 11)
+        self.assertIsNone(cache.get('d'))
+        self.assertLessEqual(cache.stats()['bytes'], 10)
+
+    def test_entries_expire(self):
+        """
+        Test that entries are not served after their time to live.
+
+        Expected behavior:
+            - An entry is served before its time to live has passed and is expired after it.
+        """
+        cache = LRUCache(10, ttl=5)
+        with mock.patch('app.cache.lru_cache.time.monotonic', return_value=100.0):
+            cache.set('a', 1)
+        with mock.patch('app.cache.lru_cache.time.monotonic', return_value=104.0):
+            self.assertEqual(cache.get('a'), 1)
+        with mock.patch('app.cache.lru_cache.time.monotonic', return_value=106.0):
+            self.assertIsNone(cache.get('a'))
+        self.assertEqual(cache.stats()['expirations'], 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,109 @@
+import asyncio
+import unittest
+
+import mongomock
+from fastapi import APIRouter, FastAPI
+from fastapi.testclient import TestClient
+
+from app.database import database_connection, repository
+from app.database.database_connection import Collections
+from app.metrics import metrics
+from app.metrics.middleware import MetricsMiddleware, request_duration
+
+
+class TestMetrics(unittest.TestCase):
+    """
+    A test suite for the metrics registry and its Prometheus text rendering.
+    """
+
+    def test_histogram_buckets_are_cumulative(self):
+        """
+        Test that a histogram counts each observation in every bucket at or above it.
+
+        Expected behavior:
+            - Each bucket counts the observations less than or equal to its bound.
+            - The +Inf bucket, the count and the sum cover all the observations.
+        """
+        histogram = metrics.Histogram('test_duration_seconds', 'Test durations.', ('function',),
+                                      buckets=(0.1, 1))
+        for value in (0.05, 0.1, 0.5, 3):
+            histogram.observe(value, function='f')
+        lines = histogram.expose()
+        self.assertIn('test_duration_seconds_bucket{function="f",le="0.1"} 2', lines)
+        self.assertIn('test_duration_seconds_bucket{function="f",le="1"} 3', lines)
+        self.assertIn('test_duration_seconds_bucket{function="f",le="+Inf"} 4', lines)
+        self.assertIn('test_duration_seconds_count{function="f"} 4', lines)
+        self.assertIn('test_duration_seconds_sum{function="f"} 3.65', lines)
+
+    def test_registry(self):
+        """
+        Test that metrics are registered once per name and exposed together.
+
+        Expected behavior:
+            - Getting a metric twice returns the same metric.
+            - The exposition includes the HELP and TYPE lines and the samples.
+            - Using wrong labels raises a ValueError.
+        """
+        calls = metrics.counter('test_registry_calls', 'Test calls.', ('route',))
+        self.assertIs(calls, metrics.counter('test_registry_calls', 'Test calls.', ('route',)))
+        calls.inc(route='/user')
+        calls.inc(2, route='/user')
+        text = metrics.expose()
+        self.assertIn('# TYPE test_registry_calls counter', text)
+        self.assertIn('test_registry_calls_total{route="/user"} 3', text)
+        with self.assertRaises(ValueError):
+            calls.inc(path='/user')
+
+    def test_middleware_labels_requests_by_route(self):
+        """
+        Test that the middleware records requests under their route template.
+
+        Expected behavior:
+            - The template includes the router prefix and the path parameters, not their values.
+            - Requests matching no route are recorded under 'unmatched'.
+        """
+        router = APIRouter()
+
+        @router.get('/{item_id}')
+        async def get_item(item_id: int):
+            return item_id
+
+        app = FastAPI()
+        app.add_middleware(MetricsMiddleware)
+        app.include_router(router, prefix='/test-items')
+        client = TestClient(app)
+        client.get('/test-items/1')
+        client.get('/test-items/2')
+        client.get('/test-missing')
+        lines = request_duration.expose()
+        self.assertIn('http_request_duration_seconds_count{method="GET",route="/test-items/{item_id}",status="200"} 2',
+                      lines)
+        self.assertIn('http_request_duration_seconds_count{method="GET",route="unmatched",status="404"} 1', lines)
+
+    def test_repository_counts_read_documents(self):
+        """
+        Test that the repository counts the documents its reads return, and not what its writes return.
+
+        Expected behavior:
+            - A find adds its documents to db_documents and db_document_bytes.
+            - An add and an update add nothing to them.
+        """
+        def documents(operation):
+            prefix = f'db_documents_total{{operation="{operation}",collection="users"}} '
+            return sum(float(line[len(prefix):]) for line in repository.db_documents.expose()
+                       if line.startswith(prefix))
+
+        database_connection.use_database(mongomock.MongoClient().db)
+        try:
+            before = documents('find')
+            asyncio.run(repository.add(Collections.users, {'id': '325962801'}))
+            asyncio.run(repository.update(Collections.users, '325962801', {'user_name': 'MALI'}))
+            asyncio.run(repository.find(Collections.users, {}))
+        finally:
+            database_connection.use_database(None)
+        self.assertEqual(documents('find'), before + 1)
+        self.assertEqual((documents('add'), documents('update')), (0, 0))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,67 @@
+import asyncio
+import json
+import unittest
+from datetime import datetime
+
+import mongomock
+
+from app.controllers import expense_controller, user_controller
+from app.database import database_connection
+
+
+class TestPagination(unittest.TestCase):
+    """
+    A test suite for the paginated list endpoints, called directly like the other controller tests.
+    The tests run on a mongomock database.
+    """
+
+    def setUp(self):
+        self.db = mongomock.MongoClient().db
+        database_connection.use_database(self.db)
+        self.db.users.insert_many([{'id': str(325962801 + i), 'balance': 0.0} for i in range(3)])
+        self.db.expenses.insert_many([
+            {'id': i, 'userId': '325962801', 'amount': 10 * i, 'date': datetime(2024, 1, i),
+             'beneficiary': 'shop', 'documentation': ''} for i in range(1, 6)
+        ])
+
+    def tearDown(self):
+        database_connection.use_database(None)
+
+    def test_without_limit(self):
+        """
+        Test that a direct call without the query parameters returns every item and no cursor.
+
+        Expected behavior:
+            - All the user's expenses are returned, ordered by date.
+            - The response has no X-Next-Cursor header.
+        """
+        response = asyncio.run(expense_controller.get_expenses('325962801'))
+        self.assertEqual([expense['id'] for expense in json.loads(response.body)], [1, 2, 3, 4, 5])
+        self.assertNotIn('x-next-cursor', response.headers)
+
+    def test_pages(self):
+        """
+        Test that following the cursors returns every item once.
+
+        Expected behavior:
+            - Each page has at most `limit` items, and the last page has no cursor.
+            - Only the selected fields are returned, with the sort keys.
+        """
+        ids, after = [], None
+        while True:
+            response = asyncio.run(expense_controller.get_expenses('325962801', limit=2, after=after,
+                                                                   fields='amount'))
+            page = json.loads(response.body)
+            self.assertLessEqual(len(page), 2)
+            self.assertNotIn('beneficiary', page[0])
+            ids += [expense['id'] for expense in page]
+            after = response.headers.get('x-next-cursor')
+            if after is None:
+                break
+        self.assertEqual(ids, [1, 2, 3, 4, 5])
+        users = json.loads(asyncio.run(user_controller.get_users(limit=2)).body)
+        self.assertEqual(len(users), 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
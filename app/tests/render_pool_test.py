@@ -0,0 +1,97 @@
+import asyncio
+import time
+import unittest
+from unittest import mock
+
+from app.config import settings
+from app.services import render_pool
+
+
+def fake_render(kind: str, data: dict, image_format: str):
+    """
+    Stand in for render_pool._render in the workers: sleep for data['seconds'], or fail when data['fail'] is set.
+    """
+    if data.get('fail'):
+        raise ValueError("Unsupported image format")
+    time.sleep(data.get('seconds', 0))
+    return kind.encode(), data.get('seconds', 0)
+
+
+class TestRenderPool(unittest.TestCase):
+    """
+    A test suite for the chart render pool. The workers run fake_render instead of rendering charts,
+    on a pool of one process.
+    """
+
+    def setUp(self):
+        patches = [mock.patch.object(render_pool, '_render', fake_render),
+                   mock.patch.dict(render_pool._stats, {stat: 0 for stat in render_pool._stats}),
+                   mock.patch.multiple(settings, RENDER_POOL_SIZE=1, RENDER_QUEUE_SIZE=2, RENDER_TIMEOUT=10)]
+        for patch in patches:
+            patch.start()
+            self.addCleanup(patch.stop)
+        self.addCleanup(render_pool.shutdown)
+
+    def test_stats(self):
+        """
+        Test that the counters follow the completed and failed renders.
+
+        Expected behavior:
+            - A render returns the image of its worker, and a failed render raises the worker's error.
+            - submitted, completed and failed count the jobs, and no job is left in flight.
+        """
+        self.assertEqual(asyncio.run(render_pool.render('summary', {'seconds': 0.01})), b'summary')
+        with self.assertRaises(ValueError):
+            asyncio.run(render_pool.render('summary', {'fail': True}))
+        stats = render_pool.stats()
+        self.assertEqual({stat: stats[stat] for stat in ('submitted', 'completed', 'failed', 'in_flight')},
+                         {'submitted': 2, 'completed': 1, 'failed': 1, 'in_flight': 0})
+        self.assertAlmostEqual(stats['render_seconds_max'], 0.01)
+        self.assertEqual(stats['pool_size'], 1)
+
+    def test_full_queue(self):
+        """
+        Test that a render is rejected while RENDER_QUEUE_SIZE jobs are in flight.
+
+        Expected behavior:
+            - The third of three concurrent renders raises RenderPoolBusyError, and the others complete.
+            - One job waits in the queue while the other runs.
+        """
+        async def render_three():
+            renders = [asyncio.ensure_future(render_pool.render('summary', {'seconds': 0.5})) for _ in range(3)]
+            await asyncio.sleep(0)
+            depth = render_pool.stats()['queue_depth']
+            return depth, await asyncio.gather(*renders, return_exceptions=True)
+
+        depth, results = asyncio.run(render_three())
+        self.assertEqual(depth, 1)
+        self.assertEqual(results[:2], [b'summary', b'summary'])
+        self.assertIsInstance(results[2], render_pool.RenderPoolBusyError)
+        self.assertEqual(render_pool.stats()['rejected'], 1)
+
+    def test_timeout_recycles_the_pool(self):
+        """
+        Test that a render running longer than RENDER_TIMEOUT recycles the pool.
+
+        Expected behavior:
+            - The render raises TimeoutError, and its worker is terminated.
+            - The queue slot is released, and the next render runs on a new pool.
+        """
+        pool = render_pool._get_pool()
+        context = render_pool._context
+        with mock.patch.object(settings, 'RENDER_TIMEOUT', 0.5):
+            with self.assertRaises(TimeoutError):
+                asyncio.run(render_pool.render('summary', {'seconds': 60}))
+        self.assertEqual(len(context.processes), 1)
+        for process in context.processes:
+            process.join(5)
+            self.assertFalse(process.is_alive())
+        stats = render_pool.stats()
+        self.assertEqual((stats['timed_out'], stats['recycled']), (1, 1))
+        self.assertEqual(asyncio.run(render_pool.render('summary', {})), b'summary')
+        self.assertIsNot(render_pool._pool, pool)
+        self.assertEqual(render_pool.stats()['in_flight'], 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
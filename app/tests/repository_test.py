@@ -0,0 +1,61 @@
+import asyncio
+import importlib
+import threading
+import unittest
+from unittest import mock
+
+import mongomock
+
+from app.config import settings
+from app.database import database_connection, repository
+from app.database.database_connection import Collections
+
+
+class TestRepositoryBackends(unittest.TestCase):
+    """
+    A test suite for the backends running the blocking database calls of the repository.
+    The tests run on a mongomock database.
+    """
+
+    def setUp(self):
+        self.db = mongomock.MongoClient().db
+        database_connection.use_database(self.db)
+        self.db.users.insert_one({'id': '325962801', 'email': 'a@example.com'})
+
+    def tearDown(self):
+        database_connection.use_database(None)
+        repository.shutdown()
+
+    def test_backends(self):
+        """
+        Test that each backend runs the calls where it should.
+
+        Expected behavior:
+            - The "executor" backend runs the calls on the repository thread pool.
+            - The "inline" backend runs the calls on the thread of the event loop.
+            - Under both, a repository call returns the stored document.
+        """
+        for backend, on_pool in (('executor', True), ('inline', False)):
+            with self.subTest(backend=backend), mock.patch.object(settings, 'DB_BACKEND', backend):
+                thread = asyncio.run(repository._run(lambda: threading.current_thread().name))
+                self.assertEqual(thread.startswith('repository'), on_pool)
+                user = asyncio.run(repository.find_one(Collections.users, {'id': '325962801'}, {'_id': 0}))
+                self.assertEqual(user, {'id': '325962801', 'email': 'a@example.com'})
+
+    def test_invalid_backend(self):
+        """
+        Test that an unknown DB_BACKEND is rejected when the repository is imported.
+
+        Expected behavior:
+            - Importing the repository raises a ValueError, and imports again once the setting is valid.
+        """
+        try:
+            with mock.patch.object(settings, 'DB_BACKEND', 'threads'):
+                with self.assertRaises(ValueError):
+                    importlib.reload(repository)
+        finally:
+            importlib.reload(repository)
+
+
+if __name__ == '__main__':
+    unittest.main()
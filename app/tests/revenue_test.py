@@ -1,4 +1,5 @@
 import asyncio
+import json
 import unittest
 from datetime import datetime
 
@@ -36,7 +37,7 @@ class TestHH(unittest.TestCase):
             "benefactor": "string",
             "documentation": "string"
         }
-        result = asyncio.run(revenue_controller.get_revenue_by_id(11, "325962801"))
+        result = json.loads(asyncio.run(revenue_controller.get_revenue_by_id(11, "325962801")).body)
         assert result == expected_response
 
     def test_add_revenue(self):
@@ -97,6 +98,6 @@ class TestHH(unittest.TestCase):
             "benefactor": "mali",
             "documentation": "payment on the work"
         }
-        result = asyncio.run(revenue_controller.delete_revenue(25, "325962801"))
+        result = json.loads(asyncio.run(revenue_controller.delete_revenue(25, "325962801")).body)
         assert result == expected_response
 
@@ -0,0 +1,188 @@
+import asyncio
+import json
+import unittest
+from datetime import datetime
+from unittest import mock
+
+import mongomock
+
+from app.config import settings
+from app.database import database_connection, repository
+from app.models.expense import Expense
+from app.models.revenue import Revenue
+from app.services import balance_service, export_service, import_service
+from app.services.import_service import parse_rows, validate_row
+
+
+class TestTransactionImport(unittest.TestCase):
+    """
+    A test suite for the parsing and validation of the bulk import rows.
+    None of the tests needs a running database.
+    """
+
+    expense = {"kind": "expense", "id": 7, "userId": "325962801", "amount": 20.5,
+               "date": "2024-01-06T00:00:00", "beneficiary": "rent", "documentation": "January"}
+
+    def test_parse_formats(self):
+        """
+        Test that the three formats yield the same records, numbered from 1.
+
+        Expected behavior:
+            - A JSON array, NDJSON lines and CSV rows are parsed into dicts.
+            - An unparsable NDJSON line is reported in place of its record.
+        """
+        self.assertEqual(parse_rows(json.dumps([self.expense]).encode(), 'json'), [(1, self.expense)])
+        ndjson = (json.dumps(self.expense) + '\n\n{bad\n').encode()
+        rows = parse_rows(ndjson, 'ndjson')
+        self.assertEqual(rows[0], (1, self.expense))
+        self.assertTrue(rows[1][1].startswith('Invalid JSON'))
+        csv = b'kind,id,userId,amount,date,counterparty,documentation\nrevenue,1,325962801,500,2024-02-01,salary,\n'
+        self.assertEqual(parse_rows(csv, 'csv')[0][1]['counterparty'], 'salary')
+
+    def test_parse_rejects_bad_bodies(self):
+        """
+        Test that bodies that cannot be imported at all are rejected.
+
+        Expected behavior:
+            - An unsupported format, a JSON body that is not an array and too many rows raise a ValueError.
+        """
+        with self.assertRaises(ValueError):
+            parse_rows(b'[]', 'xml')
+        with self.assertRaises(ValueError):
+            parse_rows(b'{}', 'json')
+        with mock.patch.object(settings, 'IMPORT_MAX_ROWS', 1):
+            with self.assertRaises(ValueError):
+                parse_rows(json.dumps([self.expense, self.expense]).encode(), 'json')
+
+    def test_validate_row(self):
+        """
+        Test that rows are validated against the Expense and Revenue models.
+
+        Expected behavior:
+            - The row's id is ignored and 'counterparty' fills the beneficiary or benefactor.
+            - An unsupported kind, an invalid field or a CSV row longer than the header raises a ValueError
+              naming the problem.
+        """
+        kind, expense = validate_row(self.expense)
+        self.assertEqual(kind, 'expense')
+        self.assertIsInstance(expense, Expense)
+        self.assertEqual(expense.id, 0)
+        kind, revenue = validate_row({"kind": "revenue", "userId": "325962801", "amount": "500",
+                                      "date": "2024-02-01", "counterparty": "salary", "documentation": ""})
+        self.assertIsInstance(revenue, Revenue)
+        self.assertEqual(revenue.benefactor, 'salary')
+        with self.assertRaisesRegex(ValueError, 'Unsupported kind'):
+            validate_row({**self.expense, 'kind': 'loan'})
+        with self.assertRaisesRegex(ValueError, 'amount'):
+            validate_row({**self.expense, 'amount': -5})
+        csv = b'kind,userId,amount,date,counterparty,documentation\nexpense,325962801,5,2024-01-06,rent,,extra\n'
+        with self.assertRaisesRegex(ValueError, 'more fields than the header'):
+            validate_row(parse_rows(csv, 'csv')[0][1])
+
+
+
+class TestExportImportRoundTrip(unittest.TestCase):
+    """
+    A test suite checking that an export can be replayed through the import.
+    The tests run on a mongomock database.
+    """
+
+    def setUp(self):
+        self.db = mongomock.MongoClient().db
+        database_connection.use_database(self.db)
+        asyncio.run(repository.create_indexes())
+        self.db.users.insert_one({'id': '325962801', 'email': 'a@example.com', 'balance': 0.0})
+        self.db.expenses.insert_many([
+            {'id': 1, 'userId': '325962801', 'amount': 20.5, 'date': datetime(2024, 1, 6, 10, 30),
+             'beneficiary': 'rent', 'documentation': 'January'},
+            {'id': 2, 'userId': '325962801', 'amount': 7, 'date': datetime(2024, 2, 1), 'beneficiary': 'shop',
+             'documentation': ''},
+        ])
+        self.db.revenues.insert_one({'id': 1, 'userId': '325962801', 'amount': 500, 'date': datetime(2024, 1, 1),
+                                     'benefactor': 'salary', 'documentation': ''})
+
+    def tearDown(self):
+        database_connection.use_database(None)
+
+    def export(self, export_format):
+        async def collect():
+            return [chunk.encode() if isinstance(chunk, str) else chunk
+                    async for chunk in export_service.export_transactions('325962801', export_format)]
+        return b''.join(asyncio.run(collect()))
+
+    @staticmethod
+    def without_ids(export):
+        return [{key: value for key, value in json.loads(line).items() if key != 'id'}
+                for line in export.splitlines()]
+
+    def test_round_trip(self):
+        """
+        Test that the NDJSON and CSV exports import back into the same transactions.
+
+        Expected behavior:
+            - Every row of the export is imported, with its {"$date": ...} or ISO date.
+            - Exporting the imported transactions gives the first export again, except for the ids.
+        """
+        for export_format in ('ndjson', 'csv'):
+            exported = self.export('ndjson')
+            body = self.export(export_format)
+            self.db.expenses.delete_many({})
+            self.db.revenues.delete_many({})
+            result = asyncio.run(import_service.import_transactions(body, export_format))
+            self.assertEqual((result['failed'], result['imported']), (0, {'expense': 2, 'revenue': 1}),
+                             export_format)
+            self.assertEqual(self.without_ids(self.export('ndjson')), self.without_ids(exported), export_format)
+
+
+class TestImportFailure(unittest.TestCase):
+    """
+    A test suite for the imports failing after their rows were inserted.
+    The tests run on a mongomock database, which has no transactions.
+    """
+
+    def setUp(self):
+        self.db = mongomock.MongoClient().db
+        database_connection.use_database(self.db)
+        asyncio.run(repository.create_indexes())
+        self.db.users.insert_many([{'id': '325962801', 'email': 'a@example.com', 'balance': 100.0},
+                                   {'id': '325962802', 'email': 'b@example.com', 'balance': 100.0}])
+        self.body = json.dumps([
+            {'kind': 'expense', 'userId': '325962801', 'amount': 10, 'date': '2024-01-06T00:00:00',
+             'beneficiary': 'rent', 'documentation': ''},
+            {'kind': 'revenue', 'userId': '325962802', 'amount': 50, 'date': '2024-01-07T00:00:00',
+             'benefactor': 'salary', 'documentation': ''},
+        ]).encode()
+
+    def tearDown(self):
+        database_connection.use_database(None)
+
+    def test_failed_balance_change_undoes_the_import(self):
+        """
+        Test that an import whose balance change fails after the insert leaves nothing behind.
+
+        Expected behavior:
+            - No transaction remains, and the balance that was changed is changed back.
+            - The idempotency key is released, and the retried import is applied once.
+        """
+        change_balance = balance_service.change_balance
+
+        async def failing_for_one_user(user_id, difference, **kwargs):
+            if user_id == '325962802':
+                raise ValueError("User not found")
+            return await change_balance(user_id, difference, **kwargs)
+
+        with mock.patch.object(balance_service, 'change_balance', failing_for_one_user):
+            with self.assertRaises(ValueError):
+                asyncio.run(import_service.import_transactions(self.body, 'json', 'key-1'))
+        self.assertEqual(self.db.expenses.count_documents({}) + self.db.revenues.count_documents({}), 0)
+        self.assertEqual([user['balance'] for user in self.db.users.find()], [100.0, 100.0])
+        self.assertEqual(self.db.monthly_rollups.count_documents({'count': {'$ne': 0}}), 0)
+        self.assertIsNone(self.db.idempotency_keys.find_one({}))
+        for _ in range(2):
+            result = asyncio.run(import_service.import_transactions(self.body, 'json', 'key-1'))
+        self.assertEqual(result['balances'], {'325962801': 90.0, '325962802': 150.0})
+        self.assertEqual(self.db.expenses.count_documents({}) + self.db.revenues.count_documents({}), 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
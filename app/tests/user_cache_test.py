@@ -0,0 +1,106 @@
+import asyncio
+import unittest
+from unittest import mock
+
+from app.cache import user_cache
+from app.cache.lru_cache import LRUCache
+from app.cache.versions import Versions
+from app.config import settings
+
+
+class TestUserCache(unittest.TestCase):
+    """
+    A test suite for the read-through cache of the user documents.
+    None of the tests needs a running database.
+    """
+
+    def setUp(self):
+        cache = LRUCache(10, ttl=60)
+        patcher = mock.patch.multiple(user_cache, _cache=cache, _versions=Versions(cache))
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.loads = 0
+
+    def load(self, user):
+        async def load():
+            self.loads += 1
+            return user
+        return load
+
+    def test_read_through(self):
+        """
+        Test that a user is loaded once and then served from the cache.
+
+        Expected behavior:
+            - The second lookup is a hit and does not load the user.
+            - The returned documents are copies, so changing one does not change the cache.
+        """
+        first = asyncio.run(user_cache.get_or_load('325962801', self.load({'id': '325962801', 'balance': 10})))
+        first['balance'] = 0
+        second = asyncio.run(user_cache.get_or_load('325962801', self.load({'id': '325962801', 'balance': 10})))
+        self.assertEqual(second['balance'], 10)
+        self.assertEqual(self.loads, 1)
+        self.assertEqual((user_cache.stats()['hits'], user_cache.stats()['misses']), (1, 1))
+
+    def test_invalidate(self):
+        """
+        Test that an invalidated user is loaded again, and that missing users are not cached.
+
+        Expected behavior:
+            - After invalidate, the next lookup loads the new document.
+            - A user that does not exist is looked up in the database every time.
+        """
+        asyncio.run(user_cache.get_or_load('325962801', self.load({'id': '325962801', 'balance': 10})))
+        user_cache.invalidate('325962801')
+        user = asyncio.run(user_cache.get_or_load('325962801', self.load({'id': '325962801', 'balance': 20})))
+        self.assertEqual(user['balance'], 20)
+        for _ in range(2):
+            self.assertIsNone(asyncio.run(user_cache.get_or_load('325962802', self.load(None))))
+        self.assertEqual(self.loads, 4)
+
+    def test_load_during_a_change_is_not_served_after_it(self):
+        """
+        Test that a document loaded while the user is being changed is not served once the change is done.
+
+        Expected behavior:
+            - The lookup after the invalidation loads the user again.
+        """
+        async def load_during_change():
+            self.loads += 1
+            user_cache.invalidate('325962801')
+            return {'id': '325962801', 'balance': 10}
+
+        asyncio.run(user_cache.get_or_load('325962801', load_during_change))
+        user = asyncio.run(user_cache.get_or_load('325962801', self.load({'id': '325962801', 'balance': 20})))
+        self.assertEqual(user['balance'], 20)
+
+    def test_versions_are_bounded(self):
+        """
+        Test that invalidating many users does not keep a version for each of them.
+
+        Expected behavior:
+            - The versions stay bounded by the cache size, and a cached user keeps its version.
+        """
+        asyncio.run(user_cache.get_or_load('325962801', self.load({'id': '325962801', 'balance': 10})))
+        for user_id in range(1000):
+            user_cache.invalidate(str(user_id))
+        self.assertLessEqual(user_cache.stats()['versions'], 21)
+        asyncio.run(user_cache.get_or_load('325962801', self.load({'id': '325962801', 'balance': 10})))
+        self.assertEqual(self.loads, 1)
+
+    def test_disabled(self):
+        """
+        Test that nothing is cached when USER_CACHE_ENABLED is off.
+
+        Expected behavior:
+            - Every lookup loads the user.
+        """
+        with mock.patch.object(settings, 'USER_CACHE_ENABLED', False):
+            for _ in range(2):
+                asyncio.run(user_cache.get_or_load('325962801', self.load({'id': '325962801', 'balance': 10})))
+        self.assertEqual(self.loads, 2)
+        self.assertEqual(user_cache.stats()['entries'], 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,89 @@
+import asyncio
+import unittest
+
+import mongomock
+
+from app.database import database_connection, repository
+from app.database.database_connection import Collections
+from app.models.user import User
+from app.services import user_service
+
+
+class TestUserService(unittest.TestCase):
+    """
+    A test suite for the user service functions.
+    The tests run on a mongomock database.
+    """
+
+    def setUp(self):
+        self.db = mongomock.MongoClient().db
+        database_connection.use_database(self.db)
+        asyncio.run(repository.create_indexes())
+        self.db.users.insert_one({'id': '325962801', 'user_name': 'MALI', 'password': '123Aaa$$$',
+                                  'email': 'user@example.com', 'phone': '053-4198051', 'balance': 100.0})
+
+    def tearDown(self):
+        database_connection.use_database(None)
+
+    def test_login_by_unique_email(self):
+        """
+        Test that the login looks the user up by their email, which is unique.
+
+        Expected behavior:
+            - The email index is unique, and a second user with the same email is rejected.
+            - The login returns the user's document, and a wrong password or email raises a ValueError.
+        """
+        self.assertTrue(self.db.users.index_information()['email_1'].get('unique'))
+        with self.assertRaises(RuntimeError):
+            asyncio.run(repository.add(Collections.users, {'id': '325962802', 'email': 'user@example.com'}))
+        user = asyncio.run(user_service.login('user@example.com', '123Aaa$$$'))
+        self.assertEqual((user['id'], user['user_name']), ('325962801', 'MALI'))
+        with self.assertRaises(ValueError):
+            asyncio.run(user_service.login('user@example.com', 'wrong'))
+        with self.assertRaises(ValueError):
+            asyncio.run(user_service.login('other@example.com', '123Aaa$$$'))
+
+    def test_delete_user_with_their_data(self):
+        """
+        Test that deleting a user removes all of their data, and only theirs.
+
+        Expected behavior:
+            - The returned counts are the user's deleted expenses and revenues.
+            - No user, transaction, rollup, ledger entry or snapshot of the user remains.
+            - The data of another user is kept, and deleting the user again raises a ValueError.
+        """
+        for user_id in ('325962801', '325962802'):
+            self.db.expenses.insert_many([{'id': i, 'userId': user_id} for i in range(2)])
+            self.db.revenues.insert_one({'id': 1, 'userId': user_id})
+            for collection in ('monthly_rollups', 'ledger', 'balance_snapshots'):
+                self.db[collection].insert_one({'userId': user_id})
+        result = asyncio.run(user_service.delete_user('325962801'))
+        self.assertEqual((result['deleted_expenses'], result['deleted_revenues']), (2, 1))
+        for collection in ('users', 'expenses', 'revenues', 'monthly_rollups', 'ledger', 'balance_snapshots'):
+            key = 'id' if collection == 'users' else 'userId'
+            self.assertEqual(self.db[collection].count_documents({key: '325962801'}), 0)
+        for collection in ('monthly_rollups', 'ledger', 'balance_snapshots'):
+            self.assertEqual(self.db[collection].count_documents({'userId': '325962802'}), 1)
+        self.assertEqual(self.db.expenses.count_documents({'userId': '325962802'}), 2)
+        with self.assertRaises(ValueError):
+            asyncio.run(user_service.delete_user('325962801'))
+
+    def test_update_user_without_balance(self):
+        """
+        Test that a user stored without a balance can be updated.
+
+        Expected behavior:
+            - The missing balance counts as 0, and the new balance is applied as an adjustment.
+            - The returned balance is the stored one.
+        """
+        self.db.users.update_one({'id': '325962801'}, {'$unset': {'balance': ''}})
+        user = User(id='325962801', user_name='MALI', password='S@sw.1fdfg', email='user@example.com',
+                    phone='053-4198051', birth_date='2000-05-28T14:48:54.574Z', balance=50)
+        result = asyncio.run(user_service.update_user('325962801', user))
+        self.assertEqual(result['balance'], 50)
+        self.assertEqual(self.db.users.find_one({'id': '325962801'})['balance'], 50)
+        self.assertEqual(self.db.ledger.find_one({'userId': '325962801'})['amount'], 50)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,4 +1,5 @@
 import asyncio
+import json
 import datetime
 import unittest
 from datetime import datetime
@@ -44,7 +45,7 @@ class TestHH(unittest.TestCase):
         """
         email = "user@example.com"
         password = "123Aaa$$$"
-        result = asyncio.run(user_controller.login(email, password))
+        result = json.loads(asyncio.run(user_controller.login(email, password)).body)
         assert result == {"_id": {"$oid": "664a430fda425d96c43168f3"},
                           "id": "325962801",
                           "user_name": "MALI",
@@ -96,7 +97,7 @@ class TestHH(unittest.TestCase):
         Test deleting an existing user.
 
         This test ensures that the delete_user function correctly deletes a user's details
-        and returns the deleted user's details.
+        and returns the deleted user's details along with the number of deleted transactions.
 
         Expected behavior:
             - The function should delete the user and return their deleted details.
@@ -109,7 +110,9 @@ class TestHH(unittest.TestCase):
             "email": "user@example.com",
             "phone": "053-4198051",
             "birth_date": datetime(2000, 5, 28, 14, 48, 54, 574000, tzinfo=pytz.UTC),
-            "balance": 10
+            "balance": 10,
+            "deleted_expenses": 0,
+            "deleted_revenues": 0
         }
-        result = asyncio.run(user_controller.delete_user(user_id))
+        result = json.loads(asyncio.run(user_controller.delete_user(user_id)).body)
         assert result == expected_response
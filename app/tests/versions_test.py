@@ -0,0 +1,69 @@
+import asyncio
+import unittest
+
+from app.cache.lru_cache import LRUCache
+from app.cache.versions import Versions
+
+
+class TestVersions(unittest.TestCase):
+    """
+    A test suite for the data versions of the versioned caches.
+    """
+
+    def setUp(self):
+        self.cache = LRUCache(4)
+        self.versions = Versions(self.cache)
+
+    def test_bump(self):
+        """
+        Test that bumping a version makes the entries of the old version unreachable.
+
+        Expected behavior:
+            - A lookup after the bump uses the new version, and an entry of the old version is not found.
+        """
+        with self.versions.loading('325962801') as version:
+            self.cache.set(('325962801', version), 'old')
+        self.versions.bump('325962801')
+        with self.versions.loading('325962801') as version:
+            self.assertIsNone(self.cache.get(('325962801', version)))
+        self.assertEqual(version, 1)
+
+    def test_versions_are_pruned(self):
+        """
+        Test that the versions stay bounded when many users are invalidated.
+
+        Expected behavior:
+            - The versions of the users without cached entries are dropped.
+            - The users with cached entries keep their versions, so their old entries stay unreachable.
+        """
+        self.cache.set(('325962801', 0), 'old')
+        self.versions.bump('325962801')
+        self.cache.set(('325962801', 1), 'new')
+        for user in range(1000):
+            self.versions.bump(str(user))
+        self.assertLessEqual(len(self.versions), 2 * self.cache.max_entries + 1)
+        self.assertEqual(self.versions.get('325962801'), 1)
+
+    def test_load_in_flight_keeps_its_version(self):
+        """
+        Test that a version is not pruned while a value is loaded, so a value loaded before a change
+        is not served after it.
+
+        Expected behavior:
+            - The value loaded during the change is cached under the old version, and the next lookup misses it.
+        """
+        async def load():
+            with self.versions.loading('325962801') as version:
+                self.versions.bump('325962801')
+                for user in range(1000):
+                    self.versions.bump(str(user))
+                await asyncio.sleep(0)
+                self.cache.set(('325962801', version), 'loaded before the change')
+
+        asyncio.run(load())
+        with self.versions.loading('325962801') as version:
+            self.assertIsNone(self.cache.get(('325962801', version)))
+
+
+if __name__ == '__main__':
+    unittest.main()